@@ -0,0 +1,178 @@
+import gc
+import json
+import platform
+import tracemalloc
+from collections.abc import Callable
+from dataclasses import dataclass
+from io import StringIO
+from time import perf_counter
+from typing import Any, Optional
+
+from comp3.compiler.arena import AstArena
+from comp3.compiler.ast import build_nodes_from_tokens
+from comp3.compiler.facade import build_program_from_nodes
+from comp3.compiler.lexer import Lexer
+from comp3.compiler.preprocessing import process_includes
+from comp3.machine import Machine
+
+
+COMPILE_STAGES = (
+    "process_includes",
+    "lex",
+    "build_nodes_from_tokens",
+    "build_arena",
+    "build_program_from_nodes",
+    "json_dump",
+)
+
+# Every measurement is repeated until it took at least this long in total, the best time is kept
+MIN_MEASURE_SECONDS = 0.2
+
+# Metrics compared against the baseline and whether a larger value is better
+HIGHER_IS_BETTER = {"ticks_per_second": True, "instructions_per_second": True}
+
+
+@dataclass
+class Benchmark:
+    name: str
+    source: str
+    input: str = ""
+    # Long programs are only simulated up to this many ticks
+    max_ticks: Optional[int] = None
+
+
+def load_suite(path: str) -> list[Benchmark]:
+    with open(path, encoding="utf-8") as file:
+        return [Benchmark(**entry) for entry in json.load(file)]
+
+
+def best_time(function: Callable[[], Any], repeat: int) -> float:
+    # Collections triggered by earlier allocations would land in random measurements
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        best = float("inf")
+        total = 0.0
+        runs = 0
+        while runs < repeat or total < MIN_MEASURE_SECONDS:
+            start = perf_counter()
+            function()
+            elapsed = perf_counter() - start
+            best = min(best, elapsed)
+            total += elapsed
+            runs += 1
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return best
+
+
+def _calibration_workload():
+    total = 0
+    for value in range(20_000):
+        total += value & 7
+    return total
+
+
+def calibrate(repeat: int) -> float:
+    """Time of a fixed pure Python loop, the comparison scales every metric by it.
+
+    Shared and virtual machines change speed from minute to minute, measuring
+    the same loop right before every benchmark cancels most of that out.
+    """
+    return best_time(_calibration_workload, repeat)
+
+
+def _compile_stages(content: str) -> list[tuple[str, Callable[[Any], Any]]]:
+    return [
+        ("process_includes", lambda _: process_includes(content)),
+        ("lex", lambda source: Lexer(StringIO(source)).lex()),
+        ("build_nodes_from_tokens", build_nodes_from_tokens),
+        ("build_arena", lambda nodes: AstArena.from_nodes(nodes).top_level()),
+        ("build_program_from_nodes", build_program_from_nodes),
+        ("json_dump", lambda program: json.dump(program.model_dump(), StringIO(), indent=2)),
+    ]
+
+
+def measure_compile(content: str, repeat: int) -> dict[str, dict[str, float]]:
+    """Best time of every compiler stage fed the output of the previous one, and its peak memory."""
+    results: dict[str, dict[str, float]] = {}
+    value: Any = None
+    for stage, function in _compile_stages(content):
+        argument = value
+        try:
+            seconds = best_time(
+                lambda function=function, argument=argument: function(argument), repeat
+            )
+        except RecursionError as exc:
+            raise ValueError(f"Stage {stage} ran out of Python stack") from exc
+        # Tracing slows everything down, so memory is measured in a separate run
+        tracemalloc.start()
+        value = function(argument)
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results[stage] = {"seconds": seconds, "peak_bytes": peak_bytes}
+    return results
+
+
+def measure_run(benchmark: Benchmark, repeat: int) -> dict[str, float]:
+    with open(benchmark.source, encoding="utf-8") as file:
+        program = build_program_from_nodes(
+            build_nodes_from_tokens(Lexer(StringIO(process_includes(file.read()))).lex())
+        )
+    machine = Machine(program)
+    seconds = best_time(lambda: machine.run(benchmark.input, max_ticks=benchmark.max_ticks), repeat)
+    result = machine.result()
+    return {
+        "ticks": result.ticks,
+        "instructions": result.instructions,
+        "halted": result.halted,
+        "seconds": seconds,
+        "ticks_per_second": result.ticks / seconds,
+        "instructions_per_second": result.instructions / seconds,
+    }
+
+
+def run_suite(suite: list[Benchmark], repeat: int = 3) -> dict[str, Any]:
+    results: dict[str, Any] = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "benchmarks": {},
+    }
+    for benchmark in suite:
+        with open(benchmark.source, encoding="utf-8") as file:
+            content = file.read()
+        results["benchmarks"][benchmark.name] = {
+            "calibration_seconds": calibrate(repeat),
+            "compile": measure_compile(content, repeat),
+            "run": measure_run(benchmark, repeat),
+        }
+    return results
+
+
+def _metrics(results: dict[str, Any]) -> dict[str, float]:
+    # Times are counted in calibration loops, memory is compared as is
+    metrics = {}
+    for name, benchmark in results["benchmarks"].items():
+        calibration = benchmark["calibration_seconds"]
+        for stage, values in benchmark["compile"].items():
+            metrics[f"{name}.compile.{stage}.seconds"] = values["seconds"] / calibration
+            metrics[f"{name}.compile.{stage}.peak_bytes"] = values["peak_bytes"]
+        for metric in HIGHER_IS_BETTER:
+            metrics[f"{name}.run.{metric}"] = benchmark["run"][metric] * calibration
+    return metrics
+
+
+def compare(results: dict[str, Any], baseline: dict[str, Any], threshold: float) -> list[str]:
+    """Describes every metric that got worse than the baseline by more than ``threshold``."""
+    current = _metrics(results)
+    regressions = []
+    for key, old in _metrics(baseline).items():
+        new = current.get(key)
+        if new is None or old == 0:
+            continue
+        higher_is_better = HIGHER_IS_BETTER.get(key.rsplit(".", 1)[1], False)
+        change = (new - old) / old
+        if (-change if higher_is_better else change) > threshold:
+            regressions.append(f"{key}: {old:.6g} -> {new:.6g} ({change:+.1%})")
+    return regressions
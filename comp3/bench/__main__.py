@@ -0,0 +1,53 @@
+import argparse
+import json
+import sys
+
+from comp3.bench import compare, load_suite, run_suite
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="bench", description="Measure simulator throughput and compiler stage times"
+    )
+    parser.add_argument("--suite", default="benchmarks/suite.json")
+    parser.add_argument("-o", "--output", metavar="RESULTS", help="write the results as JSON")
+    parser.add_argument(
+        "--baseline", metavar="RESULTS", help="flag regressions against stored results"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.15,
+        help="relative change counted as a regression, 0.15 by default",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=3, help="keep the best of at least this many runs"
+    )
+    parser.add_argument("--only", nargs="+", metavar="NAME", help="run only these benchmarks")
+    args = parser.parse_args()
+
+    suite = load_suite(args.suite)
+    if args.only:
+        suite = [benchmark for benchmark in suite if benchmark.name in args.only]
+    results = run_suite(suite, args.repeat)
+
+    for name, benchmark in results["benchmarks"].items():
+        run = benchmark["run"]
+        compile_seconds = sum(stage["seconds"] for stage in benchmark["compile"].values())
+        print(
+            f"{name}: {run['ticks_per_second']:.0f} ticks/s,"
+            f" {run['instructions_per_second']:.0f} instructions/s,"
+            f" compile {compile_seconds * 1000:.1f} ms"
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            regressions = compare(results, json.load(file), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
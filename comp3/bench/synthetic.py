@@ -0,0 +1,158 @@
+import argparse
+import json
+import sys
+from dataclasses import asdict, dataclass, replace
+from random import Random
+from typing import Any
+
+from comp3.bench import measure_compile
+
+
+@dataclass
+class ProgramShape:
+    """Size and shape of a generated program.
+
+    Every function holds ``depth`` nested ``if``/``let`` levels and one
+    ``chain`` of nested math expressions, the string literals are spread
+    over the functions round robin.
+    """
+
+    functions: int = 100
+    depth: int = 10
+    chain: int = 20
+    strings: int = 50
+    seed: int = 0
+
+
+_CHAIN_OPS = ("+", "-", "&", "|", "+")
+_CONDITION_OPS = ("<", ">", "=", "!=", "<=", ">=")
+
+
+def _chain(random: Random, operand: str, length: int) -> str:
+    # (op (op (op operand c1) c2) c3), nested as deep as the chain is long
+    expression = operand
+    for _ in range(length):
+        expression = f"({random.choice(_CHAIN_OPS)} {expression} {random.randrange(1, 256)})"
+    return expression
+
+
+def _nested(random: Random, index: int, depth: int) -> str:
+    # Built from the inside out, so any depth fits in the Python stack
+    conditions = [
+        f"({random.choice(_CONDITION_OPS)} x {random.randrange(256)})" for _ in range(depth)
+    ]
+    # Functions only call earlier ones, so the call graph has no cycles
+    expression = f"(fn_{index - 1} x {depth})" if index > 0 else "x"
+    for level in reversed(range(depth)):
+        expression = (
+            f"(if {conditions[level]} (let ((v_{level} (+ x {level}))) (set x v_{level})"
+            f" {expression}) x)"
+        )
+    return expression
+
+
+def _literals(literals: list[str]) -> str:
+    if not literals:
+        return ""
+    sets = " ".join(f'(set text "{literal}")' for literal in literals)
+    return f"    (let ((text 0)) {sets})\n"
+
+
+def _function(random: Random, index: int, shape: ProgramShape) -> str:
+    literals = [
+        f"str {literal} of fn {index}" for literal in range(index, shape.strings, shape.functions)
+    ]
+    return (
+        f"(defun fn_{index} (x y)\n    (set x (+ x y))\n{_literals(literals)}"
+        f"    (set x {_chain(random, 'x', shape.chain)})\n"
+        f"    {_nested(random, index, shape.depth)}\n)\n"
+    )
+
+
+def generate_program(shape: ProgramShape) -> str:
+    """Source of a valid lisq program of the given shape, the same for the same shape.
+
+    The program halts: there are no loops and every function calls at most one
+    earlier function, it prints one digit computed from the last function.
+    """
+    random = Random(shape.seed)
+    if shape.functions == 0:
+        literals = _literals([f"str {literal}" for literal in range(shape.strings)])
+        return f"(let ((x 1))\n{literals}    (put_char (+ 48 (& x 7)))\n)\n"
+
+    parts = [_function(random, index, shape) for index in range(shape.functions)]
+    parts.append(
+        f"(let ((x 0))\n    (set x (fn_{shape.functions - 1} 1 2))\n"
+        "    (put_char (+ 48 (& x 7)))\n)\n"
+    )
+    return "".join(parts)
+
+
+def measure_shapes(shapes: list[ProgramShape], repeat: int = 1) -> list[dict[str, Any]]:
+    """Times and memory of every compiler stage for the program of every shape.
+
+    A stage that fails, for example by running out of Python stack on deep
+    nesting, is reported in ``error`` instead of stopping the whole sweep.
+    """
+    results = []
+    for shape in shapes:
+        source = generate_program(shape)
+        result: dict[str, Any] = {"shape": asdict(shape), "source_bytes": len(source)}
+        try:
+            result["compile"] = measure_compile(source, repeat)
+        except ValueError as exc:
+            result["error"] = str(exc)
+        results.append(result)
+    return results
+
+
+def _print_results(results: list[dict[str, Any]]):
+    for result in results:
+        shape = ", ".join(f"{key}={value}" for key, value in result["shape"].items())
+        print(f"{shape}: {result['source_bytes']} bytes")
+        if "error" in result:
+            print(f"    error: {result['error']}")
+            continue
+        for stage, values in result["compile"].items():
+            print(
+                f"    {stage:<26} {values['seconds'] * 1000:10.1f} ms"
+                f" {values['peak_bytes'] / 2**20:10.1f} MiB"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="synthetic",
+        description="Generate large lisq programs and measure every compiler stage on them",
+    )
+    for field, default in asdict(ProgramShape()).items():
+        parser.add_argument(f"--{field}", type=int, default=default)
+    parser.add_argument(
+        "--sweep",
+        nargs="+",
+        metavar=("PARAMETER", "VALUE"),
+        help="measure one program per value of a shape parameter, e.g. --sweep depth 10 100 200",
+    )
+    parser.add_argument("--repeat", type=int, default=1, help="keep the best of this many runs")
+    parser.add_argument("--emit", metavar="FILE", help="only write the generated program")
+    parser.add_argument("-o", "--output", metavar="RESULTS", help="write the results as JSON")
+    args = parser.parse_args()
+
+    base_shape = ProgramShape(**{field: getattr(args, field) for field in asdict(ProgramShape())})
+    if args.emit:
+        with open(args.emit, "w", encoding="utf-8") as file:
+            file.write(generate_program(base_shape))
+        sys.exit(0)
+
+    sweep_shapes = [base_shape]
+    if args.sweep:
+        parameter, *sweep_values = args.sweep
+        if parameter not in asdict(base_shape) or not sweep_values:
+            parser.error("--sweep takes a shape parameter followed by its values")
+        sweep_shapes = [replace(base_shape, **{parameter: int(value)}) for value in sweep_values]
+
+    sweep_results = measure_shapes(sweep_shapes, args.repeat)
+    _print_results(sweep_results)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(sweep_results, file, indent=2)
@@ -0,0 +1,295 @@
+import json
+import mmap
+import struct
+import sys
+from array import array
+from collections.abc import Sequence
+from enum import IntEnum
+from functools import cached_property
+from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO, Optional
+
+from comp3.common.isa import OpCode, OperandType, instruction_json
+
+
+if TYPE_CHECKING:
+    from comp3.common.instructions import Instruction, Program
+
+
+IMAGE_MAGIC = b"C3IM"
+IMAGE_VERSION = 1
+
+# magic, version, section count, instruction count, data word count
+_HEADER = struct.Struct("<4sHHII")
+# section kind, reserved, offset from the start of the image, size in bytes
+_SECTION = struct.Struct("<HHII")
+
+
+class Section(IntEnum):
+    CODE = 1
+    WIDE_OPERANDS = 2
+    DATA = 3
+    COMMENTS = 4
+    SOURCE_MAP = 5
+    SYMBOLS = 6
+
+
+# Instruction word: op code (5 bits) | operand type (3 bits) | wide flag | operand (23 bits),
+# operands that don't fit are kept in the wide operand section and the word holds their index
+_OP_CODES = tuple(OpCode)
+_OPERAND_TYPES = tuple(OperandType)
+_OP_CODE_INDEX = {op_code: index for index, op_code in enumerate(_OP_CODES)}
+_OPERAND_TYPE_INDEX = {operand_type: index for index, operand_type in enumerate(_OPERAND_TYPES)}
+_OP_CODE_SHIFT = 27
+_OPERAND_TYPE_SHIFT = 24
+_WIDE_FLAG = 1 << 23
+_OPERAND_MASK = _WIDE_FLAG - 1
+
+
+def _words_to_bytes(words: array) -> bytes:
+    if sys.byteorder == "big":
+        words = array("I", words)
+        words.byteswap()
+    return words.tobytes()
+
+
+def _bytes_to_words(buffer: memoryview) -> Sequence[int]:
+    if sys.byteorder == "big":
+        words = array("I", buffer.tobytes())
+        words.byteswap()
+        return words
+    return buffer.cast("I")
+
+
+def encode_instructions(instructions: Sequence["Instruction"]) -> tuple[array, array]:
+    words = array("I")
+    wide_operands = array("I")
+    for instr in instructions:
+        word = _OP_CODE_INDEX[instr.op_code] << _OP_CODE_SHIFT
+        word |= _OPERAND_TYPE_INDEX[instr.operand_type] << _OPERAND_TYPE_SHIFT
+        if instr.operand <= _OPERAND_MASK:
+            word |= instr.operand
+        else:
+            word |= _WIDE_FLAG | len(wide_operands)
+            wide_operands.append(instr.operand)
+        words.append(word)
+    return words, wide_operands
+
+
+def _encode_comments(instructions: Sequence["Instruction"]) -> bytes:
+    # Offsets of every comment followed by the UTF-8 text of all comments
+    offsets = array("I", [0])
+    text = bytearray()
+    for instr in instructions:
+        text += instr.comment.encode()
+        offsets.append(len(text))
+    return _words_to_bytes(offsets) + bytes(text)
+
+
+def _encode_source_map(source_map: Sequence[Optional[tuple[int, int]]]) -> bytes:
+    positions = array("I")
+    for position in source_map:
+        positions.extend(position if position is not None else (0, 0))
+    return _words_to_bytes(positions)
+
+
+def write_image(
+    program: "Program",
+    output: BinaryIO,
+    *,
+    source_map: Optional[Sequence[Optional[tuple[int, int]]]] = None,
+    functions: Optional[dict[str, range]] = None,
+):
+    words, wide_operands = encode_instructions(program.instructions)
+    sections = {
+        Section.CODE: _words_to_bytes(words),
+        Section.WIDE_OPERANDS: _words_to_bytes(wide_operands),
+        Section.DATA: _words_to_bytes(array("I", (word.value for word in program.data_memory))),
+        Section.COMMENTS: _encode_comments(program.instructions),
+    }
+    if source_map is not None:
+        sections[Section.SOURCE_MAP] = _encode_source_map(source_map)
+
+    symbols: dict[str, dict] = {
+        "data": {
+            word.identifier: address
+            for address, word in enumerate(program.data_memory)
+            if word.identifier is not None
+        },
+        "functions": {
+            name: [func_range.start, func_range.stop]
+            for name, func_range in (functions or {}).items()
+        },
+    }
+    sections[Section.SYMBOLS] = json.dumps(symbols, ensure_ascii=False).encode()
+
+    header = _HEADER.pack(
+        IMAGE_MAGIC,
+        IMAGE_VERSION,
+        len(sections),
+        len(program.instructions),
+        len(program.data_memory),
+    )
+    offset = _HEADER.size + _SECTION.size * len(sections)
+    table = bytearray()
+    body = bytearray()
+    for kind, content in sections.items():
+        # Sections are word aligned so they can be viewed as arrays in place
+        body += bytes(-(offset + len(body)) % 4)
+        table += _SECTION.pack(kind, 0, offset + len(body), len(content))
+        body += content
+
+    output.write(header)
+    output.write(table)
+    output.write(body)
+
+
+class ImageInstruction:
+    """Instruction decoded from an image word, mirrors the fields of ``Instruction``."""
+
+    __slots__ = ("image", "instr_index", "op_code", "operand_type", "operand")
+
+    def __init__(
+        self,
+        image: "ProgramImage",
+        instr_index: int,
+        op_code: OpCode,
+        operand_type: OperandType,
+        operand: int,
+    ):  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self.image = image
+        self.instr_index = instr_index
+        self.op_code = op_code
+        self.operand_type = operand_type
+        self.operand = operand
+
+    @property
+    def comment(self) -> str:
+        return self.image.comment(self.instr_index)
+
+    def model_dump_json(self) -> str:
+        return instruction_json(self)
+
+
+class ImageInstructions(Sequence):
+    """Instruction memory backed by the packed words, each instruction is decoded on first fetch."""
+
+    def __init__(self, image: "ProgramImage", words: Sequence[int], wide_operands: Sequence[int]):
+        self.image = image
+        self.words = words
+        self.wide_operands = wide_operands
+        self._decoded: list[Optional[ImageInstruction]] = [None] * len(words)
+
+    def __len__(self) -> int:
+        return len(self.words)
+
+    def __getitem__(self, index):  # type: ignore[override]
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        decoded = self._decoded[index]
+        if decoded is None:
+            decoded = self._decoded[index] = self.decode(index)
+        return decoded
+
+    def decode(self, index: int) -> ImageInstruction:
+        word = self.words[index]
+        operand = word & _OPERAND_MASK
+        if word & _WIDE_FLAG:
+            operand = self.wide_operands[operand]
+        return ImageInstruction(
+            self.image,
+            index,
+            _OP_CODES[word >> _OP_CODE_SHIFT],
+            _OPERAND_TYPES[(word >> _OPERAND_TYPE_SHIFT) & 0b111],
+            operand,
+        )
+
+
+class ProgramImage:
+    """Program loaded from a binary image, only the code and data sections are read eagerly."""
+
+    def __init__(self, buffer: bytes | mmap.mmap):
+        view = memoryview(buffer)
+        if len(view) < _HEADER.size:
+            raise ValueError("Program image is truncated")
+        magic, version, section_count, instruction_count, data_count = _HEADER.unpack_from(view)
+        if magic != IMAGE_MAGIC:
+            raise ValueError("Not a program image")
+        if version != IMAGE_VERSION:
+            raise ValueError(f"Unsupported program image version {version}")
+
+        self.sections: dict[int, memoryview] = {}
+        for index in range(section_count):
+            kind, _, offset, size = _SECTION.unpack_from(view, _HEADER.size + index * _SECTION.size)
+            if offset + size > len(view):
+                raise ValueError("Program image is truncated")
+            self.sections[kind] = view[offset : offset + size]
+
+        self.instructions = ImageInstructions(
+            self,
+            _bytes_to_words(self.sections[Section.CODE]),
+            _bytes_to_words(self.sections[Section.WIDE_OPERANDS]),
+        )
+        self.data_values = _bytes_to_words(self.sections[Section.DATA])
+        if len(self.instructions) != instruction_count or len(self.data_values) != data_count:
+            raise ValueError("Program image sections don't match its header")
+
+    @classmethod
+    def open(cls, path: str | Path) -> "ProgramImage":
+        with open(path, "rb") as file:
+            # The mapping stays valid after the file is closed
+            return cls(mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ))
+
+    @cached_property
+    def _comment_offsets(self) -> Sequence[int]:
+        return _bytes_to_words(self.sections[Section.COMMENTS][: 4 * (len(self.instructions) + 1)])
+
+    def comment(self, index: int) -> str:
+        if Section.COMMENTS not in self.sections:
+            return ""
+        text = self.sections[Section.COMMENTS][4 * (len(self.instructions) + 1) :]
+        return bytes(text[self._comment_offsets[index] : self._comment_offsets[index + 1]]).decode()
+
+    @cached_property
+    def _source_map(self) -> Sequence[int]:
+        return _bytes_to_words(self.sections[Section.SOURCE_MAP])
+
+    def source_position(self, index: int) -> Optional[tuple[int, int]]:
+        if Section.SOURCE_MAP not in self.sections or self._source_map[2 * index] == 0:
+            return None
+        return self._source_map[2 * index], self._source_map[2 * index + 1]
+
+    @cached_property
+    def symbols(self) -> dict[str, dict]:
+        if Section.SYMBOLS not in self.sections:
+            return {"data": {}, "functions": {}}
+        return json.loads(bytes(self.sections[Section.SYMBOLS]).decode())
+
+    def to_program(self) -> "Program":
+        # pylint: disable-next=import-outside-toplevel
+        from comp3.common.instructions import Program
+
+        identifiers = {address: name for name, address in self.symbols["data"].items()}
+        return Program.model_validate({
+            "instructions": [
+                {
+                    "instr_index": index,
+                    "op_code": instr.op_code,
+                    "operand_type": instr.operand_type,
+                    "operand": instr.operand,
+                    "comment": instr.comment,
+                }
+                for index, instr in enumerate(self.instructions)
+            ],
+            "data_memory": [
+                {"value": value, "identifier": identifiers.get(address)}
+                for address, value in enumerate(self.data_values)
+            ],
+        })
+
+
+def is_image(path: str | Path) -> bool:
+    with open(path, "rb") as file:
+        return file.read(len(IMAGE_MAGIC)) == IMAGE_MAGIC
@@ -1,59 +1,9 @@
-from enum import Enum
 from typing import Optional
 
 from pydantic import BaseModel, Field
 
-
-class OpCode(str, Enum):
-    # Math operations
-    ADD = "ADD"
-    SUB = "SUB"
-    AND = "AND"
-    OR = "OR"
-    SHL = "SHL"
-    SHR = "SHR"
-
-    # Memory access
-    LD = "LD"
-    ST = "ST"
-
-    # Stack manipulation
-    PUSH = "PUSH"
-    POP = "POP"
-
-    # Branching
-    CMP = "CMP"
-    JZ = "JZ"
-    JNZ = "JNZ"
-    JA = "JA"
-    JAE = "JAE"
-    JB = "JB"
-    JBE = "JBE"
-    JMP = "JMP"
-
-    # Machine control
-    HLT = "HLT"
-
-
-class OperandType(str, Enum):
-    IMMEDIATE = "immediate"
-    ADDRESS = "address"
-    POINTER_ADDRESS = "pointer_address"
-    STACK_OFFSET = "stack_offset"
-    POINTER_STACK_OFFSET = "pointer_stack_offset"
-    NO_OPERAND = "no_operand"
-
-
-class AluOp(Enum):
-    ADD = 0
-    SUB = 1
-    AND = 2
-    OR = 3
-    SHL = 4
-    SHR = 5
-    INC = 6  # Increase left operand
-    DEC = 7  # Decrease right operand
-    NOT = 8
+# The enums are kept in a module without pydantic, the machine runs without it
+from comp3.common.isa import AluOp, OpCode, OperandType
 
 
 class Instruction(BaseModel):
@@ -85,3 +35,15 @@ class InstrStubInstruction(Instruction):
 class Program(BaseModel):
     instructions: list[Instruction]
     data_memory: list[DataWord]
+
+
+__all__ = [
+    "AluOp",
+    "DataStubInstruction",
+    "DataWord",
+    "InstrStubInstruction",
+    "Instruction",
+    "OpCode",
+    "OperandType",
+    "Program",
+]
@@ -0,0 +1,80 @@
+import json
+from enum import Enum
+from typing import Protocol
+
+
+class OpCode(str, Enum):
+    # Math operations
+    ADD = "ADD"
+    SUB = "SUB"
+    AND = "AND"
+    OR = "OR"
+    SHL = "SHL"
+    SHR = "SHR"
+
+    # Memory access
+    LD = "LD"
+    ST = "ST"
+    INC = "INC"  # Increment memory cell in place
+    DEC = "DEC"  # Decrement memory cell in place
+
+    # Stack manipulation
+    PUSH = "PUSH"
+    POP = "POP"
+
+    # Branching
+    CMP = "CMP"
+    JZ = "JZ"
+    JNZ = "JNZ"
+    JA = "JA"
+    JAE = "JAE"
+    JB = "JB"
+    JBE = "JBE"
+    JMP = "JMP"
+
+    # Machine control
+    HLT = "HLT"
+
+
+class OperandType(str, Enum):
+    IMMEDIATE = "immediate"
+    ADDRESS = "address"
+    POINTER_ADDRESS = "pointer_address"
+    STACK_OFFSET = "stack_offset"
+    POINTER_STACK_OFFSET = "pointer_stack_offset"
+    NO_OPERAND = "no_operand"
+
+
+class AluOp(Enum):
+    ADD = 0
+    SUB = 1
+    AND = 2
+    OR = 3
+    SHL = 4
+    SHR = 5
+    INC = 6  # Increase left operand
+    DEC = 7  # Decrease right operand
+    NOT = 8
+
+
+class InstructionFields(Protocol):  # pylint: disable=too-few-public-methods
+    instr_index: int
+    op_code: OpCode
+    operand_type: OperandType
+    operand: int
+    comment: str
+
+
+def instruction_json(instr: InstructionFields) -> str:
+    # Same output as ``Instruction.model_dump_json()``, the machine logs instructions with it
+    return json.dumps(
+        {
+            "instr_index": instr.instr_index,
+            "op_code": instr.op_code.value,
+            "operand_type": instr.operand_type.value,
+            "operand": instr.operand,
+            "comment": instr.comment,
+        },
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
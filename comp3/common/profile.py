@@ -0,0 +1,78 @@
+import struct
+import sys
+from array import array
+from dataclasses import dataclass
+from hashlib import sha256
+from typing import BinaryIO, Iterable
+
+from comp3.common.isa import InstructionFields
+
+
+PROFILE_MAGIC = b"C3PF"
+PROFILE_VERSION = 1
+
+# magic, version, fingerprint, instruction count
+_HEADER = struct.Struct("<4sH8sI")
+
+
+def program_fingerprint(instructions: Iterable[InstructionFields]) -> bytes:
+    # Comments and stub bookkeeping don't change the code, so they are not hashed
+    digest = sha256()
+    for instr in instructions:
+        digest.update(
+            f"{instr.op_code.value} {instr.operand_type.value} {instr.operand}\n".encode()
+        )
+    return digest.digest()[:8]
+
+
+def _counters(size: int) -> array:
+    return array("Q", bytes(8 * size))
+
+
+@dataclass
+class Profile:
+    """Execution profile of a single run, one counter pair per instruction.
+
+    ``taken_counts`` counts how many times control did not fall through
+    to the next instruction after executing it (a taken jump).
+    """
+
+    fingerprint: bytes
+    execution_counts: array
+    taken_counts: array
+
+    @classmethod
+    def empty(cls, fingerprint: bytes, size: int) -> "Profile":
+        return cls(fingerprint, _counters(size), _counters(size))
+
+    def __len__(self) -> int:
+        return len(self.execution_counts)
+
+    def dump(self, file: BinaryIO):
+        file.write(_HEADER.pack(PROFILE_MAGIC, PROFILE_VERSION, self.fingerprint, len(self)))
+        for counters in (self.execution_counts, self.taken_counts):
+            if sys.byteorder == "big":
+                counters = array("Q", counters)
+                counters.byteswap()
+            counters.tofile(file)
+
+    @classmethod
+    def load(cls, file: BinaryIO) -> "Profile":
+        header = file.read(_HEADER.size)
+        if len(header) != _HEADER.size:
+            raise ValueError("Profile file is truncated")
+        magic, version, fingerprint, size = _HEADER.unpack(header)
+        if magic != PROFILE_MAGIC:
+            raise ValueError("Not a profile file")
+        if version != PROFILE_VERSION:
+            raise ValueError(f"Unsupported profile version {version}")
+
+        profile = cls.empty(fingerprint, 0)
+        for counters in (profile.execution_counts, profile.taken_counts):
+            try:
+                counters.fromfile(file, size)
+            except EOFError as exc:
+                raise ValueError("Profile file is truncated") from exc
+            if sys.byteorder == "big":
+                counters.byteswap()
+        return profile
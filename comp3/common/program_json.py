@@ -0,0 +1,75 @@
+from typing import TYPE_CHECKING, Any, NamedTuple, Optional, Union
+
+from comp3.common.image import ProgramImage
+from comp3.common.isa import OpCode, OperandType, instruction_json
+
+
+if TYPE_CHECKING:
+    from comp3.common.instructions import Program
+
+_WORD_LIMIT = 2**32
+
+
+class PlainInstruction:  # pylint: disable=too-few-public-methods
+    """Instruction decoded from compiled JSON without pydantic, mirrors ``Instruction``."""
+
+    __slots__ = ("instr_index", "op_code", "operand_type", "operand", "comment")
+
+    def __init__(
+        self,
+        instr_index: int,
+        op_code: OpCode,
+        operand_type: OperandType,
+        operand: int,
+        comment: str,
+    ):  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self.instr_index = instr_index
+        self.op_code = op_code
+        self.operand_type = operand_type
+        self.operand = operand
+        self.comment = comment
+
+    def model_dump_json(self) -> str:
+        return instruction_json(self)
+
+
+class PlainDataWord(NamedTuple):
+    value: int
+    identifier: Optional[str]
+
+
+class PlainProgram(NamedTuple):
+    instructions: list[PlainInstruction]
+    data_memory: list[PlainDataWord]
+
+
+# Anything the machine can run: a validated model, a binary image or plainly decoded JSON
+AnyProgram = Union["Program", ProgramImage, PlainProgram]
+
+
+def _word(value: Any, what: str) -> int:
+    if not isinstance(value, int) or not 0 <= value < _WORD_LIMIT:
+        raise ValueError(f"{what} must be an unsigned 32-bit integer, got {value!r}")
+    return value
+
+
+def decode_program(content: Any) -> PlainProgram:
+    """Decodes the compiled JSON of a program, checking only what the machine relies on."""
+    try:
+        instructions = [
+            PlainInstruction(
+                _word(instr.get("instr_index", 0), f"Index of instruction {index}"),
+                OpCode(instr["op_code"]),
+                OperandType(instr["operand_type"]),
+                _word(instr["operand"], f"Operand of instruction {index}"),
+                str(instr.get("comment", "")),
+            )
+            for index, instr in enumerate(content["instructions"])
+        ]
+        data_memory = [
+            PlainDataWord(_word(word["value"], f"Data word {address}"), word.get("identifier"))
+            for address, word in enumerate(content["data_memory"])
+        ]
+    except (KeyError, TypeError) as exc:
+        raise ValueError(f"Malformed program: {exc!r}") from exc
+    return PlainProgram(instructions, data_memory)
@@ -1,21 +1,189 @@
 import json
+from collections.abc import Sequence
 from io import StringIO
-from typing import TextIO
+from pathlib import Path
+from typing import BinaryIO, Optional, TextIO
 
-from comp3.compiler.ast import build_nodes_from_tokens
-from comp3.compiler.backend import build_program_from_nodes
+from comp3.common.image import write_image
+from comp3.common.instructions import Program
+from comp3.common.profile import Profile, program_fingerprint
+from comp3.compiler.arena import AstArena
+from comp3.compiler.ast import AstNode, iter_nodes_from_tokens
+from comp3.compiler.cost_report import build_cost_report
+from comp3.compiler.data_layout import build_data_report
+from comp3.compiler.facade import CompilerFacade
 from comp3.compiler.lexer import Lexer
-from comp3.compiler.preprocessing import process_includes
+from comp3.compiler.objects import (
+    ObjectFile,
+    declared_functions,
+    dump_object,
+    load_object,
+    source_hash,
+    take_object_includes,
+)
+from comp3.compiler.pgo import build_profile_hints
+from comp3.compiler.preprocessing import IncludeResolver, Preprocessed
 
 
-def compile_pipeline(source: TextIO, output: TextIO):
+def build_profiled_program(
+    nodes: list[AstNode], profile: Profile, rotate_loops: bool = True, workers: int = 1
+) -> tuple[Program, CompilerFacade]:
+    # The profile was recorded on the plain build, which maps its counters back to nodes
+    baseline = CompilerFacade(rotate_loops=rotate_loops, workers=workers)
+    baseline_program = baseline.build_program(nodes)
+    if program_fingerprint(baseline_program.instructions) != profile.fingerprint:
+        raise ValueError("Profile was recorded for a different program")
+
+    hints = build_profile_hints(
+        nodes,
+        profile,
+        baseline.profile_sites,
+        baseline.call_sites,
+        baseline.static_functions,
+        baseline.function_ranges,
+    )
+    facade = CompilerFacade(profile_hints=hints, rotate_loops=rotate_loops, workers=workers)
+    return facade.build_program(nodes), facade
+
+
+def preprocess_source(
+    content: str, objects: list[ObjectFile], include_paths: Sequence[Path] = ()
+) -> tuple[Preprocessed, list[ObjectFile]]:
+    """Substitutes the includes, modules with one of ``objects`` give their objects instead."""
+    resolver = IncludeResolver(include_paths)
+    content, included = take_object_includes(content, objects, resolver)
+    return resolver.process(content, [Path(obj.source) for obj in included]), included
+
+
+def _parse(preprocessed: Preprocessed) -> list[AstNode]:
+    tokens = Lexer(StringIO(preprocessed.content)).tokens()
+    return AstArena.from_nodes(iter_nodes_from_tokens(tokens)).top_level()
+
+
+def parse_source(content: str, include_paths: Sequence[Path] = ()) -> list[AstNode]:
+    preprocessed, _ = preprocess_source(content, [], include_paths)
+    with preprocessed.line_map.locating_errors():
+        return _parse(preprocessed)
+
+
+def compile_program(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    source: TextIO,
+    profile: Optional[Profile] = None,
+    rotate_loops: bool = True,
+    objects: Optional[list[ObjectFile]] = None,
+    workers: int = 1,
+    include_paths: Sequence[Path] = (),
+) -> tuple[Program, CompilerFacade]:
+    """Compiles a program, ``#include`` of a module with one of ``objects`` links that object.
+
+    With more than one of ``workers`` the top-level forms are compiled on a process pool,
+    the program is the same as compiled by one process. Included files are looked up
+    next to the file including them, in the working directory and then in ``include_paths``.
+    """
     content = source.read()
-    content = process_includes(content)
-    lexer = Lexer(StringIO(content))
-    tokens = lexer.lex()
-    nodes = build_nodes_from_tokens(tokens)
-    program = build_program_from_nodes(nodes)
+    if objects and profile is not None:
+        raise ValueError("Profile guided optimization can't be used with prebuilt objects")
+    preprocessed, included = preprocess_source(content, objects or [], include_paths)
+    with preprocessed.line_map.locating_errors():
+        nodes = _parse(preprocessed)
+        if objects:
+            obj = CompilerFacade(rotate_loops=rotate_loops, workers=workers).build_object(
+                nodes, "<source>", source_hash(content), declared_functions(objects)
+            )
+            facade = CompilerFacade(rotate_loops=rotate_loops)
+            return facade.link([*included, obj]), facade
+
+        if profile is not None:
+            return build_profiled_program(nodes, profile, rotate_loops, workers)
+        facade = CompilerFacade(rotate_loops=rotate_loops, workers=workers)
+        program = facade.build_program(nodes)
+        return program, facade
+
+
+def compile_object(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    source: TextIO,
+    output: TextIO,
+    source_path: str,
+    objects: Optional[list[ObjectFile]] = None,
+    rotate_loops: bool = True,
+    workers: int = 1,
+    include_paths: Sequence[Path] = (),
+):
+    """Writes the relocatable object of a module.
+
+    Functions of ``objects`` are called with their calling convention, modules
+    they were compiled from are not included again.
+    """
+    objects = objects or []
+    original = source.read()
+    preprocessed, _ = preprocess_source(original, objects, include_paths)
+    with preprocessed.line_map.locating_errors():
+        obj = CompilerFacade(rotate_loops=rotate_loops, workers=workers).build_object(
+            _parse(preprocessed), source_path, source_hash(original), declared_functions(objects)
+        )
+    dump_object(obj, output)
+
+
+def compile_pipeline(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    source: TextIO,
+    output: TextIO,
+    profile: Optional[Profile] = None,
+    rotate_loops: bool = True,
+    objects: Optional[list[ObjectFile]] = None,
+    workers: int = 1,
+    include_paths: Sequence[Path] = (),
+):
+    program, _ = compile_program(source, profile, rotate_loops, objects, workers, include_paths)
     json.dump(program.model_dump(), output, indent=2)
 
 
-__all__ = ["compile_pipeline"]
+def compile_image(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    source: TextIO,
+    output: BinaryIO,
+    profile: Optional[Profile] = None,
+    rotate_loops: bool = True,
+    objects: Optional[list[ObjectFile]] = None,
+    workers: int = 1,
+    include_paths: Sequence[Path] = (),
+):
+    program, facade = compile_program(
+        source, profile, rotate_loops, objects, workers, include_paths
+    )
+    write_image(program, output, source_map=facade.source_map, functions=facade.function_ranges)
+
+
+def cost_report(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    source: TextIO,
+    profile: Optional[Profile] = None,
+    rotate_loops: bool = True,
+    objects: Optional[list[ObjectFile]] = None,
+    workers: int = 1,
+    include_paths: Sequence[Path] = (),
+) -> str:
+    program, facade = compile_program(
+        source, profile, rotate_loops, objects, workers, include_paths
+    )
+    return build_cost_report(program, facade.function_ranges)
+
+
+def data_report(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+    source: TextIO,
+    profile: Optional[Profile] = None,
+    rotate_loops: bool = True,
+    objects: Optional[list[ObjectFile]] = None,
+    workers: int = 1,
+    include_paths: Sequence[Path] = (),
+) -> str:
+    _, facade = compile_program(source, profile, rotate_loops, objects, workers, include_paths)
+    return build_data_report(facade.data_layout)
+
+
+__all__ = [
+    "compile_image",
+    "compile_object",
+    "compile_pipeline",
+    "compile_program",
+    "cost_report",
+    "data_report",
+    "load_object",
+]
@@ -1,18 +1,256 @@
+import argparse
 import sys
 from pathlib import Path
+from time import perf_counter
+from typing import Optional
 
-from . import compile_pipeline
+from comp3.common.profile import Profile
+from comp3.compiler import (
+    compile_image,
+    compile_object,
+    compile_pipeline,
+    cost_report,
+    data_report,
+    load_object,
+)
+from comp3.compiler.batch import compile_batch
+from comp3.compiler.incremental import IncrementalCompiler, watch, write_program
+from comp3.compiler.objects import ObjectFile
+from comp3.compiler.preprocessing import IncludeResolver, dependency_rule
+
+
+def read_profile(path: Optional[Path]) -> Optional[Profile]:
+    if path is None:
+        return None
+    with open(path, "rb") as profile_file:
+        return Profile.load(profile_file)
+
+
+def read_objects(paths: list[Path]) -> list[ObjectFile]:
+    loaded = []
+    for path in paths:
+        with open(path, encoding="utf-8") as object_file:
+            loaded.append(load_object(object_file))
+    return loaded
+
+
+def write_dependencies(path: Path, target: Path, source: Path, include_paths: list[Path]):
+    preprocessed = IncludeResolver(include_paths).process(source.read_text(encoding="utf-8"))
+    with open(path, "w", encoding="utf-8") as dependency_file:
+        dependency_file.write(dependency_rule(str(target), str(source), preprocessed.dependencies))
+
+
+def run_batch(arguments: argparse.Namespace, batch_objects: list[ObjectFile]) -> bool:
+    start = perf_counter()
+    results = compile_batch(
+        arguments.batch,
+        arguments.output_dir,
+        arguments.rotate_loops,
+        batch_objects,
+        arguments.format == "image",
+        arguments.jobs,
+        arguments.include_paths,
+    )
+    for result in results:
+        if result.status == "failed":
+            print(f"Error in {result.source}: {result.error}")
+        elif result.status == "compiled":
+            print(f"Compiled {result.source} -> {result.output}")
+    counts = {status: 0 for status in ("compiled", "up to date", "failed")}
+    for result in results:
+        counts[result.status] += 1
+    summary = ", ".join(f"{count} {status}" for status, count in counts.items())
+    print(f"{summary} in {(perf_counter() - start) * 1000:.1f} ms")
+    return counts["failed"] == 0
 
 
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Invalid arguments. Usage: compiler <input_file> <output_file>")
+    parser = argparse.ArgumentParser(prog="compiler", description="Compile lisq source code")
+    parser.add_argument("input_file", type=Path, nargs="?")
+    parser.add_argument("output_file", type=Path, nargs="?")
+    parser.add_argument(
+        "--cost-report",
+        action="store_true",
+        help="print the estimated tick cost of every function",
+    )
+    parser.add_argument(
+        "--data-report",
+        action="store_true",
+        help="print the layout of the data memory and how much of it is left for the stack",
+    )
+    parser.add_argument(
+        "--profile-use",
+        type=Path,
+        metavar="PROFILE",
+        help="optimize the layout using a profile written by the machine with --profile-out",
+    )
+    parser.add_argument(
+        "--no-rotate-loops",
+        dest="rotate_loops",
+        action="store_false",
+        help="check while loop conditions at the top with a jump back from the bottom",
+    )
+    parser.add_argument(
+        "-c",
+        dest="compile_only",
+        action="store_true",
+        help="write a relocatable object of the module instead of a program",
+    )
+    parser.add_argument(
+        "--object",
+        dest="objects",
+        type=Path,
+        action="append",
+        default=[],
+        metavar="OBJECT",
+        help="link this object instead of compiling the module it was built from on #include",
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        metavar="N",
+        help="compile the top-level forms on N processes",
+    )
+    parser.add_argument(
+        "-I",
+        dest="include_paths",
+        type=Path,
+        action="append",
+        default=[],
+        metavar="DIR",
+        help="look up included files in this directory after the working directory",
+    )
+    parser.add_argument(
+        "--deps",
+        type=Path,
+        metavar="DEPFILE",
+        help="write a Make rule of the output file on the source and the files it includes",
+    )
+    parser.add_argument(
+        "--batch",
+        type=Path,
+        metavar="SOURCE_DIR",
+        help="compile every source in a directory in one process, skipping unchanged ones",
+    )
+    parser.add_argument(
+        "-o",
+        "--output-dir",
+        type=Path,
+        help="directory of the programs compiled with --batch",
+    )
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="compile again on every change of the source, recompiling only the changed forms",
+    )
+    parser.add_argument(
+        "--format",
+        choices=("json", "image"),
+        default="json",
+        help="write the program as readable JSON or as a compact binary image",
+    )
+    args = parser.parse_args()
+
+    profile = read_profile(args.profile_use)
+    objects = read_objects(args.objects)
+    report = args.cost_report or args.data_report
+
+    if args.batch is not None:
+        if args.input_file is not None or args.output_dir is None:
+            parser.error(
+                "--batch takes a source directory and -o instead of input and output files"
+            )
+        if args.compile_only or report or args.watch or args.deps or profile is not None:
+            parser.error(
+                "--batch can't be combined with -c, --cost-report, --data-report, --watch, --deps"
+                " or --profile-use"
+            )
+        sys.exit(0 if run_batch(args, objects) else 1)
+
+    if args.input_file is None:
+        parser.error("input_file is required unless --batch is given")
+
+    if args.output_file is None and not report:
+        parser.error("output_file is required unless --cost-report or --data-report is given")
+
+    if args.compile_only and (report or profile is not None):
+        parser.error("-c can't be combined with --cost-report, --data-report or --profile-use")
+
+    if args.deps is not None and args.output_file is None:
+        parser.error("--deps needs output_file, the target of the rule")
+
+    if args.watch and (args.compile_only or report or profile is not None):
+        parser.error(
+            "--watch can't be combined with -c, --cost-report, --data-report or --profile-use"
+        )
+
+    if args.watch:
+        args.output_file.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            watch(
+                args.input_file,
+                IncrementalCompiler(args.rotate_loops, objects, include_paths=args.include_paths),
+                lambda program, facade: write_program(
+                    args.output_file, args.format == "image", program, facade
+                ),
+            )
+        except KeyboardInterrupt:
+            pass
+    elif args.output_file is not None:
+        args.output_file.parent.mkdir(parents=True, exist_ok=True)
+
+        with open(args.input_file, encoding="utf-8") as file:
+            if args.compile_only:
+                with open(args.output_file, "w", encoding="utf-8") as output:
+                    compile_object(
+                        file,
+                        output,
+                        str(args.input_file),
+                        objects,
+                        args.rotate_loops,
+                        args.jobs,
+                        args.include_paths,
+                    )
+            elif args.format == "image":
+                with open(args.output_file, "wb") as image_output:
+                    compile_image(
+                        file,
+                        image_output,
+                        profile,
+                        args.rotate_loops,
+                        objects,
+                        args.jobs,
+                        args.include_paths,
+                    )
+            else:
+                with open(args.output_file, "w", encoding="utf-8") as output:
+                    compile_pipeline(
+                        file,
+                        output,
+                        profile,
+                        args.rotate_loops,
+                        objects,
+                        args.jobs,
+                        args.include_paths,
+                    )
 
-    input_file = Path(sys.argv[1])
-    output_file = Path(sys.argv[2])
+        if args.deps is not None:
+            write_dependencies(args.deps, args.output_file, args.input_file, args.include_paths)
 
-    output_file.parent.mkdir(parents=True, exist_ok=True)
+    if args.cost_report:
+        with open(args.input_file, encoding="utf-8") as file:
+            print(
+                cost_report(
+                    file, profile, args.rotate_loops, objects, args.jobs, args.include_paths
+                )
+            )
 
-    with open(sys.argv[1], encoding="utf-8") as file:
-        with open(sys.argv[2], "w", encoding="utf-8") as output:
-            compile_pipeline(file, output)
+    if args.data_report:
+        with open(args.input_file, encoding="utf-8") as file:
+            print(
+                data_report(
+                    file, profile, args.rotate_loops, objects, args.jobs, args.include_paths
+                )
+            )
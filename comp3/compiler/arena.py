@@ -0,0 +1,376 @@
+from array import array
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import fields
+from enum import Enum
+from typing import Any, NamedTuple, Optional, TypeVar, Union, get_args, get_origin
+
+from comp3.compiler.ast import (
+    AstNode,
+    FuncCallNode,
+    FuncNode,
+    GetCharNode,
+    IfNode,
+    IntLiteralNode,
+    LetNode,
+    LetVarNode,
+    LoadByIdentifierNode,
+    LoadByPointerIdentifierNode,
+    LoopForNode,
+    LoopWhileNode,
+    MathNode,
+    MultipleExpressionNode,
+    PutCharNode,
+    SetNode,
+    SetPtrNode,
+    StrAllocNode,
+    StringLiteralNode,
+    walk,
+)
+from comp3.compiler.lexer import Token, TokenType
+
+
+class SpanToken(NamedTuple):
+    """Token of an arena node, the fields of the lexer token without a pydantic model."""
+
+    token_type: TokenType
+    value: str
+    line: int
+    pos: int
+
+
+# Index of a node class in the arena is its kind
+NODE_KINDS: tuple[type[AstNode], ...] = (
+    LetVarNode,
+    LetNode,
+    SetNode,
+    SetPtrNode,
+    LoopWhileNode,
+    LoopForNode,
+    GetCharNode,
+    PutCharNode,
+    MathNode,
+    FuncNode,
+    IfNode,
+    FuncCallNode,
+    StrAllocNode,
+    IntLiteralNode,
+    StringLiteralNode,
+    LoadByIdentifierNode,
+    LoadByPointerIdentifierNode,
+    MultipleExpressionNode,
+)
+_KIND_INDICES = {node_class: kind for kind, node_class in enumerate(NODE_KINDS)}
+_TOKEN_TYPES = tuple(TokenType)
+_TOKEN_TYPE_INDICES = {token_type: index for index, token_type in enumerate(_TOKEN_TYPES)}
+_NO_NODE = -1
+
+
+class _Codec(Enum):
+    # Token type, interned value, line and column
+    TOKEN = "token"
+    # Index of the node
+    NODE = "node"
+    # Index of the node or -1
+    OPTIONAL_NODE = "optional_node"
+    # Start in the lists array and length, the items are node indices
+    NODES = "nodes"
+    # Start in the lists array and length, the items are interned strings
+    NAMES = "names"
+    # Position of the member in its enum
+    ENUM = "enum"
+    # Interned string or integer
+    VALUE = "value"
+
+
+_SLOT_COUNTS = {_Codec.TOKEN: 4, _Codec.NODES: 2, _Codec.NAMES: 2}
+
+
+def _codec(field_type: Any) -> _Codec:
+    if field_type is Token:
+        return _Codec.TOKEN
+    if get_origin(field_type) is Union:
+        return _Codec.OPTIONAL_NODE
+    if get_origin(field_type) is list:
+        return _Codec.NAMES if get_args(field_type)[0] is str else _Codec.NODES
+    if issubclass(field_type, Enum):
+        return _Codec.ENUM
+    if issubclass(field_type, AstNode):
+        return _Codec.NODE
+    return _Codec.VALUE
+
+
+# Every field of a kind with its codec and the offset of its first slot
+_Layout = tuple[tuple[str, _Codec, int, Any], ...]
+
+
+def _layout(node_class: type[AstNode]) -> _Layout:
+    layout = []
+    offset = 0
+    for node_field in fields(node_class):  # type: ignore[arg-type]
+        codec = _codec(node_field.type)
+        layout.append((node_field.name, codec, offset, node_field.type))
+        offset += _SLOT_COUNTS.get(codec, 1)
+    return tuple(layout)
+
+
+_LAYOUTS = tuple(_layout(node_class) for node_class in NODE_KINDS)
+_ENUM_INDICES = {
+    (field_type, member): index
+    for _, codec, _, field_type in sum(_LAYOUTS, ())
+    if codec is _Codec.ENUM
+    for index, member in enumerate(field_type)
+}
+# Fields of every kind that hold nested nodes, and whether they are lists
+_CHILD_FIELDS = tuple(
+    tuple(
+        (name, codec is _Codec.NODES)
+        for name, codec, _, _ in layout
+        if codec in (_Codec.NODE, _Codec.OPTIONAL_NODE, _Codec.NODES)
+    )
+    for layout in _LAYOUTS
+)
+
+
+def _child_nodes(node: AstNode) -> Iterator[AstNode]:
+    for name, is_list in _CHILD_FIELDS[_KIND_INDICES[type(node)]]:
+        value = getattr(node, name)
+        if is_list:
+            yield from value
+        elif value is not None:
+            yield value
+
+
+# pylint: disable=too-many-instance-attributes
+class AstArena:
+    """AST nodes packed into typed arrays.
+
+    Every node is its kind, the offset of its fields in ``slots`` and the first
+    node of its subtree. Nodes are stored after their children, so a subtree is
+    a contiguous range of indices that ends with its root. Tokens are kept as
+    their type, line and column, strings and integers are interned in
+    ``values``. ``view`` gives an object of the node class over a stored node,
+    backends compile views like the nodes the parser builds.
+    """
+
+    def __init__(self):
+        self.kinds = array("B")
+        self.offsets = array("I")
+        self.firsts = array("I")
+        self.slots = array("i")
+        self.lists = array("i")
+        self.values: list[Any] = []
+        self._value_indices: dict[tuple[type, Any], int] = {}
+        self.roots = array("I")
+
+    @classmethod
+    def from_nodes(cls, nodes: Iterable[AstNode]) -> "AstArena":
+        """Packs top-level nodes one at a time, a node is dropped as soon as it is packed."""
+        arena = cls()
+        for node in nodes:
+            arena.roots.append(arena.add(node))
+        return arena
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def intern(self, value: Any) -> int:
+        # Keyed by type too, 1 and "1" are different values
+        key = (type(value), value)
+        index = self._value_indices.get(key)
+        if index is None:
+            index = self._value_indices[key] = len(self.values)
+            self.values.append(value)
+        return index
+
+    def add(self, root: AstNode) -> int:
+        """Packs the node with its subtree and returns its index."""
+        indices: dict[int, int] = {}
+        # Every node waits for its children with the index its subtree starts at
+        stack = [(root, _child_nodes(root), len(self.kinds))]
+        while stack:
+            node, children, first = stack[-1]
+            child = next(children, None)
+            if child is not None:
+                stack.append((child, _child_nodes(child), len(self.kinds)))
+                continue
+            stack.pop()
+            indices[id(node)] = self._append(node, first, indices)
+        return indices[id(root)]
+
+    def _append(self, node: AstNode, first: int, indices: dict[int, int]) -> int:
+        kind = _KIND_INDICES[type(node)]
+        self.kinds.append(kind)
+        self.offsets.append(len(self.slots))
+        self.firsts.append(first)
+        for name, codec, _, _ in _LAYOUTS[kind]:
+            value = getattr(node, name)
+            if codec is _Codec.TOKEN:
+                token_type = _TOKEN_TYPE_INDICES[value.token_type]
+                self.slots.extend((token_type, self.intern(value.value), value.line, value.pos))
+            elif codec is _Codec.NODE:
+                self.slots.append(indices[id(value)])
+            elif codec is _Codec.OPTIONAL_NODE:
+                self.slots.append(_NO_NODE if value is None else indices[id(value)])
+            elif codec is _Codec.NODES:
+                self.slots.extend((len(self.lists), len(value)))
+                self.lists.extend(indices[id(item)] for item in value)
+            elif codec is _Codec.NAMES:
+                self.slots.extend((len(self.lists), len(value)))
+                self.lists.extend(self.intern(item) for item in value)
+            elif codec is _Codec.ENUM:
+                self.slots.append(_ENUM_INDICES[type(value), value])
+            else:
+                self.slots.append(self.intern(value))
+        return len(self.kinds) - 1
+
+    def view(self, index: int) -> AstNode:
+        view = _VIEW_CLASSES[self.kinds[index]].__new__(_VIEW_CLASSES[self.kinds[index]])
+        view.arena = self
+        view.index = index
+        return view
+
+    def top_level(self) -> list[AstNode]:
+        return [self.view(index) for index in self.roots]
+
+    def subtree(self, index: int) -> range:
+        return range(self.firsts[index], index + 1)
+
+    def decode(self, index: int, name: str, nodes: Callable[[int], Any]) -> Any:
+        """Value of a field of the node, nested nodes are made by ``nodes`` from their indices."""
+        decoder, offset = _FIELDS[self.kinds[index]][name]
+        return decoder(self, self.offsets[index] + offset, nodes)
+
+    def materialize(self, index: int) -> AstNode:
+        """The node as a tree of plain nodes, built without recursion."""
+        built: dict[int, AstNode] = {}
+        for node_index in self.subtree(index):
+            node_class = NODE_KINDS[self.kinds[node_index]]
+            built[node_index] = node_class(**{
+                name: self.decode(node_index, name, built.__getitem__)
+                for name, _, _, _ in _LAYOUTS[self.kinds[node_index]]
+            })
+        return built[index]
+
+
+# Reads a field from its first slot, nested nodes are made by the given function
+_Decoder = Callable[[AstArena, int, Callable[[int], Any]], Any]
+
+
+def _decoder(codec: _Codec, field_type: Any) -> _Decoder:
+    # pylint: disable=unnecessary-lambda-assignment
+    decoder: _Decoder
+    if codec is _Codec.TOKEN:
+        decoder = lambda arena, slot, _: SpanToken(
+            _TOKEN_TYPES[arena.slots[slot]],
+            arena.values[arena.slots[slot + 1]],
+            arena.slots[slot + 2],
+            arena.slots[slot + 3],
+        )
+    elif codec is _Codec.NODE:
+        decoder = lambda arena, slot, nodes: nodes(arena.slots[slot])
+    elif codec is _Codec.OPTIONAL_NODE:
+        decoder = lambda arena, slot, nodes: (
+            None if arena.slots[slot] == _NO_NODE else nodes(arena.slots[slot])
+        )
+    elif codec is _Codec.NODES:
+        decoder = lambda arena, slot, nodes: [
+            nodes(item) for item in arena.lists[_list_range(arena, slot)]
+        ]
+    elif codec is _Codec.NAMES:
+        decoder = lambda arena, slot, _: [
+            arena.values[item] for item in arena.lists[_list_range(arena, slot)]
+        ]
+    elif codec is _Codec.ENUM:
+        members = list(field_type)
+        decoder = lambda arena, slot, _: members[arena.slots[slot]]
+    else:
+        decoder = lambda arena, slot, _: arena.values[arena.slots[slot]]
+    return decoder
+
+
+def _list_range(arena: AstArena, slot: int) -> slice:
+    return slice(arena.slots[slot], arena.slots[slot] + arena.slots[slot + 1])
+
+
+_FIELDS = tuple(
+    {name: (_decoder(codec, field_type), offset) for name, codec, offset, field_type in layout}
+    for layout in _LAYOUTS
+)
+
+
+def _unpacked(arena: AstArena, index: int) -> AstNode:
+    return arena.view(index)
+
+
+class _ArenaView:  # pylint: disable=too-few-public-methods
+    """Base of the views, a node is its arena and index."""
+
+    __slots__ = ("arena", "index")
+
+    arena: AstArena
+    index: int
+
+    def __reduce__(self):
+        # Sent to other processes in an arena of its own subtree instead of the whole arena,
+        # the arrays are pickled without recursion however deep the subtree is
+        subtree = AstArena()
+        return _unpacked, (subtree, subtree.add(self.arena.materialize(self.index)))
+
+
+def _field_property(decoder: _Decoder, offset: int) -> property:
+    def get(view: _ArenaView) -> Any:
+        arena = view.arena
+        return decoder(arena, arena.offsets[view.index] + offset, arena.view)
+
+    return property(get)
+
+
+class _ChildField:  # pylint: disable=too-few-public-methods
+    """Field of nested nodes, decoded on the first access and then kept by the view.
+
+    Backends read the children of a node several times, a kept view also keeps
+    the children it decoded, so a subtree is decoded once per traversal.
+    """
+
+    def __init__(self, name: str, decoder: _Decoder, offset: int):
+        self.name = name
+        self.decoder = decoder
+        self.offset = offset
+
+    def __get__(self, view: Optional[_ArenaView], owner: type) -> Any:
+        if view is None:
+            return self
+        arena = view.arena
+        # Stored under the field name, later reads find it before this descriptor
+        value = view.__dict__[self.name] = self.decoder(
+            arena, arena.offsets[view.index] + self.offset, arena.view
+        )
+        return value
+
+
+def _view_class(node_class: type[AstNode]) -> type:
+    namespace: dict[str, Any] = {"__slots__": ()}
+    kind = _KIND_INDICES[node_class]
+    children = {name for name, _ in _CHILD_FIELDS[kind]}
+    for name, (decoder, offset) in _FIELDS[kind].items():
+        if name in children:
+            namespace[name] = _ChildField(name, decoder, offset)
+        else:
+            namespace[name] = _field_property(decoder, offset)
+    return type(f"{node_class.__name__}View", (_ArenaView, node_class), namespace)
+
+
+_VIEW_CLASSES = tuple(_view_class(node_class) for node_class in NODE_KINDS)
+
+N = TypeVar("N", bound=AstNode)
+
+
+def find_nodes(node: AstNode, node_class: type[N]) -> Iterator[N]:
+    """Nodes of the class in the subtree of the node, views are found by scanning their kinds."""
+    if not isinstance(node, _ArenaView):
+        yield from (child for child in walk(node) if isinstance(child, node_class))
+        return
+    arena, kind = node.arena, _KIND_INDICES[node_class]
+    for index in arena.subtree(node.index):
+        if arena.kinds[index] == kind:
+            yield arena.view(index)  # type: ignore[misc]
@@ -1,11 +1,16 @@
 from abc import ABC, abstractmethod
-from dataclasses import dataclass
+from dataclasses import dataclass, fields
 from enum import Enum
-from typing import Optional
+from typing import Generator, Iterable, Iterator, Optional
 
 from comp3.compiler.lexer import Token, TokenType
 
 
+# A visitor of a node with nested nodes yields every nested node for the backend to compile,
+# visitors of leaves return None
+NodeCompiler = Optional[Generator["AstNode", None, None]]
+
+
 class AstBackend(ABC):
     @abstractmethod
     def visit(self, node: "AstNode"):
@@ -31,6 +36,10 @@ class AstBackend(ABC):
     def visit_loop_while_node(self, node: "LoopWhileNode"):
         pass
 
+    @abstractmethod
+    def visit_loop_for_node(self, node: "LoopForNode"):
+        pass
+
     @abstractmethod
     def visit_math_node(self, node: "MathNode"):
         pass
@@ -83,7 +92,7 @@ class AstBackend(ABC):
 # pylint: disable=too-few-public-methods
 class AstNode(ABC):
     @abstractmethod
-    def compile(self, backend: AstBackend):
+    def compile(self, backend: AstBackend) -> NodeCompiler:
         pass
 
 
@@ -93,7 +102,7 @@ class LetVarNode(AstNode):
     load_value: AstNode
 
     def compile(self, backend: AstBackend):
-        backend.visit_let_var_node(self)
+        return backend.visit_let_var_node(self)
 
     def __str__(self) -> str:
         return f"""{self.identifier} = {self.load_value}"""
@@ -110,7 +119,7 @@ class LetNode(AstNode):
         self.body.append(node)
 
     def compile(self, backend: AstBackend):
-        backend.visit_let_node(self)
+        return backend.visit_let_node(self)
 
     def __str__(self) -> str:
         s = f"""(
@@ -134,7 +143,7 @@ class SetNode(AstNode):
     load_value: AstNode
 
     def compile(self, backend: AstBackend):
-        backend.visit_set_node(self)
+        return backend.visit_set_node(self)
 
     def __str__(self) -> str:
         return f"""(
@@ -152,7 +161,7 @@ class SetPtrNode(AstNode):
     load_value: AstNode
 
     def compile(self, backend: AstBackend):
-        backend.visit_set_ptr_node(self)
+        return backend.visit_set_ptr_node(self)
 
 
 @dataclass
@@ -163,7 +172,7 @@ class LoopWhileNode(AstNode):
     body: list[AstNode]
 
     def compile(self, backend: AstBackend):
-        backend.visit_loop_while_node(self)
+        return backend.visit_loop_while_node(self)
 
     def __str__(self) -> str:
         s = f"""(
@@ -177,13 +186,50 @@ class LoopWhileNode(AstNode):
         return s
 
 
+# pylint: disable=too-many-instance-attributes
+@dataclass
+class LoopForNode(AstNode):
+    class Direction(str, Enum):
+        BELOW = "below"
+        ABOVE = "above"
+
+    start_token: Token
+    end_token: Token
+    identifier: str
+    from_value: AstNode
+    to_value: AstNode
+    step_value: Optional[AstNode]
+    direction: Direction
+    body: list[AstNode]
+
+    def compile(self, backend: AstBackend):
+        return backend.visit_loop_for_node(self)
+
+    def __str__(self) -> str:
+        s = f"""(
+\t({self.start_token.line}-{self.start_token.pos} to {self.end_token.line}-{self.end_token.pos})
+\tloop for {self.identifier} from\n"""
+        s += "\t\t" + "\t\t".join(str(self.from_value).splitlines(True))
+        s += f"\n\t{self.direction.value}\n"
+        s += "\t\t" + "\t\t".join(str(self.to_value).splitlines(True))
+        if self.step_value is not None:
+            s += "\n\tby\n"
+            s += "\t\t" + "\t\t".join(str(self.step_value).splitlines(True))
+        s += "\n\tdo\n"
+
+        for expr in self.body:
+            s += "\t\t" + "\t\t".join(str(expr).splitlines(True)) + "\n"
+        s += ")"
+        return s
+
+
 @dataclass
 class GetCharNode(AstNode):
     start_token: Token
     end_token: Token
 
     def compile(self, backend: AstBackend):
-        backend.visit_get_char_node(self)
+        return backend.visit_get_char_node(self)
 
     def __str__(self) -> str:
         return (
@@ -199,7 +245,7 @@ class PutCharNode(AstNode):
     load_value: AstNode
 
     def compile(self, backend: AstBackend):
-        backend.visit_put_char_node(self)
+        return backend.visit_put_char_node(self)
 
     def __str__(self) -> str:
         return f"""(
@@ -230,7 +276,7 @@ class MathNode(AstNode):
     op: MathOp
 
     def compile(self, backend: AstBackend):
-        backend.visit_math_node(self)
+        return backend.visit_math_node(self)
 
     def __str__(self) -> str:
         s = f"""(
@@ -253,7 +299,7 @@ class FuncNode(AstNode):
     body: list[AstNode]
 
     def compile(self, backend: AstBackend):
-        backend.visit_func_node(self)
+        return backend.visit_func_node(self)
 
     def __str__(self) -> str:
         s = (
@@ -279,7 +325,7 @@ class IfNode(AstNode):
     false_expr: Optional[AstNode]
 
     def compile(self, backend: AstBackend):
-        backend.visit_if_node(self)
+        return backend.visit_if_node(self)
 
     def __str__(self) -> str:
         s = f"""(
@@ -303,7 +349,7 @@ class FuncCallNode(AstNode):
     params: list[AstNode]
 
     def compile(self, backend: AstBackend):
-        backend.visit_func_call_node(self)
+        return backend.visit_func_call_node(self)
 
     def __str__(self) -> str:
         s = f"""(
@@ -327,7 +373,7 @@ class StrAllocNode(AstNode):
     size: int
 
     def compile(self, backend: AstBackend):
-        backend.visit_str_alloc_node(self)
+        return backend.visit_str_alloc_node(self)
 
     def __str__(self) -> str:
         return f"(alloc_str {self.identifier} {self.size} chars)"
@@ -339,7 +385,7 @@ class IntLiteralNode(AstNode):
     value: int
 
     def compile(self, backend: AstBackend):
-        backend.visit_int_literal_node(self)
+        return backend.visit_int_literal_node(self)
 
     def __str__(self) -> str:
         return str(self.value)
@@ -351,7 +397,7 @@ class StringLiteralNode(AstNode):
     value: str
 
     def compile(self, backend: AstBackend):
-        backend.visit_string_literal_node(self)
+        return backend.visit_string_literal_node(self)
 
     def __str__(self) -> str:
         return f'"{self.value}"'
@@ -363,7 +409,7 @@ class LoadByIdentifierNode(AstNode):
     identifier: str
 
     def compile(self, backend: AstBackend):
-        backend.visit_load_by_identifier_node(self)
+        return backend.visit_load_by_identifier_node(self)
 
     def __str__(self) -> str:
         return f"({self.identifier})"
@@ -376,7 +422,7 @@ class LoadByPointerIdentifierNode(AstNode):
     identifier: str
 
     def compile(self, backend: AstBackend):
-        backend.visit_load_by_pointer_identifier_node(self)
+        return backend.visit_load_by_pointer_identifier_node(self)
 
 
 @dataclass
@@ -386,7 +432,35 @@ class MultipleExpressionNode(AstNode):
     expressions: list[AstNode]
 
     def compile(self, backend: AstBackend):
-        backend.visit_multiple_expressions_node(self)
+        return backend.visit_multiple_expressions_node(self)
+
+
+def source_position(node: AstNode) -> Optional[tuple[int, int]]:
+    token = getattr(node, "start_token", None) or getattr(node, "token", None)
+    if token is None:
+        return None
+    return token.line, token.pos
+
+
+def iter_child_nodes(node: AstNode) -> Iterator[AstNode]:
+    for node_field in fields(node):  # type: ignore[arg-type]
+        value = getattr(node, node_field.name)
+        if isinstance(value, AstNode):
+            yield value
+        elif isinstance(value, list):
+            yield from (item for item in value if isinstance(item, AstNode))
+
+
+def walk(node: AstNode) -> Iterator[AstNode]:
+    nodes = [node]
+    while len(nodes) != 0:
+        current = nodes.pop()
+        yield current
+        nodes.extend(iter_child_nodes(current))
+
+
+# A production of the parser, it returns the node it parsed
+NodeParser = Generator[None, AstNode, AstNode]
 
 
 def unexpected_eof(token: Token) -> ValueError:
@@ -402,24 +476,44 @@ def unexpected_token(token: Token, expected: str) -> ValueError:
 
 
 class AstBuilder:
-    def __init__(self, tokens: list[Token]):
-        self.tokens = tokens
-        self.i = 0
+    """Parses nodes from a stream of tokens without recursion.
+
+    Every production is a generator, it yields when it needs the next nested node
+    and gets the node sent back. ``parse_node`` keeps the unfinished productions on
+    its own stack, so the nesting depth isn't limited by the Python stack. Tokens
+    are read one at a time and only when needed.
+    """
+
+    def __init__(self, tokens: Iterable[Token]):
+        self.tokens = iter(tokens)
+        # The next token once it was read, and the last consumed one for EOF errors
+        self.next_token: Optional[Token] = None
+        self.last_token: Optional[Token] = None
 
     def is_eof(self) -> bool:
-        return self.i >= len(self.tokens)
+        if self.next_token is None:
+            self.next_token = next(self.tokens, None)
+        return self.next_token is None
 
     def _get_next_token(self) -> Token:
-        token = self._peek_next_token()
-        self.i += 1
+        token = self.next_token or self._read_token()
+        self.last_token = token
+        self.next_token = None
         return token
 
     def _peek_next_token(self) -> Token:
-        if self.is_eof():
-            raise unexpected_eof(self.tokens[-1])
-        return self.tokens[self.i]
+        if self.next_token is None:
+            self.next_token = self._read_token()
+        return self.next_token
+
+    def _read_token(self) -> Token:
+        token = next(self.tokens, None)
+        if token is None:
+            assert self.last_token is not None
+            raise unexpected_eof(self.last_token)
+        return token
 
-    def parse_let_vars(self) -> list[LetVarNode]:
+    def parse_let_vars(self) -> Generator[None, AstNode, list[LetVarNode]]:
         let_vars: list[LetVarNode] = []
         token = self._get_next_token()
 
@@ -432,7 +526,7 @@ class AstBuilder:
             identifier_token = self._get_next_token()
             if identifier_token.token_type != TokenType.IDENTIFIER:
                 raise unexpected_token(token, "an identifier for the variable")
-            load_value = self.parse_node()
+            load_value = yield
 
             if (closing_token := self._get_next_token()).token_type != TokenType.RIGHT_PARENTHESIS:
                 raise unexpected_token(closing_token, ")")
@@ -447,7 +541,59 @@ class AstBuilder:
             raise unexpected_token(end_token, ")")
         return end_token
 
-    def parse_loop_node(self, start_token: Token) -> AstNode:
+    def _try_get_keyword_token(self, keyword: str) -> Token:
+        token = self._get_next_token()
+        if token.token_type != TokenType.IDENTIFIER or token.value != keyword:
+            raise unexpected_token(token, keyword)
+        return token
+
+    def parse_loop_body(self) -> Generator[None, AstNode, list[AstNode]]:
+        body: list[AstNode] = []
+        while self._peek_next_token().token_type != TokenType.RIGHT_PARENTHESIS:
+            node = yield
+            body.append(node)
+        return body
+
+    def parse_loop_for_node(self, start_token: Token) -> NodeParser:
+        # (loop for identifier from expr below|above expr [by expr] do
+        #   body_expr
+        #   body_expr
+        #   ...
+        # )
+        identifier = self._get_next_token()
+        if identifier.token_type != TokenType.IDENTIFIER:
+            raise unexpected_token(identifier, "an identifier for the loop counter")
+        self._try_get_keyword_token("from")
+        from_value = yield
+
+        direction_token = self._get_next_token()
+        if (
+            direction_token.token_type != TokenType.IDENTIFIER
+            or direction_token.value not in LoopForNode.Direction.__members__.values()
+        ):
+            raise unexpected_token(direction_token, "below or above")
+        to_value = yield
+
+        step_value = None
+        if self._peek_next_token().value == "by":
+            self._get_next_token()
+            step_value = yield
+        self._try_get_keyword_token("do")
+
+        body = yield from self.parse_loop_body()
+        end_token = self._get_next_token()
+        return LoopForNode(
+            start_token,
+            end_token,
+            identifier.value,
+            from_value,
+            to_value,
+            step_value,
+            LoopForNode.Direction(direction_token.value),
+            body,
+        )
+
+    def parse_loop_node(self, start_token: Token) -> NodeParser:
         loop_op = self._get_next_token()
 
         if loop_op.token_type == TokenType.IDENTIFIER and loop_op.value == "while":
@@ -456,23 +602,21 @@ class AstBuilder:
             #   body_expr
             #   ...
             # )
-            loop_condition = self.parse_node()
-            do_token = self._get_next_token()
-            if do_token.token_type != TokenType.IDENTIFIER or do_token.value != "do":
-                raise unexpected_token(do_token, "do")
-            body: list[AstNode] = []
-            while self._peek_next_token().token_type != TokenType.RIGHT_PARENTHESIS:
-                body.append(self.parse_node())
+            loop_condition = yield
+            self._try_get_keyword_token("do")
+            body = yield from self.parse_loop_body()
             end_token = self._get_next_token()
             return LoopWhileNode(start_token, end_token, loop_condition, body)
+        if loop_op.token_type == TokenType.IDENTIFIER and loop_op.value == "for":
+            return (yield from self.parse_loop_for_node(start_token))
         raise unexpected_token(loop_op, "while or for")
 
-    def parse_set_node(self, start_token: Token) -> AstNode:
+    def parse_set_node(self, start_token: Token) -> NodeParser:
         # (set identifier expr)
         identifier = self._get_next_token()
         if identifier.token_type != TokenType.IDENTIFIER:
             raise unexpected_token(identifier, "an identifier")
-        load_value = self.parse_node()
+        load_value = yield
         return SetNode(
             start_token,
             self._try_get_end_token(),
@@ -480,12 +624,12 @@ class AstBuilder:
             load_value,
         )
 
-    def parse_set_ptr_node(self, start_token: Token) -> AstNode:
+    def parse_set_ptr_node(self, start_token: Token) -> NodeParser:
         # (set_ptr identifier expr)
         identifier = self._get_next_token()
         if identifier.token_type != TokenType.IDENTIFIER:
             raise unexpected_token(identifier, "an identifier")
-        load_value = self.parse_node()
+        load_value = yield
         return SetPtrNode(
             start_token,
             self._try_get_end_token(),
@@ -495,7 +639,7 @@ class AstBuilder:
 
     def parse_defun_node(
         self, start_token: Token, token: Token, is_global: bool = False
-    ) -> AstNode:
+    ) -> NodeParser:
         # (defun identifier (param_identifier_1 param_identifier_2 ...)
         #   body_expr
         #   body_expr
@@ -530,7 +674,8 @@ class AstBuilder:
         body: list[AstNode] = []
 
         while self._peek_next_token().token_type != TokenType.RIGHT_PARENTHESIS:
-            body.append(self.parse_node())
+            node = yield
+            body.append(node)
 
         return FuncNode(
             start_token,
@@ -563,16 +708,17 @@ class AstBuilder:
             int(size.value),
         )
 
-    def parse_let_node(self, start_token: Token) -> AstNode:
+    def parse_let_node(self, start_token: Token) -> NodeParser:
         # (let ((varname expr) (varname expr) ...)
         #   body_expr
         #   body_expr
         #   ...
         # )
-        let_vars = self.parse_let_vars()
+        let_vars = yield from self.parse_let_vars()
         let_body: list[AstNode] = []
         while self._peek_next_token().token_type != TokenType.RIGHT_PARENTHESIS:
-            let_body.append(self.parse_node())
+            node = yield
+            let_body.append(node)
         end_token = self._get_next_token()  # Consume the closing parenthesis
         return LetNode(start_token, end_token, let_vars, let_body)
 
@@ -583,13 +729,13 @@ class AstBuilder:
         identifier = self._get_next_token()
         return LoadByPointerIdentifierNode(start_token, self._try_get_end_token(), identifier.value)
 
-    def parse_if_node(self, start_token: Token) -> AstNode:
+    def parse_if_node(self, start_token: Token) -> NodeParser:
         # (if expr true_expr [false_expr])
-        condition = self.parse_node()
-        true_expr = self.parse_node()
+        condition = yield
+        true_expr = yield
         false_expr = None
         if self._peek_next_token().token_type != TokenType.RIGHT_PARENTHESIS:
-            false_expr = self.parse_node()
+            false_expr = yield
         return IfNode(
             start_token,
             self._try_get_end_token(),
@@ -598,38 +744,41 @@ class AstBuilder:
             false_expr,
         )
 
-    def parse_func_call_node(self, start_token: Token, token: Token) -> AstNode:
+    def parse_func_call_node(self, start_token: Token, token: Token) -> NodeParser:
         # (func_identifier [params])
         params: list[AstNode] = []
 
         while self._peek_next_token().token_type != TokenType.RIGHT_PARENTHESIS:
-            params.append(self.parse_node())
+            node = yield
+            params.append(node)
 
         return FuncCallNode(start_token, self._get_next_token(), token.value, params)
 
-    def parse_keywords(self, start_token: Token, token: Token, is_global: bool = False) -> AstNode:
+    def parse_keywords(
+        self, start_token: Token, token: Token, is_global: bool = False
+    ) -> NodeParser:
         node: AstNode
 
         if token.value == "let":
-            node = self.parse_let_node(start_token)
+            node = yield from self.parse_let_node(start_token)
         elif token.value == "set":
-            node = self.parse_set_node(start_token)
+            node = yield from self.parse_set_node(start_token)
         elif token.value == "set_ptr":
-            node = self.parse_set_ptr_node(start_token)
+            node = yield from self.parse_set_ptr_node(start_token)
         elif token.value == "get_char":
             # (get_char)
             node = GetCharNode(start_token, self._try_get_end_token())
         elif token.value == "put_char":
             # (put_char expr)
-            load_value = self.parse_node()
+            load_value = yield
             node = PutCharNode(start_token, self._try_get_end_token(), load_value)
         elif token.value == "loop":
-            node = self.parse_loop_node(start_token)
+            node = yield from self.parse_loop_node(start_token)
         elif token.value in MathNode.MathOp.__members__.values():
             # (mathop left_operand right_operand)
             math_op = MathNode.MathOp(token.value)
-            left_operand = self.parse_node()
-            right_opreand = self.parse_node()
+            left_operand = yield
+            right_opreand = yield
             node = MathNode(
                 start_token,
                 self._try_get_end_token(),
@@ -638,51 +787,75 @@ class AstBuilder:
                 math_op,
             )
         elif token.value == "defun":
-            node = self.parse_defun_node(start_token, token, is_global)
+            node = yield from self.parse_defun_node(start_token, token, is_global)
         elif token.value == "if":
-            node = self.parse_if_node(start_token)
+            node = yield from self.parse_if_node(start_token)
         elif token.value == "alloc_str":
             node = self.parse_alloc_str_node(start_token, token, is_global)
         elif token.value == "@":
             node = self.parse_load_by_pointer_node(start_token)
         else:
             # Everything else is assumed to be a function call
-            node = self.parse_func_call_node(start_token, token)
+            node = yield from self.parse_func_call_node(start_token, token)
 
         return node
 
-    def parse_multiple_expressions_node(self, start_token: Token) -> AstNode:
+    def parse_multiple_expressions_node(self, start_token: Token) -> NodeParser:
         nodes: list[AstNode] = []
         while self._peek_next_token().token_type != TokenType.RIGHT_PARENTHESIS:
-            nodes.append(self.parse_node())
+            node = yield
+            nodes.append(node)
         return MultipleExpressionNode(start_token, self._get_next_token(), nodes)
 
     def parse_node(self, is_global: bool = False) -> AstNode:
         token = self._get_next_token()
-
-        if token.token_type == TokenType.LEFT_PARENTHESIS:
-            start_token = token
-            if self._peek_next_token().token_type == TokenType.IDENTIFIER:
-                return self.parse_keywords(start_token, self._get_next_token(), is_global)
-            if self._peek_next_token().token_type == TokenType.LEFT_PARENTHESIS:
-                return self.parse_multiple_expressions_node(start_token)
-        elif token.token_type == TokenType.BOOL_LITERAL:
+        if token.token_type != TokenType.LEFT_PARENTHESIS:
+            return self._parse_leaf(token)
+
+        stack = [self._parse_list(token, is_global)]
+        node: Optional[AstNode] = None
+        while True:
+            try:
+                stack[-1].send(node)
+            except StopIteration as finished:
+                stack.pop()
+                if len(stack) == 0:
+                    return finished.value
+                node = finished.value
+            else:
+                # Only lists need a production of their own, nested nodes are never global
+                token = self._get_next_token()
+                if token.token_type == TokenType.LEFT_PARENTHESIS:
+                    stack.append(self._parse_list(token))
+                    node = None
+                else:
+                    node = self._parse_leaf(token)
+
+    def _parse_list(self, start_token: Token, is_global: bool = False) -> NodeParser:
+        if self._peek_next_token().token_type == TokenType.IDENTIFIER:
+            return (yield from self.parse_keywords(start_token, self._get_next_token(), is_global))
+        if self._peek_next_token().token_type == TokenType.LEFT_PARENTHESIS:
+            return (yield from self.parse_multiple_expressions_node(start_token))
+        raise unexpected_token(start_token, "dmitrik to write better code")
+
+    def _parse_leaf(self, token: Token) -> AstNode:
+        if token.token_type == TokenType.BOOL_LITERAL:
             return IntLiteralNode(token, 1 if token.value == "true" else 0)
-        elif token.token_type == TokenType.INT_LITERAL:
+        if token.token_type == TokenType.INT_LITERAL:
             return IntLiteralNode(token, int(token.value))
-        elif token.token_type == TokenType.STRING_LITERAL:
+        if token.token_type == TokenType.STRING_LITERAL:
             return StringLiteralNode(token, token.value)
-        elif token.token_type == TokenType.IDENTIFIER:
+        if token.token_type == TokenType.IDENTIFIER:
             return LoadByIdentifierNode(token, token.value)
-
         raise unexpected_token(token, "dmitrik to write better code")
 
 
-def build_nodes_from_tokens(tokens: list[Token]):
+def iter_nodes_from_tokens(tokens: Iterable[Token]) -> Iterator[AstNode]:
+    """Yields every top-level node as soon as its last token was read."""
     builder = AstBuilder(tokens)
-    nodes: list[AstNode] = []
-
     while not builder.is_eof():
-        nodes.append(builder.parse_node(True))
+        yield builder.parse_node(True)
+
 
-    return nodes
+def build_nodes_from_tokens(tokens: Iterable[Token]) -> list[AstNode]:
+    return list(iter_nodes_from_tokens(tokens))
@@ -1,12 +1,12 @@
+from typing import Generator, Optional
+
 from comp3.common.config import IO_READ_ADDRESS, IO_WRITE_ADDRESS
 from comp3.common.instructions import (
     DataStubInstruction,
-    DataWord,
     InstrStubInstruction,
     Instruction,
     OpCode,
     OperandType,
-    Program,
 )
 from comp3.compiler.ast import (
     AstBackend,
@@ -20,6 +20,7 @@ from comp3.compiler.ast import (
     LetVarNode,
     LoadByIdentifierNode,
     LoadByPointerIdentifierNode,
+    LoopForNode,
     LoopWhileNode,
     MathNode,
     MultipleExpressionNode,
@@ -28,13 +29,40 @@ from comp3.compiler.ast import (
     SetPtrNode,
     StrAllocNode,
     StringLiteralNode,
+    source_position,
 )
+from comp3.compiler.call_graph import contains_func_call
+from comp3.compiler.pgo import INLINE_MAX_DEPTH, ProfileHints, SiteKey, site_key
+from comp3.machine.cost_model import CostModel, get_cost_model
 
 
-class Comp3Backend(AstBackend):
-    stub_counter = 0
+# Frame owner of the top-level code, contains a space so it can't clash with a function name
+MAIN_FRAME_OWNER = "main program"
+
+
+def frame_slot_identifier(owner: str, index: int) -> str:
+    return f" frame {owner} {index}"
 
-    def __init__(self, io_read_addr: int = IO_READ_ADDRESS, io_write_addr: int = IO_WRITE_ADDRESS):
+
+# Stub ids of one backend, fragments compiled by different backends use separate ranges
+FRAGMENT_STUB_IDS = 1 << 32
+
+
+# pylint: disable=too-many-instance-attributes,too-many-public-methods
+class Comp3Backend(AstBackend):
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        io_read_addr: int = IO_READ_ADDRESS,
+        io_write_addr: int = IO_WRITE_ADDRESS,
+        *,
+        static_functions: Optional[dict[str, int]] = None,
+        frame_owner: Optional[str] = None,
+        cost_model: Optional[CostModel] = None,
+        profile_hints: Optional[ProfileHints] = None,
+        rotate_loops: bool = True,
+        stub_namespace: int = 0,
+    ):
         self.stack_identifiers: list[str] = []
         self.program: list[Instruction] = []
         self.string_literals: set[str] = set()
@@ -42,63 +70,166 @@ class Comp3Backend(AstBackend):
         self.io_read_addr = io_read_addr
         self.io_write_addr = io_write_addr
 
-    @classmethod
-    def get_stub_id(cls):
-        Comp3Backend.stub_counter += 1
-        return Comp3Backend.stub_counter
+        # Non-recursive functions (name -> parameter count) have their frame
+        # at fixed data memory addresses instead of the stack
+        self.static_functions = static_functions if static_functions is not None else {}
+        self.frame_owner = frame_owner
+        self.frame_identifiers: list[str] = []
+        self.frame_sizes: dict[str, int] = {}
+
+        self.cost_model = cost_model if cost_model is not None else get_cost_model()
+
+        # Jump instruction of every branch, loop and call node, so a profile
+        # of the compiled program can be mapped back to the nodes
+        self.profile_sites: dict[SiteKey, Instruction] = {}
+        # Source line and column of every emitted instruction
+        self.source_positions: list[Optional[tuple[int, int]]] = []
+        self.call_sites: dict[SiteKey, str] = {}
+        self.profile_hints = profile_hints
+        self.rotate_loops = rotate_loops
+        self.inline_depth = 0
+        # Locals below this index belong to the caller of an inlined function
+        self.scope_base = 0
+        self.stub_namespace = stub_namespace
+        self.stub_count = 0
+
+    def get_stub_id(self) -> int:
+        self.stub_count += 1
+        return self.stub_namespace * FRAGMENT_STUB_IDS + self.stub_count
 
     def visit(self, node: AstNode):
-        node.compile(self)
+        """Compiles the node, nested nodes are kept on an explicit stack instead of recursion.
+
+        Visitors of nodes with nested nodes are generators that yield a nested node
+        whenever it has to be compiled, and continue once its code is emitted.
+        """
+        # Unfinished nodes with their visitors and the source position of the code they emit
+        stack: list[tuple[Generator[AstNode, None, None], Optional[tuple[int, int]]]] = []
+        nested: Optional[AstNode] = node
+        while True:
+            if nested is not None:
+                outer_position = stack[-1][1] if stack else None
+                self._claim_instructions(outer_position)
+                # Code of a node without a position is mapped to the closest node with one
+                position = source_position(nested)
+                if position is None:
+                    position = outer_position
+                visitor = nested.compile(self)
+                if visitor is None:
+                    self._claim_instructions(position)
+                else:
+                    stack.append((visitor, position))
+            if len(stack) == 0:
+                return
+            visitor, position = stack[-1]
+            # Visitors never yield None, it means the node is finished
+            nested = next(visitor, None)
+            if nested is None:
+                stack.pop()
+                self._claim_instructions(position)
+
+    def _claim_instructions(self, position: Optional[tuple[int, int]]):
+        # Instructions emitted since the last claim are mapped to the position
+        unclaimed = len(self.program) - len(self.source_positions)
+        self.source_positions.extend([position] * unclaimed)
 
     def visit_multiple_expressions_node(self, node: MultipleExpressionNode):
-        for expr in node.expressions:
-            expr.compile(self)
+        yield from node.expressions
+
+    def _locals(self) -> list[str]:
+        if self.frame_owner is not None:
+            return self.frame_identifiers
+        return self.stack_identifiers
+
+    def _local_operand_type(self) -> OperandType:
+        return OperandType.STACK_OFFSET if self.frame_owner is None else OperandType.ADDRESS
+
+    def _find_local(self, identifier: str) -> Optional[int]:
+        local_identifiers = self._locals()
+        visible_identifiers = local_identifiers[self.scope_base :]
+        if identifier not in visible_identifiers:
+            return None
+        return len(local_identifiers) - 1 - visible_identifiers[::-1].index(identifier)
+
+    def _local_instruction(
+        self, op_code: OpCode, slot: int, comment: str, by_pointer: bool = False
+    ) -> Instruction:
+        if self.frame_owner is not None:
+            return DataStubInstruction(
+                op_code=op_code,
+                operand_type=OperandType.POINTER_ADDRESS if by_pointer else OperandType.ADDRESS,
+                operand=0,
+                data_stub_identifier=frame_slot_identifier(self.frame_owner, slot),
+                comment=comment,
+            )
+        return Instruction(
+            op_code=op_code,
+            operand_type=(
+                OperandType.POINTER_STACK_OFFSET if by_pointer else OperandType.STACK_OFFSET
+            ),
+            operand=len(self.stack_identifiers) - 1 - slot,
+            comment=comment,
+        )
+
+    def _grow_frame(self, owner: str, size: int):
+        self.frame_sizes[owner] = max(self.frame_sizes.get(owner, 0), size)
+
+    def _bind_local(self, identifier: str, description: str) -> int:
+        # Value to bind is in AC
+        if self.frame_owner is not None:
+            self.frame_identifiers.append(identifier)
+            self._grow_frame(self.frame_owner, len(self.frame_identifiers))
+            slot = len(self.frame_identifiers) - 1
+            self.program.append(
+                self._local_instruction(OpCode.ST, slot, f"stored {description} in static frame")
+            )
+            return slot
 
-    def visit_let_var_node(self, node: LetVarNode):
-        node.load_value.compile(self)
         self.program.append(
             Instruction(
                 op_code=OpCode.PUSH,
                 operand_type=OperandType.NO_OPERAND,
                 operand=0,
-                comment=f'pushed variable "{node.identifier}" onto stack',
+                comment=f"pushed {description} onto stack",
             )
         )
-        self.stack_identifiers.append(node.identifier)
+        self.stack_identifiers.append(identifier)
+        return len(self.stack_identifiers) - 1
 
-    def visit_let_node(self, node: LetNode):
-        for var in node.var_nodes:
-            var.compile(self)
-
-        for body_expr in node.body:
-            body_expr.compile(self)
+    def _unbind_local(self, identifier: str, description: str):
+        local_identifiers = self._locals()
+        if local_identifiers[-1] != identifier:
+            raise ValueError("DEBUG: Stack pop identifiers did not match, this should not happen")
+        local_identifiers.pop()
 
-        for var in node.var_nodes[::-1]:
-            if self.stack_identifiers[-1] != var.identifier:
-                raise ValueError(
-                    "DEBUG: Stack pop identifiers did not match, this should not happen"
-                )
-            self.stack_identifiers.pop()
+        if self.frame_owner is None:
             self.program.append(
                 Instruction(
                     op_code=OpCode.POP,
                     operand_type=OperandType.NO_OPERAND,
                     operand=0,
-                    comment=f'popped variable "{var.identifier}" out of stack',
+                    comment=f"popped {description} out of stack",
                 )
             )
 
+    def visit_let_var_node(self, node: LetVarNode):
+        yield node.load_value
+        self._bind_local(node.identifier, f'variable "{node.identifier}"')
+
+    def visit_let_node(self, node: LetNode):
+        yield from node.var_nodes
+
+        yield from node.body
+
+        for var in node.var_nodes[::-1]:
+            self._unbind_local(var.identifier, f'variable "{var.identifier}"')
+
     def visit_set_node(self, node: SetNode):
-        node.load_value.compile(self)
+        yield node.load_value
 
-        if node.identifier in self.stack_identifiers:
+        if (slot := self._find_local(node.identifier)) is not None:
             self.program.append(
-                Instruction(
-                    op_code=OpCode.ST,
-                    operand_type=OperandType.STACK_OFFSET,
-                    operand=self.stack_identifiers[::-1].index(node.identifier),
-                    comment=f"update variable {node.identifier}",
-                )
+                self._local_instruction(OpCode.ST, slot, f"update variable {node.identifier}")
             )
         else:
             self.program.append(
@@ -112,15 +243,12 @@ class Comp3Backend(AstBackend):
             )
 
     def visit_set_ptr_node(self, node: SetPtrNode):
-        node.load_value.compile(self)
+        yield node.load_value
 
-        if node.identifier in self.stack_identifiers:
+        if (slot := self._find_local(node.identifier)) is not None:
             self.program.append(
-                Instruction(
-                    op_code=OpCode.ST,
-                    operand_type=OperandType.POINTER_STACK_OFFSET,
-                    operand=self.stack_identifiers[::-1].index(node.identifier),
-                    comment=f"update by pointer {node.identifier}",
+                self._local_instruction(
+                    OpCode.ST, slot, f"update by pointer {node.identifier}", by_pointer=True
                 )
             )
         else:
@@ -134,14 +262,13 @@ class Comp3Backend(AstBackend):
                 )
             )
 
-    def visit_loop_while_node(self, node: LoopWhileNode):
-        start_id = Comp3Backend.get_stub_id()
-        end_id = Comp3Backend.get_stub_id()
-
-        loop_condition_index = len(self.program)
-        node.loop_condition.compile(self)
-        self.program[loop_condition_index].instr_id.append(start_id)
+    def _record_site(self, node: AstNode):
+        self.profile_sites[site_key(node)] = self.program[-1]
 
+    def _loop_condition_jump(
+        self, node: LoopWhileNode, op_code: OpCode, comment: str, *, target: int, offset: int
+    ):
+        yield node.loop_condition
         self.program.append(
             Instruction(
                 op_code=OpCode.CMP,
@@ -150,20 +277,55 @@ class Comp3Backend(AstBackend):
                 comment="check if false",
             )
         )
-
         self.program.append(
             InstrStubInstruction(
-                op_code=OpCode.JZ,
+                op_code=op_code,
                 operand_type=OperandType.ADDRESS,
                 operand=0,
-                referenced_instr_id=end_id,
-                referenced_instr_offset=1,
-                comment="end while loop",
+                referenced_instr_id=target,
+                referenced_instr_offset=offset,
+                comment=comment,
             )
         )
 
-        for body_expr in node.body:
-            body_expr.compile(self)
+    def _visit_rotated_loop_while_node(self, node: LoopWhileNode):
+        # The condition is checked once on entry and then after every iteration,
+        # so an iteration doesn't pay for the jump back to the condition
+        body_id = self.get_stub_id()
+        end_id = self.get_stub_id()
+
+        yield from self._loop_condition_jump(
+            node, OpCode.JZ, "skip while loop", target=end_id, offset=1
+        )
+
+        body_index = len(self.program)
+        yield from node.body
+
+        yield from self._loop_condition_jump(
+            node, OpCode.JNZ, "repeat while loop", target=body_id, offset=0
+        )
+        self.program[body_index].instr_id.append(body_id)
+        self.program[-1].instr_id.append(end_id)
+
+    def visit_loop_while_node(self, node: LoopWhileNode):
+        # Without rotation only the loops the profile shows as hot are rotated
+        if self.rotate_loops or (
+            self.profile_hints is not None and self.profile_hints.mostly_falls_through(node)
+        ):
+            yield from self._visit_rotated_loop_while_node(node)
+            return
+
+        start_id = self.get_stub_id()
+        end_id = self.get_stub_id()
+
+        loop_condition_index = len(self.program)
+        yield from self._loop_condition_jump(
+            node, OpCode.JZ, "end while loop", target=end_id, offset=1
+        )
+        self.program[loop_condition_index].instr_id.append(start_id)
+        self._record_site(node)
+
+        yield from node.body
 
         self.program.append(
             InstrStubInstruction(
@@ -177,6 +339,114 @@ class Comp3Backend(AstBackend):
             )
         )
 
+    def _bind_loop_slot(self, value: AstNode, description: str) -> int:
+        yield value
+        # Loop slots stay anonymous until every header expression is compiled,
+        # so the bounds can still refer to an outer variable with the same name
+        return self._bind_local("", description)
+
+    def visit_loop_for_node(self, node: LoopForNode):
+        body_id = self.get_stub_id()
+        check_id = self.get_stub_id()
+        ascending = node.direction == LoopForNode.Direction.BELOW
+
+        counter_slot = yield from self._bind_loop_slot(
+            node.from_value, f'loop counter "{node.identifier}"'
+        )
+        bound_slot = yield from self._bind_loop_slot(node.to_value, "loop bound")
+        step_slot = None
+        if node.step_value is not None and not isinstance(node.step_value, IntLiteralNode):
+            step_slot = yield from self._bind_loop_slot(node.step_value, "loop step")
+        local_identifiers = self._locals()
+        local_identifiers[counter_slot] = node.identifier
+
+        self.program.append(
+            self._local_instruction(OpCode.LD, counter_slot, f"load loop counter {node.identifier}")
+        )
+        self.program.append(
+            InstrStubInstruction(
+                op_code=OpCode.JMP,
+                operand_type=OperandType.ADDRESS,
+                operand=0,
+                referenced_instr_id=check_id,
+                referenced_instr_offset=0,
+                comment="jump to for loop bound check",
+            )
+        )
+
+        body_index = len(self.program)
+        yield from node.body
+
+        step_op_code = OpCode.ADD if ascending else OpCode.SUB
+        local_operand_type = self._local_operand_type()
+        in_place_step = node.step_value is None or (
+            step_slot is None
+            and getattr(node.step_value, "value") == 1
+            and self.cost_model.ticks(OpCode.INC, local_operand_type)
+            < self.cost_model.ticks(OpCode.LD, local_operand_type)
+            + self.cost_model.ticks(step_op_code, OperandType.IMMEDIATE)
+            + self.cost_model.ticks(OpCode.ST, local_operand_type)
+        )
+        if in_place_step:
+            # Counter is updated in place and left in AC for the bound check
+            self.program.append(
+                self._local_instruction(
+                    OpCode.INC if ascending else OpCode.DEC,
+                    counter_slot,
+                    f"step loop counter {node.identifier}",
+                )
+            )
+        else:
+            self.program.append(
+                self._local_instruction(
+                    OpCode.LD, counter_slot, f"load loop counter {node.identifier}"
+                )
+            )
+            if step_slot is None:
+                self.program.append(
+                    Instruction(
+                        op_code=step_op_code,
+                        operand_type=OperandType.IMMEDIATE,
+                        operand=getattr(node.step_value, "value"),
+                        comment=f"step loop counter {node.identifier}",
+                    )
+                )
+            else:
+                self.program.append(
+                    self._local_instruction(
+                        step_op_code, step_slot, f"step loop counter {node.identifier}"
+                    )
+                )
+            self.program.append(
+                self._local_instruction(
+                    OpCode.ST, counter_slot, f"update loop counter {node.identifier}"
+                )
+            )
+
+        check_index = len(self.program)
+        self.program.append(
+            self._local_instruction(
+                OpCode.CMP, bound_slot, f"check loop counter {node.identifier} against bound"
+            )
+        )
+        self.program.append(
+            InstrStubInstruction(
+                op_code=OpCode.JB if ascending else OpCode.JA,
+                operand_type=OperandType.ADDRESS,
+                operand=0,
+                referenced_instr_id=body_id,
+                referenced_instr_offset=0,
+                comment="jump to for loop body",
+            )
+        )
+        self.program[body_index].instr_id.append(body_id)
+        self.program[check_index].instr_id.append(check_id)
+
+        if step_slot is not None:
+            self._unbind_local("", "loop step")
+        self._unbind_local("", "loop bound")
+        self._unbind_local(node.identifier, f'loop counter "{node.identifier}"')
+
     def visit_math_node(self, node: MathNode):
         math_to_op_code = {
             MathNode.MathOp.ADD: OpCode.ADD,
@@ -195,12 +465,12 @@ class Comp3Backend(AstBackend):
             MathNode.MathOp.GE: OpCode.JAE,
         }
 
-        end_stub_id = Comp3Backend.get_stub_id()
+        end_stub_id = self.get_stub_id()
 
         # Right operand is processed first only for
         # the left operand to be in AC, and right operand
         # will come from the stack
-        node.right_operand.compile(self)  # Right operand in AC
+        yield node.right_operand  # Right operand in AC
         self.program.append(
             Instruction(
                 op_code=OpCode.PUSH,
@@ -212,7 +482,7 @@ class Comp3Backend(AstBackend):
         self.stack_identifiers.append(
             ""
         )  # Anonymous identifier, probably won't be used by anyone, I hope.
-        node.left_operand.compile(self)  # Left operand in AC
+        yield node.left_operand  # Left operand in AC
 
         if node.op in math_to_op_code:
             self.program.append(
@@ -287,7 +557,7 @@ class Comp3Backend(AstBackend):
         )
 
     def visit_put_char_node(self, node: PutCharNode):
-        node.load_value.compile(self)
+        yield node.load_value
         self.program.append(
             Instruction(
                 op_code=OpCode.ST,
@@ -308,13 +578,11 @@ class Comp3Backend(AstBackend):
         )
 
     def visit_load_by_identifier_node(self, node: LoadByIdentifierNode):
-        if node.identifier in self.stack_identifiers:
+        if (slot := self._find_local(node.identifier)) is not None:
+            where = "stack" if self.frame_owner is None else "static frame"
             self.program.append(
-                Instruction(
-                    op_code=OpCode.LD,
-                    operand_type=OperandType.STACK_OFFSET,
-                    operand=self.stack_identifiers[::-1].index(node.identifier),
-                    comment=f"load by identifier {node.identifier} from stack",
+                self._local_instruction(
+                    OpCode.LD, slot, f"load by identifier {node.identifier} from {where}"
                 )
             )
         else:
@@ -329,13 +597,10 @@ class Comp3Backend(AstBackend):
             )
 
     def visit_load_by_pointer_identifier_node(self, node: LoadByPointerIdentifierNode):
-        if node.identifier in self.stack_identifiers:
+        if (slot := self._find_local(node.identifier)) is not None:
             self.program.append(
-                Instruction(
-                    op_code=OpCode.LD,
-                    operand_type=OperandType.POINTER_STACK_OFFSET,
-                    operand=self.stack_identifiers[::-1].index(node.identifier),
-                    comment=f"load by pointer {node.identifier}",
+                self._local_instruction(
+                    OpCode.LD, slot, f"load by pointer {node.identifier}", by_pointer=True
                 )
             )
         else:
@@ -349,7 +614,32 @@ class Comp3Backend(AstBackend):
                 )
             )
 
+    def visit_static_func_node(self, node: FuncNode):
+        # Non-recursive function, the caller has already stored the return
+        # address and the parameters into the function's static frame
+        self.frame_owner = node.identifier
+        self.frame_identifiers = [" ret_address", *node.param_identifiers]
+        self._grow_frame(node.identifier, len(self.frame_identifiers))
+
+        func_start_index = len(self.program)
+
+        yield from node.body
+
+        self.program.append(
+            self._local_instruction(
+                OpCode.JMP, 0, f"return from function {node.identifier}", by_pointer=True
+            )
+        )
+
+        self.program[func_start_index].instr_id.append(node.identifier)
+        self.frame_identifiers = []
+        self.frame_owner = None
+
     def visit_func_node(self, node: FuncNode):
+        if node.identifier in self.static_functions:
+            yield from self.visit_static_func_node(node)
+            return
+
         # Function declaration are always in global scope,
         # it's okay to assume that stack_identifiers is empty
         # and the stack is populated by the caller, consisting of
@@ -363,8 +653,7 @@ class Comp3Backend(AstBackend):
 
         func_start_index = len(self.program)
 
-        for body_expr in node.body:
-            body_expr.compile(self)
+        yield from node.body
 
         self.program.append(
             Instruction(
@@ -383,8 +672,156 @@ class Comp3Backend(AstBackend):
 
         self.program[func_start_index].instr_id.append(node.identifier)
 
+    def visit_static_func_call_node(self, node: FuncCallNode):
+        callee = node.func_identifier
+        if len(node.params) != self.static_functions[callee]:
+            raise ValueError(
+                f"Invalid call at line {node.start_token.line} col {node.start_token.pos},"
+                f" function {callee} expects {self.static_functions[callee]} parameters but"
+                f" {len(node.params)} were given"
+            )
+
+        return_stub_id = self.get_stub_id()
+
+        # A parameter is stored right into the callee's frame unless a later
+        # parameter calls a function, which may reach the callee and overwrite
+        # its frame, such parameters are kept on the stack until all are evaluated
+        spilled_count = max(
+            (index for index, param in enumerate(node.params) if contains_func_call(param)),
+            default=0,
+        )
+
+        for index, param in enumerate(node.params):
+            yield param
+            if index < spilled_count:
+                self.program.append(
+                    Instruction(
+                        op_code=OpCode.PUSH,
+                        operand_type=OperandType.NO_OPERAND,
+                        operand=0,
+                        comment=f"push parameter {index} onto stack",
+                    )
+                )
+                self.stack_identifiers.append("")
+            else:
+                self.program.append(
+                    DataStubInstruction(
+                        op_code=OpCode.ST,
+                        operand_type=OperandType.ADDRESS,
+                        operand=0,
+                        data_stub_identifier=frame_slot_identifier(callee, index + 1),
+                        comment=f"store parameter {index} into {callee} frame",
+                    )
+                )
+
+        for index in reversed(range(spilled_count)):
+            self.program.append(
+                Instruction(
+                    op_code=OpCode.LD,
+                    operand_type=OperandType.STACK_OFFSET,
+                    operand=spilled_count - 1 - index,
+                    comment=f"load parameter {index} from stack",
+                )
+            )
+            self.program.append(
+                DataStubInstruction(
+                    op_code=OpCode.ST,
+                    operand_type=OperandType.ADDRESS,
+                    operand=0,
+                    data_stub_identifier=frame_slot_identifier(callee, index + 1),
+                    comment=f"store parameter {index} into {callee} frame",
+                )
+            )
+        for index in reversed(range(spilled_count)):
+            self.program.append(
+                Instruction(
+                    op_code=OpCode.POP,
+                    operand_type=OperandType.NO_OPERAND,
+                    operand=0,
+                    comment=f"pop parameter {index} from stack",
+                )
+            )
+            if self.stack_identifiers.pop() != "":
+                raise ValueError(
+                    "DEBUG: Stack pop identifiers did not match, this should not happen"
+                )
+
+        self.program.append(
+            InstrStubInstruction(
+                op_code=OpCode.LD,
+                operand_type=OperandType.IMMEDIATE,
+                operand=0,
+                referenced_instr_id=return_stub_id,
+                referenced_instr_offset=1,
+                comment=f"load next instruction address (return from {callee})",
+            )
+        )
+        self.program.append(
+            DataStubInstruction(
+                op_code=OpCode.ST,
+                operand_type=OperandType.ADDRESS,
+                operand=0,
+                data_stub_identifier=frame_slot_identifier(callee, 0),
+                comment=f"store return address into {callee} frame",
+            )
+        )
+        self.program.append(
+            InstrStubInstruction(
+                op_code=OpCode.JMP,
+                operand_type=OperandType.ADDRESS,
+                operand=0,
+                instr_id=[return_stub_id],
+                referenced_instr_id=callee,
+                referenced_instr_offset=0,
+                comment="function call",
+            )
+        )
+        self._record_site(node)
+        self.call_sites[site_key(node)] = callee
+
+    def _inline_func_call_node(self, node: FuncCallNode):
+        callee = self.profile_hints.inline_functions[node.func_identifier]
+        if len(node.params) != len(callee.param_identifiers):
+            raise ValueError(
+                f"Invalid call at line {node.start_token.line} col {node.start_token.pos},"
+                f" function {callee.identifier} expects {len(callee.param_identifiers)}"
+                f" parameters but {len(node.params)} were given"
+            )
+
+        # Parameters are bound like let variables, anonymous until all of them are
+        # evaluated, and the body doesn't see any of the caller's variables
+        slots = []
+        for index, param in enumerate(node.params):
+            description = f"parameter {index} of inlined {callee.identifier}"
+            slots.append((yield from self._bind_loop_slot(param, description)))
+        local_identifiers = self._locals()
+        outer_scope_base = self.scope_base
+        self.scope_base = slots[0] if slots else len(local_identifiers)
+        for slot, identifier in zip(slots, callee.param_identifiers):
+            local_identifiers[slot] = identifier
+
+        self.inline_depth += 1
+        yield from callee.body
+        self.inline_depth -= 1
+        self.scope_base = outer_scope_base
+
+        for identifier in reversed(callee.param_identifiers):
+            self._unbind_local(identifier, f"parameter {identifier} of inlined {callee.identifier}")
+
     def visit_func_call_node(self, node: FuncCallNode):
-        return_stub_id = Comp3Backend.get_stub_id()
+        if (
+            self.profile_hints is not None
+            and self.inline_depth < INLINE_MAX_DEPTH
+            and self.profile_hints.should_inline(node)
+        ):
+            yield from self._inline_func_call_node(node)
+            return
+
+        if node.func_identifier in self.static_functions:
+            yield from self.visit_static_func_call_node(node)
+            return
+
+        return_stub_id = self.get_stub_id()
 
         self.program.append(
             InstrStubInstruction(
@@ -409,7 +846,7 @@ class Comp3Backend(AstBackend):
         )  # Return address pushed onto the stack, should be anonymous
 
         for index, param in enumerate(node.params):
-            param.compile(self)
+            yield param
             self.program.append(
                 Instruction(
                     op_code=OpCode.PUSH,
@@ -431,6 +868,8 @@ class Comp3Backend(AstBackend):
                 comment="function call",
             )
         )
+        self._record_site(node)
+        self.call_sites[site_key(node)] = node.func_identifier
 
         for index, param in reversed(list(enumerate(node.params))):
             self.program.append(
@@ -480,10 +919,60 @@ class Comp3Backend(AstBackend):
 
         self.string_buffers[node.identifier] = node.size
 
+    def _visit_if_node_true_last(self, node: IfNode):
+        # The true branch is the hot one, so it goes last where
+        # it doesn't have to jump over the false branch
+        true_expr_stub_id = self.get_stub_id()
+        if_end_stub = self.get_stub_id()
+        yield node.if_condition
+
+        self.program.append(
+            Instruction(
+                op_code=OpCode.CMP,
+                operand_type=OperandType.IMMEDIATE,
+                operand=0,
+                comment="if compare",
+            )
+        )
+        self.program.append(
+            InstrStubInstruction(
+                op_code=OpCode.JNZ,
+                operand_type=OperandType.ADDRESS,
+                operand=0,
+                referenced_instr_id=true_expr_stub_id,
+                referenced_instr_offset=0,
+                comment="jump to true branch if true",
+            )
+        )
+        yield node.false_expr
+        self.program.append(
+            InstrStubInstruction(
+                op_code=OpCode.JMP,
+                operand_type=OperandType.ADDRESS,
+                operand=0,
+                referenced_instr_id=if_end_stub,
+                referenced_instr_offset=1,
+                comment="false branch finished, jump to end",
+            )
+        )
+
+        next_instr_index = len(self.program)
+        yield node.true_expr
+        self.program[next_instr_index].instr_id.append(true_expr_stub_id)
+        self.program[-1].instr_id.append(if_end_stub)
+
     def visit_if_node(self, node: IfNode):
-        false_expr_stub_id = Comp3Backend.get_stub_id()
-        if_end_stub = Comp3Backend.get_stub_id()
-        node.if_condition.compile(self)
+        if (
+            node.false_expr is not None
+            and self.profile_hints is not None
+            and self.profile_hints.mostly_falls_through(node)
+        ):
+            yield from self._visit_if_node_true_last(node)
+            return
+
+        false_expr_stub_id = self.get_stub_id()
+        if_end_stub = self.get_stub_id()
+        yield node.if_condition
 
         self.program.append(
             Instruction(
@@ -505,7 +994,8 @@ class Comp3Backend(AstBackend):
                 comment="jump to end or false branch if false",
             )
         )
-        node.true_expr.compile(self)
+        self._record_site(node)
+        yield node.true_expr
 
         if node.false_expr is not None:
             self.program.append(
@@ -520,142 +1010,7 @@ class Comp3Backend(AstBackend):
             )
 
             next_instr_index = len(self.program)
-            node.false_expr.compile(self)
+            yield node.false_expr
             self.program[next_instr_index].instr_id.append(false_expr_stub_id)
 
         self.program[-1].instr_id.append(if_end_stub)
-
-
-def replace_stubs(program: Program):
-    instr_id_address: dict[int | str, int] = {}
-    data_id_address: dict[str, int] = {}
-
-    for index, instr in enumerate(program.instructions):
-        for instr_id in instr.instr_id:
-            instr_id_address[instr_id] = index
-
-    for index, data in enumerate(program.data_memory):
-        if data.identifier is not None:
-            data_id_address[data.identifier] = index
-
-    for index, instr in enumerate(program.instructions):
-        if isinstance(instr, InstrStubInstruction):
-            if instr.referenced_instr_id not in instr_id_address:
-                raise ValueError(
-                    f"Instruction stub identifier {instr.referenced_instr_id} in instruction"
-                    f" {index} was not found in compiled program"
-                )
-            referenced_addr = (
-                instr_id_address[instr.referenced_instr_id] + instr.referenced_instr_offset
-            )
-            program.instructions[index] = Instruction(
-                op_code=instr.op_code,
-                operand_type=instr.operand_type,
-                operand=referenced_addr,
-                comment=instr.comment,
-            )
-        elif isinstance(instr, DataStubInstruction):
-            if instr.data_stub_identifier not in data_id_address:
-                raise ValueError(
-                    f"Data stub identifier {instr.data_stub_identifier} in instruction {index} was"
-                    " not found in compiled program"
-                )
-            program.instructions[index] = Instruction(
-                op_code=instr.op_code,
-                operand_type=instr.operand_type,
-                operand=data_id_address[instr.data_stub_identifier],
-                comment=instr.comment,
-            )
-
-
-def is_global(node: AstNode) -> bool:
-    return isinstance(node, (FuncNode, StrAllocNode))
-
-
-def index_instructions(program: Program):
-    for index, instr in enumerate(program.instructions):
-        instr.instr_index = index
-
-
-class CompilerFacade:
-    def __init__(self):
-        self.instructions: list[Instruction] = []
-        self.string_literals: set[str] = set()
-        self.string_buffers: dict[str, int] = {}
-
-    def process_backend_results(self, backend: Comp3Backend):
-        self.instructions += backend.program
-        for literal in backend.string_literals:
-            self.string_literals.add(literal)
-        for identifier, size in backend.string_buffers.items():
-            if identifier in self.string_buffers:
-                raise ValueError(
-                    f"String buffer identifier {identifier} was declared more than one time"
-                )
-            self.string_buffers[identifier] = size
-
-    def build_data_memory(self) -> list[DataWord]:
-        data_memory: list[DataWord] = []
-
-        for literal in sorted(list(self.string_literals)):
-            literal_addr = len(data_memory)
-            s = list(map(ord, literal))
-            # C-string end
-            s.append(0)
-            for i in range(0, len(s), 4):
-                val = 0
-                for j in range(3, -1, -1):
-                    val <<= 8
-                    if i + j < len(s):
-                        val += s[i + j]
-                data_memory.append(DataWord(value=val))
-            data_memory[literal_addr].identifier = literal
-
-        for buffer_identifier, size in self.string_buffers.items():
-            buffer_addr = len(data_memory)
-            for _ in range((size + 3) // 4):
-                data_memory.append(DataWord(value=0))
-            data_memory[buffer_addr].identifier = buffer_identifier
-
-        return data_memory
-
-    def build_program(self, nodes: list[AstNode]):
-        # Process all global declarations first
-        for node in filter(is_global, nodes):
-            backend = Comp3Backend()
-            backend.visit(node)
-            self.process_backend_results(backend)
-
-        program_start = len(self.instructions) + 1
-        if program_start != 1:
-            self.instructions.insert(0, Instruction(
-                op_code=OpCode.JMP,
-                operand_type=OperandType.ADDRESS,
-                operand=program_start,
-                comment="Jump to program start"
-            ))
-
-        # Process everything else
-        for node in filter(lambda x: not is_global(x), nodes):
-            backend = Comp3Backend()
-            backend.visit(node)
-            self.process_backend_results(backend)
-
-        self.instructions.append(
-            Instruction(op_code=OpCode.HLT, operand_type=OperandType.NO_OPERAND, operand=0)
-        )
-
-        data_memory = self.build_data_memory()
-
-        program = Program(
-            instructions=self.instructions, data_memory=data_memory
-        )
-        replace_stubs(program)
-        index_instructions(program)
-
-        return program
-
-
-def build_program_from_nodes(nodes: list[AstNode]) -> Program:
-    facade = CompilerFacade()
-    return facade.build_program(nodes)
@@ -0,0 +1,168 @@
+import json
+from collections.abc import Sequence
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from hashlib import sha256
+from pathlib import Path
+from typing import Optional
+
+from comp3.compiler.incremental import IncrementalCompiler, write_program
+from comp3.compiler.objects import ObjectFile
+from comp3.compiler.preprocessing import IncludeResolver
+
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+# Suffix of the written program for every output format
+OUTPUT_SUFFIXES = {False: ".json", True: ".c3i"}
+
+
+@dataclass
+class BatchResult:
+    source: Path
+    output: Path
+    # compiled, up to date or failed
+    status: str
+    error: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class _BatchOptions:
+    rotate_loops: bool
+    image_format: bool
+    objects: tuple[ObjectFile, ...]
+    include_paths: tuple[Path, ...]
+
+
+def _build_hash(content: str, options: _BatchOptions) -> str:
+    # Included files are a part of the content, objects are known by the hash of their source
+    key = [
+        content,
+        options.rotate_loops,
+        options.image_format,
+        sorted(obj.source_hash for obj in options.objects),
+    ]
+    return sha256(json.dumps(key).encode()).hexdigest()
+
+
+def _read_manifest(path: Path) -> dict[str, str]:
+    try:
+        with open(path, encoding="utf-8") as manifest_file:
+            manifest = json.load(manifest_file)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {}
+    return manifest["sources"]
+
+
+def _write_manifest(path: Path, hashes: dict[str, str]):
+    with open(path, "w", encoding="utf-8") as manifest_file:
+        json.dump({"version": MANIFEST_VERSION, "sources": hashes}, manifest_file, indent=2)
+
+
+def _new_compiler(options: _BatchOptions) -> IncrementalCompiler:
+    # Forms of the includes are parsed and compiled once for all the sources
+    return IncrementalCompiler(
+        options.rotate_loops,
+        list(options.objects),
+        keep_unused=True,
+        include_paths=options.include_paths,
+    )
+
+
+def _compile_source(
+    compiler: IncrementalCompiler, source: Path, output: Path, image_format: bool
+) -> Optional[str]:
+    """Compiles one source, returns the error if it failed."""
+    try:
+        program, facade = compiler.build(source.read_text(encoding="utf-8"))
+    except (OSError, ValueError) as exc:
+        return str(exc)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    write_program(output, image_format, program, facade)
+    return None
+
+
+# Compiler and options of a worker process, it compiles its share of the sources with one compiler
+_worker: Optional[tuple[IncrementalCompiler, _BatchOptions]] = None
+
+
+def _start_worker(options: _BatchOptions):
+    global _worker  # pylint: disable=global-statement
+    _worker = (_new_compiler(options), options)
+
+
+def _compile_in_worker(source: Path, output: Path) -> Optional[str]:
+    assert _worker is not None
+    compiler, options = _worker
+    return _compile_source(compiler, source, output, options.image_format)
+
+
+def compile_batch(  # pylint: disable=too-many-arguments,too-many-positional-arguments,too-many-locals
+    source_dir: Path,
+    output_dir: Path,
+    rotate_loops: bool = True,
+    objects: Optional[list[ObjectFile]] = None,
+    image_format: bool = False,
+    workers: int = 1,
+    include_paths: Sequence[Path] = (),
+) -> list[BatchResult]:
+    """Compiles every ``.lisq`` file under ``source_dir`` to the same place under ``output_dir``.
+
+    Sources whose content, included files and options didn't change since they were
+    compiled into ``output_dir`` are skipped, ``manifest.json`` there keeps their hashes.
+    """
+    options = _BatchOptions(rotate_loops, image_format, tuple(objects or []), tuple(include_paths))
+    resolver = IncludeResolver(include_paths)
+    manifest_path = output_dir / MANIFEST_NAME
+    previous_hashes = _read_manifest(manifest_path)
+    hashes: dict[str, str] = {}
+
+    results: list[BatchResult] = []
+    pending: list[tuple[BatchResult, Optional[str]]] = []
+    for source in sorted(source_dir.rglob("*.lisq")):
+        name = source.relative_to(source_dir).as_posix()
+        output = (output_dir / name).with_suffix(OUTPUT_SUFFIXES[image_format])
+        result = BatchResult(source, output, "up to date")
+        results.append(result)
+        try:
+            content = source.read_text(encoding="utf-8")
+            content_hash = _build_hash(resolver.process(content).content, options)
+        except (OSError, ValueError):
+            # Reported by the compilation
+            content_hash = None
+        if (
+            content_hash is not None
+            and output.exists()
+            and previous_hashes.get(name) == content_hash
+        ):
+            hashes[name] = content_hash
+            continue
+        pending.append((result, content_hash))
+
+    sources = [result.source for result, _ in pending]
+    outputs = [result.output for result, _ in pending]
+    if workers > 1 and len(pending) > 1:
+        with ProcessPoolExecutor(
+            min(workers, len(pending)), initializer=_start_worker, initargs=(options,)
+        ) as executor:
+            errors = list(executor.map(_compile_in_worker, sources, outputs))
+    else:
+        compiler = _new_compiler(options)
+        errors = [
+            _compile_source(compiler, source, output, image_format)
+            for source, output in zip(sources, outputs)
+        ]
+
+    for (result, content_hash), error in zip(pending, errors):
+        if error is not None or content_hash is None:
+            result.status, result.error = "failed", error
+        else:
+            result.status = "compiled"
+            hashes[result.source.relative_to(source_dir).as_posix()] = content_hash
+
+    output_dir.mkdir(parents=True, exist_ok=True)
+    _write_manifest(manifest_path, hashes)
+    return results
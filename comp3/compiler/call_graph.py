@@ -0,0 +1,67 @@
+from comp3.compiler.arena import find_nodes
+from comp3.compiler.ast import AstNode, FuncCallNode, FuncNode
+
+
+def contains_func_call(node: AstNode) -> bool:
+    return next(find_nodes(node, FuncCallNode), None) is not None
+
+
+def build_call_graph(nodes: list[AstNode]) -> dict[str, set[str]]:
+    return {
+        node.identifier: {child.func_identifier for child in find_nodes(node, FuncCallNode)}
+        for node in nodes
+        if isinstance(node, FuncNode)
+    }
+
+
+def find_recursive_functions(call_graph: dict[str, set[str]]) -> set[str]:
+    """Functions that can call themselves, directly or through other functions.
+
+    Tarjan's strongly connected components without recursion, so long call
+    chains in big programs take linear time and no Python stack.
+    """
+    recursive: set[str] = set()
+    order: dict[str, int] = {}
+    low_link: dict[str, int] = {}
+    component_stack: list[str] = []
+    on_stack: set[str] = set()
+
+    for root in call_graph:
+        if root in order:
+            continue
+        pending = [(root, iter(call_graph[root]))]
+        order[root] = low_link[root] = len(order)
+        component_stack.append(root)
+        on_stack.add(root)
+        while pending:
+            func, callees = pending[-1]
+            callee = next(callees, None)
+            if callee is not None:
+                if callee not in call_graph:
+                    continue
+                if callee not in order:
+                    order[callee] = low_link[callee] = len(order)
+                    component_stack.append(callee)
+                    on_stack.add(callee)
+                    pending.append((callee, iter(call_graph[callee])))
+                elif callee in on_stack:
+                    low_link[func] = min(low_link[func], order[callee])
+                continue
+
+            pending.pop()
+            if pending:
+                caller = pending[-1][0]
+                low_link[caller] = min(low_link[caller], low_link[func])
+            if low_link[func] != order[func]:
+                continue
+            component = []
+            while True:
+                member = component_stack.pop()
+                on_stack.discard(member)
+                component.append(member)
+                if member == func:
+                    break
+            if len(component) > 1 or func in call_graph[func]:
+                recursive.update(component)
+
+    return recursive
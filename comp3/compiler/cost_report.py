@@ -0,0 +1,25 @@
+from typing import Iterable, Optional
+
+from comp3.common.instructions import Instruction, Program
+from comp3.machine.cost_model import CostModel, get_cost_model
+
+
+def estimate_ticks(instructions: Iterable[Instruction], cost_model: CostModel) -> int:
+    # Straight-line estimate: every instruction runs once, conditional jumps fall through
+    return sum(cost_model.instruction_ticks(instr, taken=False) for instr in instructions)
+
+
+def build_cost_report(
+    program: Program, function_ranges: dict[str, range], cost_model: Optional[CostModel] = None
+) -> str:
+    if cost_model is None:
+        cost_model = get_cost_model()
+
+    lines = [f"{'function':<32} {'instructions':>12} {'ticks':>8}"]
+    for name, instr_range in function_ranges.items():
+        instructions = program.instructions[instr_range.start : instr_range.stop]
+        lines.append(
+            f"{name:<32} {len(instructions):>12} {estimate_ticks(instructions, cost_model):>8}"
+        )
+
+    return "\n".join(lines)
@@ -0,0 +1,176 @@
+from collections import Counter
+from collections.abc import Iterable
+from dataclasses import dataclass, field
+from typing import Optional
+
+from comp3.common.config import IO_READ_ADDRESS, IO_WRITE_ADDRESS
+from comp3.common.instructions import DataStubInstruction, DataWord, Instruction
+from comp3.compiler.backend import frame_slot_identifier
+from comp3.machine.datapath import STACK_TOP
+
+
+def pack_string(literal: str) -> list[int]:
+    """Words of a C-string, four characters per word starting from the lowest byte."""
+    chars = [*map(ord, literal), 0]
+    words = []
+    for i in range(0, len(chars), 4):
+        val = 0
+        for j in range(3, -1, -1):
+            val <<= 8
+            if i + j < len(chars):
+                val += chars[i + j]
+        words.append(val)
+    return words
+
+
+@dataclass
+class DataSymbol:
+    identifier: str
+    # string, buffer or frame
+    kind: str
+    address: int
+    words: int
+    # Instructions that use the symbol
+    references: int
+    # Longer literal whose last words are this literal
+    shared_with: Optional[str] = None
+
+
+@dataclass
+class _Block:
+    """Words placed together, a literal with the literals in its tail, a buffer or a frame slot."""
+
+    symbols: list[DataSymbol]
+    values: list[int]
+    # Its first word is used as a direct address operand, which mustn't hit IO
+    direct: bool
+
+    @property
+    def references(self) -> int:
+        return sum(symbol.references for symbol in self.symbols)
+
+
+@dataclass
+class DataLayout:
+    data_memory: list[DataWord] = field(default_factory=list)
+    symbols: list[DataSymbol] = field(default_factory=list)
+
+    @property
+    def padding(self) -> int:
+        # Words skipped so that directly addressed data doesn't hit IO
+        used = {
+            symbol.address + offset
+            for symbol in self.symbols
+            if symbol.shared_with is None
+            for offset in range(symbol.words)
+        }
+        return len(self.data_memory) - len(used)
+
+    @property
+    def saved_words(self) -> int:
+        return sum(symbol.words for symbol in self.symbols if symbol.shared_with is not None)
+
+    @property
+    def stack_words(self) -> int:
+        # The stack grows down from its top towards the data
+        return STACK_TOP - len(self.data_memory)
+
+
+def count_references(instructions: Iterable[Instruction]) -> Counter[str]:
+    return Counter(
+        instr.data_stub_identifier
+        for instr in instructions
+        if isinstance(instr, DataStubInstruction)
+    )
+
+
+def _string_blocks(literals: Iterable[str], references: Counter[str]) -> list[_Block]:
+    blocks: list[_Block] = []
+    # Literal stored at a word of a longer one, keyed by the text from that word on
+    tails: dict[str, tuple[_Block, int]] = {}
+    # Longest first, so every literal that can share a tail finds it already placed
+    for literal in sorted(literals, key=lambda text: (-len(text), text)):
+        words = len(literal) // 4 + 1
+        symbol = DataSymbol(literal, "string", 0, words, references[literal])
+        if literal in tails:
+            block, offset = tails[literal]
+            symbol.address = offset
+            symbol.shared_with = block.symbols[0].identifier
+            block.symbols.append(symbol)
+            continue
+        block = _Block([symbol], pack_string(literal), direct=False)
+        blocks.append(block)
+        for offset in range(1, words):
+            tails.setdefault(literal[offset * 4 :], (block, offset))
+    return sorted(blocks, key=lambda block: block.symbols[0].identifier)
+
+
+def _direct_blocks(
+    string_buffers: dict[str, int], frame_sizes: dict[str, int], references: Counter[str]
+) -> list[_Block]:
+    blocks = []
+    for identifier, size in string_buffers.items():
+        words = (size + 3) // 4
+        symbol = DataSymbol(identifier, "buffer", 0, words, references[identifier])
+        blocks.append(_Block([symbol], [0] * words, direct=True))
+    for owner, size in frame_sizes.items():
+        for index in range(size):
+            identifier = frame_slot_identifier(owner, index)
+            symbol = DataSymbol(identifier, "frame", 0, 1, references[identifier])
+            blocks.append(_Block([symbol], [0], direct=True))
+    return blocks
+
+
+def layout_data(
+    string_literals: Iterable[str],
+    string_buffers: dict[str, int],
+    frame_sizes: dict[str, int],
+    references: Counter[str],
+) -> DataLayout:
+    """Lays out the data memory, the most used data first.
+
+    A literal that is the end of a longer one starting at a word boundary is
+    stored in its last words. Identical literals of different modules are
+    already one literal. Buffers and frame slots, which are used as direct
+    address operands, never start at an IO address.
+    """
+    blocks = _string_blocks(string_literals, references)
+    blocks += _direct_blocks(string_buffers, frame_sizes, references)
+
+    layout = DataLayout()
+    # Sorting is stable, equally used data keeps the order it was declared in
+    pending = sorted(blocks, key=lambda block: -block.references)
+    pending.reverse()
+    while pending:
+        block = pending.pop()
+        while block.direct and len(layout.data_memory) in (IO_READ_ADDRESS, IO_WRITE_ADDRESS):
+            # A string is only read through pointers, so the next one fills the gap if there is one
+            strings = [index for index, other in enumerate(pending) if not other.direct]
+            if strings:
+                pending.append(block)
+                block = pending.pop(strings[-1])
+            else:
+                layout.data_memory.append(DataWord(value=0))
+        start = len(layout.data_memory)
+        layout.data_memory += [DataWord(value=value) for value in block.values]
+        for symbol in block.symbols:
+            symbol.address += start
+            layout.data_memory[symbol.address].identifier = symbol.identifier
+            layout.symbols.append(symbol)
+    return layout
+
+
+def build_data_report(layout: DataLayout) -> str:
+    lines = [f"{'symbol':<32} {'kind':<8} {'address':>8} {'words':>6} {'uses':>6}"]
+    for symbol in sorted(layout.symbols, key=lambda symbol: symbol.address):
+        name = repr(symbol.identifier) if symbol.kind == "string" else symbol.identifier.strip()
+        shared = "" if symbol.shared_with is None else f" in {symbol.shared_with!r}"
+        lines.append(
+            f"{name:<32} {symbol.kind:<8} {symbol.address:>8} {symbol.words:>6}"
+            f" {symbol.references:>6}{shared}"
+        )
+    lines.append(
+        f"{len(layout.data_memory)} words of data, {layout.saved_words} saved by shared"
+        f" string tails, {layout.padding} of padding, {layout.stack_words} left for the stack"
+    )
+    return "\n".join(lines)
@@ -0,0 +1,433 @@
+import gc
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Iterable, Optional
+
+from comp3.common.instructions import (
+    DataStubInstruction,
+    DataWord,
+    InstrStubInstruction,
+    Instruction,
+    OpCode,
+    OperandType,
+    Program,
+)
+from comp3.compiler.ast import AstNode, FuncNode, StrAllocNode
+from comp3.compiler.backend import MAIN_FRAME_OWNER, Comp3Backend
+from comp3.compiler.call_graph import build_call_graph, find_recursive_functions
+from comp3.compiler.data_layout import DataLayout, count_references, layout_data
+from comp3.compiler.objects import (
+    FunctionSymbol,
+    ObjectFile,
+    Relocation,
+    RelocationKind,
+    check_symbols,
+    declared_functions,
+)
+from comp3.compiler.pgo import ProfileHints, SiteKey
+
+
+def replace_stubs(program: Program):
+    instr_id_address: dict[int | str, int] = {}
+    data_id_address: dict[str, int] = {}
+
+    for index, instr in enumerate(program.instructions):
+        for instr_id in instr.instr_id:
+            instr_id_address[instr_id] = index
+
+    for index, data in enumerate(program.data_memory):
+        if data.identifier is not None:
+            data_id_address[data.identifier] = index
+
+    for index, instr in enumerate(program.instructions):
+        if isinstance(instr, InstrStubInstruction):
+            if instr.referenced_instr_id not in instr_id_address:
+                raise ValueError(
+                    f"Instruction stub identifier {instr.referenced_instr_id} in instruction"
+                    f" {index} was not found in compiled program"
+                )
+            referenced_addr = (
+                instr_id_address[instr.referenced_instr_id] + instr.referenced_instr_offset
+            )
+            program.instructions[index] = Instruction(
+                op_code=instr.op_code,
+                operand_type=instr.operand_type,
+                operand=referenced_addr,
+                comment=instr.comment,
+            )
+        elif isinstance(instr, DataStubInstruction):
+            if instr.data_stub_identifier not in data_id_address:
+                raise ValueError(
+                    f"Data stub identifier {instr.data_stub_identifier} in instruction {index} was"
+                    " not found in compiled program"
+                )
+            program.instructions[index] = Instruction(
+                op_code=instr.op_code,
+                operand_type=instr.operand_type,
+                operand=data_id_address[instr.data_stub_identifier],
+                comment=instr.comment,
+            )
+
+
+def is_global(node: AstNode) -> bool:
+    return isinstance(node, (FuncNode, StrAllocNode))
+
+
+def index_instructions(program: Program):
+    for index, instr in enumerate(program.instructions):
+        instr.instr_index = index
+
+
+def classify_call_graph(
+    call_graph: dict[str, set[str]],
+    parameters: dict[str, int],
+    declarations: Optional[dict[str, FunctionSymbol]] = None,
+) -> dict[str, int]:
+    """Parameter count of every function that can't be re-entered and so gets a static frame."""
+    static_functions = {
+        name: symbol.parameters for name, symbol in (declarations or {}).items() if symbol.static
+    }
+    recursive_functions = find_recursive_functions(call_graph)
+    for name, count in parameters.items():
+        if name not in recursive_functions:
+            static_functions[name] = count
+    return static_functions
+
+
+def classify_functions(
+    nodes: list[AstNode], declarations: Optional[dict[str, FunctionSymbol]] = None
+) -> dict[str, int]:
+    parameters = {
+        node.identifier: len(node.param_identifiers) for node in nodes if isinstance(node, FuncNode)
+    }
+    return classify_call_graph(build_call_graph(nodes), parameters, declarations)
+
+
+def compile_fragment(
+    node: AstNode,
+    stub_namespace: int,
+    static_functions: dict[str, int],
+    profile_hints: Optional[ProfileHints],
+    rotate_loops: bool,
+) -> Comp3Backend:
+    """Compiles one top-level node by its own backend, this runs in worker processes too."""
+    backend = Comp3Backend(
+        static_functions=static_functions,
+        frame_owner=None if is_global(node) else MAIN_FRAME_OWNER,
+        profile_hints=profile_hints,
+        rotate_loops=rotate_loops,
+        stub_namespace=stub_namespace,
+    )
+    backend.visit(node)
+    return backend
+
+
+def object_label(position: int, index: int) -> str:
+    # Labels of different objects are kept apart, the space keeps them apart from function names
+    return f" object {position} {index}"
+
+
+def stub_relocations(instructions: list[Instruction]) -> list[Relocation]:
+    labels = {
+        instr_id: index
+        for index, instr in enumerate(instructions)
+        for instr_id in instr.instr_id
+        if isinstance(instr_id, int)
+    }
+    relocations: list[Relocation] = []
+    for index, instr in enumerate(instructions):
+        if isinstance(instr, DataStubInstruction):
+            relocations.append(
+                Relocation(index=index, kind=RelocationKind.DATA, target=instr.data_stub_identifier)
+            )
+        elif isinstance(instr, InstrStubInstruction):
+            target = instr.referenced_instr_id
+            kind = RelocationKind.FUNCTION
+            if isinstance(target, int):
+                kind, target = RelocationKind.LOCAL, labels[target]
+            relocations.append(
+                Relocation(
+                    index=index, kind=kind, target=target, offset=instr.referenced_instr_offset
+                )
+            )
+    return relocations
+
+
+def relocated_instruction(
+    instr: Instruction, relocation: Optional[Relocation], position: int
+) -> Instruction:
+    fields = {
+        "op_code": instr.op_code,
+        "operand_type": instr.operand_type,
+        "operand": instr.operand,
+        "comment": instr.comment,
+    }
+    if relocation is None:
+        return Instruction(**fields)
+    if relocation.kind == RelocationKind.DATA:
+        return DataStubInstruction(**fields, data_stub_identifier=relocation.target)
+    target = relocation.target
+    if relocation.kind == RelocationKind.LOCAL:
+        target = object_label(position, int(target))
+    return InstrStubInstruction(
+        **fields, referenced_instr_id=target, referenced_instr_offset=relocation.offset
+    )
+
+
+# pylint: disable=too-many-instance-attributes
+class CompilerFacade:
+    def __init__(
+        self,
+        profile_hints: Optional[ProfileHints] = None,
+        rotate_loops: bool = True,
+        workers: int = 1,
+    ):
+        self.profile_hints = profile_hints
+        self.rotate_loops = rotate_loops
+        # Processes compiling the top-level nodes, 1 compiles them in this process
+        self.workers = workers
+        self.instructions: list[Instruction] = []
+        self.string_literals: set[str] = set()
+        self.string_buffers: dict[str, int] = {}
+        self.static_functions: dict[str, int] = {}
+        self.frame_sizes: dict[str, int] = {}
+        self.function_ranges: dict[str, range] = {}
+        # Instruction index of every profiled node and the callee of every call node
+        self.profile_sites: dict[SiteKey, int] = {}
+        self.call_sites: dict[SiteKey, str] = {}
+        self._site_instructions: dict[SiteKey, Instruction] = {}
+        # Source line and column of every instruction, None for the generated ones
+        self.source_map: list[Optional[tuple[int, int]]] = []
+        self.data_layout = DataLayout()
+
+    def process_backend_results(self, backend: Comp3Backend):
+        self.instructions += backend.program
+        self.source_map += backend.source_positions
+        self.source_map += [None] * (len(self.instructions) - len(self.source_map))
+        self._site_instructions.update(backend.profile_sites)
+        self.call_sites.update(backend.call_sites)
+        self._add_data(backend.string_literals, backend.string_buffers, backend.frame_sizes)
+
+    def _add_data(
+        self,
+        string_literals: Iterable[str],
+        string_buffers: dict[str, int],
+        frame_sizes: dict[str, int],
+    ):
+        for owner, size in frame_sizes.items():
+            self.frame_sizes[owner] = max(self.frame_sizes.get(owner, 0), size)
+        for literal in string_literals:
+            self.string_literals.add(literal)
+        for identifier, size in string_buffers.items():
+            if identifier in self.string_buffers:
+                raise ValueError(
+                    f"String buffer identifier {identifier} was declared more than one time"
+                )
+            self.string_buffers[identifier] = size
+
+    def build_data_memory(self) -> list[DataWord]:
+        self.data_layout = layout_data(
+            self.string_literals,
+            self.string_buffers,
+            self.frame_sizes,
+            count_references(self.instructions),
+        )
+        return self.data_layout.data_memory
+
+    def _classify_functions(
+        self, nodes: list[AstNode], declarations: Optional[dict[str, FunctionSymbol]] = None
+    ):
+        self.static_functions.update(classify_functions(nodes, declarations))
+
+    def _compile_fragments(self, nodes: list[AstNode]) -> list[tuple[AstNode, Comp3Backend]]:
+        # Every node gets its own stub namespace by its position, so the fragments
+        # are merged in the same order with the same ids wherever they were compiled
+        arguments = (
+            nodes,
+            range(len(nodes)),
+            repeat(self.static_functions),
+            repeat(self.profile_hints),
+            repeat(self.rotate_loops),
+        )
+        if self.workers <= 1 or len(nodes) <= 1:
+            return list(zip(nodes, map(compile_fragment, *arguments)))
+        # Unpickled fragments are lots of new objects, collections while they arrive
+        # would take longer than compiling them
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            with ProcessPoolExecutor(min(self.workers, len(nodes))) as executor:
+                chunksize = max(1, len(nodes) // (self.workers * 4))
+                backends = executor.map(compile_fragment, *arguments, chunksize=chunksize)
+                return list(zip(nodes, backends))
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+
+    def _add_global_fragments(self, fragments: list[tuple[AstNode, Comp3Backend]]):
+        for node, backend in fragments:
+            if not is_global(node):
+                continue
+            if isinstance(node, FuncNode):
+                # Shifted by the jump to program start inserted below
+                start = len(self.instructions) + 1
+                self.function_ranges[node.identifier] = range(start, start + len(backend.program))
+            self.process_backend_results(backend)
+
+    def _insert_start_jump(self) -> int:
+        program_start = len(self.instructions) + 1
+        if program_start != 1:
+            self.instructions.insert(
+                0,
+                Instruction(
+                    op_code=OpCode.JMP,
+                    operand_type=OperandType.ADDRESS,
+                    operand=program_start,
+                    comment="Jump to program start",
+                ),
+            )
+            self.source_map.insert(0, None)
+        else:
+            program_start = 0
+        return program_start
+
+    def _add_main_fragments(self, fragments: list[tuple[AstNode, Comp3Backend]]):
+        # The top-level code is never re-entered so its variables live in a static frame too
+        for node, backend in fragments:
+            if not is_global(node):
+                self.process_backend_results(backend)
+
+    def _finish_program(self, program_start: int) -> Program:
+        self.function_ranges[MAIN_FRAME_OWNER] = range(program_start, len(self.instructions) + 1)
+        self.instructions.append(
+            Instruction(op_code=OpCode.HLT, operand_type=OperandType.NO_OPERAND, operand=0)
+        )
+        self.source_map.append(None)
+
+        instruction_indexes = {id(instr): index for index, instr in enumerate(self.instructions)}
+        for key, instr in self._site_instructions.items():
+            self.profile_sites[key] = instruction_indexes[id(instr)]
+
+        data_memory = self.build_data_memory()
+
+        program = Program(instructions=self.instructions, data_memory=data_memory)
+        replace_stubs(program)
+        index_instructions(program)
+
+        return program
+
+    def build_program(self, nodes: list[AstNode]):
+        self._classify_functions(nodes)
+        fragments = self._compile_fragments(nodes)
+        # Process all global declarations first
+        self._add_global_fragments(fragments)
+        program_start = self._insert_start_jump()
+        self._add_main_fragments(fragments)
+        return self._finish_program(program_start)
+
+    def build_object(  # pylint: disable=too-many-arguments,too-many-positional-arguments
+        self,
+        nodes: list[AstNode],
+        source: str,
+        content_hash: str,
+        declarations: Optional[dict[str, FunctionSymbol]] = None,
+        static_functions: Optional[dict[str, int]] = None,
+    ) -> ObjectFile:
+        """Compiles one module without linking it, functions of other modules are external.
+
+        ``declarations`` are the functions of already compiled modules, calls to
+        them use their calling convention, other unknown functions are called on the stack.
+        ``static_functions`` replaces both when the conventions were decided for a whole
+        program, of which ``nodes`` are only a part.
+        """
+        call_graph = build_call_graph(nodes)
+        if static_functions is None:
+            self._classify_functions(nodes, declarations)
+        else:
+            self.static_functions.update(static_functions)
+        fragments = self._compile_fragments(nodes)
+        self._add_global_fragments(fragments)
+        main_start = len(self.instructions)
+        self._add_main_fragments(fragments)
+
+        relocations = stub_relocations(self.instructions)
+        parameters = {
+            node.identifier: len(node.param_identifiers)
+            for node in nodes
+            if isinstance(node, FuncNode)
+        }
+        functions = {
+            # Ranges were shifted by the jump to program start, objects don't have it
+            name: FunctionSymbol(
+                address=code.start - 1,
+                size=len(code),
+                parameters=parameters[name],
+                static=name in self.static_functions,
+                calls=sorted(call_graph[name]),
+            )
+            for name, code in self.function_ranges.items()
+        }
+        externals = {
+            relocation.target: relocation.target in self.static_functions
+            for relocation in relocations
+            if relocation.kind == RelocationKind.FUNCTION and relocation.target not in functions
+        }
+
+        return ObjectFile(
+            source=source,
+            source_hash=content_hash,
+            instructions=[relocated_instruction(instr, None, 0) for instr in self.instructions],
+            source_map=self.source_map,
+            main_start=main_start,
+            functions=functions,
+            externals=externals,
+            relocations=relocations,
+            string_literals=sorted(self.string_literals),
+            string_buffers=self.string_buffers,
+            frame_sizes=self.frame_sizes,
+        )
+
+    def _add_object_code(self, position: int, obj: ObjectFile, code: range):
+        relocations = {relocation.index: relocation for relocation in obj.relocations}
+        labels = {
+            int(relocation.target)
+            for relocation in obj.relocations
+            if relocation.kind == RelocationKind.LOCAL
+        }
+        function_addresses = {symbol.address: name for name, symbol in obj.functions.items()}
+        for index in code:
+            instr = relocated_instruction(obj.instructions[index], relocations.get(index), position)
+            if index in labels:
+                instr.instr_id.append(object_label(position, index))
+            if index in function_addresses:
+                instr.instr_id.append(function_addresses[index])
+            self.instructions.append(instr)
+        self.source_map += obj.source_map[code.start : code.stop]
+
+    def link(self, objects: list[ObjectFile]) -> Program:
+        """Merges the objects into a program, laid out the same way ``build_program`` does.
+
+        Code of all functions comes first in the order of the objects,
+        then the top-level code of every object in the same order.
+        """
+        check_symbols(objects)
+        self._classify_functions([], declared_functions(objects))
+        for position, obj in enumerate(objects):
+            # Shifted by the jump to program start inserted below
+            start = len(self.instructions) + 1
+            for name, symbol in obj.functions.items():
+                self.function_ranges[name] = range(
+                    start + symbol.address, start + symbol.address + symbol.size
+                )
+            self._add_object_code(position, obj, range(obj.main_start))
+            self._add_data(obj.string_literals, obj.string_buffers, obj.frame_sizes)
+
+        program_start = self._insert_start_jump()
+        for position, obj in enumerate(objects):
+            self._add_object_code(position, obj, range(obj.main_start, len(obj.instructions)))
+        return self._finish_program(program_start)
+
+
+def build_program_from_nodes(nodes: list[AstNode], rotate_loops: bool = True) -> Program:
+    facade = CompilerFacade(rotate_loops=rotate_loops)
+    return facade.build_program(nodes)
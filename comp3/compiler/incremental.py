@@ -0,0 +1,277 @@
+import gc
+import json
+import os
+import re
+import time
+from collections.abc import Callable, Sequence
+from dataclasses import dataclass
+from hashlib import sha256
+from io import StringIO
+from pathlib import Path
+from time import perf_counter
+from typing import Optional
+
+from comp3.common.image import write_image
+from comp3.common.instructions import Program
+from comp3.compiler.arena import AstArena, find_nodes
+from comp3.compiler.ast import AstNode, FuncCallNode, FuncNode, iter_nodes_from_tokens
+from comp3.compiler.facade import CompilerFacade, classify_call_graph, is_global
+from comp3.compiler.lexer import Lexer
+from comp3.compiler.objects import ObjectFile, declared_functions, take_object_includes
+from comp3.compiler.preprocessing import IncludeResolver
+
+
+# How often the watched files are checked for changes
+WATCH_INTERVAL_SECONDS = 0.2
+
+
+@dataclass(frozen=True)
+class Form:
+    """Source text of one top-level form and where it starts."""
+
+    text: str
+    line: int
+    pos: int
+
+
+# Tokens as the lexer sees them, a string literal can hold parentheses
+_TOKEN = re.compile(r'"[^"]*"?|[()]|[^\s()"]+')
+
+
+def split_forms(content: str) -> list[Form]:
+    """Splits source text into top-level forms, each with the line and column it starts at."""
+    forms: list[Form] = []
+    start: Optional[tuple[int, int, int]] = None
+    depth = 0
+    line, line_start, scanned = 1, 0, 0
+    # The lexer counts two columns for a closing parenthesis, columns have to agree with it
+    closing_on_line = 0
+    for match in _TOKEN.finditer(content):
+        index = match.start()
+        newlines = content.count("\n", scanned, index)
+        if newlines:
+            line += newlines
+            line_start = content.rindex("\n", scanned, index) + 1
+            closing_on_line = 0
+        scanned = index
+
+        if start is None:
+            start = (index, line, index - line_start + 1 + closing_on_line)
+        token = match.group()
+        if token == "(":
+            depth += 1
+        elif token == ")":
+            depth -= 1
+            closing_on_line += 1
+        if depth <= 0:
+            forms.append(Form(content[start[0] : match.end()], start[1], start[2]))
+            start, depth = None, 0
+
+    if start is not None:
+        # Unbalanced, left for the lexer to report
+        forms.append(Form(content[start[0] :], start[1], start[2]))
+    return forms
+
+
+def _parse(form: Form, relative: bool = True) -> list[AstNode]:
+    line, pos = (1, 1) if relative else (form.line, form.pos)
+    tokens = Lexer(StringIO(form.text), line, pos).tokens()
+    return AstArena.from_nodes(iter_nodes_from_tokens(tokens)).top_level()
+
+
+@dataclass
+class _ParsedForm:
+    nodes: list[AstNode]
+    # Functions defined by the form with their parameter counts and functions it calls
+    parameters: dict[str, int]
+    calls: set[str]
+
+
+def _parse_form(form: Form) -> _ParsedForm:
+    try:
+        nodes = _parse(form)
+    except ValueError:
+        # Parsed again with the real positions, so the error points into the source
+        _parse(form, relative=False)
+        raise
+    return _ParsedForm(
+        nodes,
+        {
+            node.identifier: len(node.param_identifiers)
+            for node in nodes
+            if isinstance(node, FuncNode)
+        },
+        {child.func_identifier for node in nodes for child in find_nodes(node, FuncCallNode)},
+    )
+
+
+def _rebase(fragment: ObjectFile, form: Form) -> ObjectFile:
+    # Fragments are compiled with positions counted from the start of their form
+    source_map = [
+        (
+            None
+            if position is None
+            else (
+                position[0] + form.line - 1,
+                position[1] + (form.pos - 1 if position[0] == 1 else 0),
+            )
+        )
+        for position in fragment.source_map
+    ]
+    return fragment.model_copy(update={"source_map": source_map})
+
+
+# pylint: disable=too-few-public-methods,too-many-instance-attributes
+class IncrementalCompiler:
+    """Compiles programs reusing what was compiled for the previous version of the source.
+
+    Every top-level form is parsed once per distinct text and compiled once
+    per text and calling conventions of the functions it defines and calls.
+    The fragments are then linked, which gives the same program as compiling
+    the whole source at once.
+    """
+
+    def __init__(
+        self,
+        rotate_loops: bool = True,
+        objects: Optional[list[ObjectFile]] = None,
+        keep_unused: bool = False,
+        include_paths: Sequence[Path] = (),
+    ):
+        self.rotate_loops = rotate_loops
+        self.objects = objects or []
+        self.resolver = IncludeResolver(include_paths)
+        # Files included by the last build
+        self.dependencies: list[Path] = []
+        # Forms the last build didn't have are dropped unless kept for other sources
+        self.keep_unused = keep_unused
+        self._parsed: dict[str, _ParsedForm] = {}
+        self._fragments: dict[str, ObjectFile] = {}
+        # Forms compiled by the last build and forms it had
+        self.compiled_forms = 0
+        self.total_forms = 0
+
+    def _fragment_key(self, form: Form, parsed: _ParsedForm, static: dict[str, int]) -> str:
+        # Static frames and parameter counts of the functions a form uses are compiled into it
+        conventions = sorted(
+            (name, static.get(name)) for name in parsed.calls | parsed.parameters.keys()
+        )
+        return sha256(json.dumps([form.text, self.rotate_loops, conventions]).encode()).hexdigest()
+
+    def _compile_fragment(
+        self, form: Form, parsed: _ParsedForm, static: dict[str, int]
+    ) -> ObjectFile:
+        facade = CompilerFacade(rotate_loops=self.rotate_loops)
+        try:
+            return facade.build_object(parsed.nodes, "<source>", "", static_functions=static)
+        except ValueError:
+            # Compiled again with the real positions, so the error points into the source
+            CompilerFacade(rotate_loops=self.rotate_loops).build_object(
+                _parse(form, relative=False), "<source>", "", static_functions=static
+            )
+            raise
+
+    def build(self, content: str) -> tuple[Program, CompilerFacade]:
+        # The cache holds a lot of long lived objects, collections during a build
+        # would walk all of them again and again
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            return self._build(content)
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+
+    def _build(self, content: str) -> tuple[Program, CompilerFacade]:
+        content, included = take_object_includes(content, self.objects, self.resolver)
+        preprocessed = self.resolver.process(content, [Path(obj.source) for obj in included])
+        self.dependencies = preprocessed.dependencies
+        with preprocessed.line_map.locating_errors():
+            return self._build_forms(split_forms(preprocessed.content), included)
+
+    def _build_forms(
+        self, forms: list[Form], included: list[ObjectFile]
+    ) -> tuple[Program, CompilerFacade]:
+
+        parsed: dict[str, _ParsedForm] = {}
+        for form in forms:
+            if form.text not in parsed:
+                parsed[form.text] = self._parsed.get(form.text) or _parse_form(form)
+        self._parsed = {**self._parsed, **parsed} if self.keep_unused else parsed
+
+        call_graph: dict[str, set[str]] = {}
+        parameters: dict[str, int] = {}
+        for form in forms:
+            for name in parsed[form.text].parameters:
+                call_graph[name] = parsed[form.text].calls
+            parameters.update(parsed[form.text].parameters)
+        static = classify_call_graph(call_graph, parameters, declared_functions(self.objects))
+
+        # Functions and buffers go first, the same order the whole program build uses
+        forms.sort(key=lambda form: not all(map(is_global, parsed[form.text].nodes)))
+        fragments: dict[str, ObjectFile] = {}
+        linked: list[ObjectFile] = []
+        self.compiled_forms = 0
+        for form in forms:
+            key = self._fragment_key(form, parsed[form.text], static)
+            fragment = fragments.get(key) or self._fragments.get(key)
+            if fragment is None:
+                fragment = self._compile_fragment(form, parsed[form.text], static)
+                self.compiled_forms += 1
+            fragments[key] = fragment
+            linked.append(_rebase(fragment, form))
+        self._fragments = {**self._fragments, **fragments} if self.keep_unused else fragments
+        self.total_forms = len(forms)
+
+        facade = CompilerFacade(rotate_loops=self.rotate_loops)
+        return facade.link([*included, *linked]), facade
+
+
+def write_program(path: Path, image_format: bool, program: Program, facade: CompilerFacade):
+    # Replaced at once, so a machine started on the output never sees half of it
+    temporary_path = path.with_name(f"{path.name}.tmp")
+    if image_format:
+        with open(temporary_path, "wb") as program_file:
+            write_image(
+                program,
+                program_file,
+                source_map=facade.source_map,
+                functions=facade.function_ranges,
+            )
+    else:
+        with open(temporary_path, "w", encoding="utf-8") as program_file:
+            json.dump(program.model_dump(), program_file, indent=2)
+    os.replace(temporary_path, path)
+
+
+def _modification_times(paths: list[Path]) -> dict[Path, int]:
+    return {path: path.stat().st_mtime_ns for path in paths if path.exists()}
+
+
+def watch(
+    source_path: Path,
+    compiler: IncrementalCompiler,
+    write: Callable[[Program, CompilerFacade], None],
+    interval: float = WATCH_INTERVAL_SECONDS,
+):
+    """Compiles the source again whenever it or a file it includes changes, until interrupted."""
+    times: dict[Path, int] = {}
+    while True:
+        current = _modification_times([source_path, *compiler.dependencies])
+        if current != times:
+            start = perf_counter()
+            try:
+                program, facade = compiler.build(source_path.read_text(encoding="utf-8"))
+                write(program, facade)
+            except (OSError, ValueError) as exc:
+                # The source may be removed or renamed while it is watched
+                print(f"Error: {exc}", flush=True)
+            else:
+                print(
+                    f"Compiled {compiler.compiled_forms} of {compiler.total_forms} forms"
+                    f" in {(perf_counter() - start) * 1000:.1f} ms",
+                    flush=True,
+                )
+            # Files included for the first time are watched from now on
+            times = {**_modification_times(compiler.dependencies), **current}
+        time.sleep(interval)
@@ -1,6 +1,6 @@
 import re
 from enum import Enum
-from typing import TextIO
+from typing import Iterator, TextIO
 
 from pydantic import BaseModel
 
@@ -22,9 +22,10 @@ class Token(BaseModel):
 
 
 class Lexer:
-    def __init__(self, io: TextIO):
-        self.line = 1
-        self.pos = 1
+    def __init__(self, io: TextIO, line: int = 1, pos: int = 1):
+        # A part of a bigger source starts at its own line and column
+        self.line = line
+        self.pos = pos
         self.io = io
 
     def _consume_spaces(self) -> str:
@@ -39,6 +40,14 @@ class Lexer:
 
         return char
 
+    def _unread(self, char: str):
+        # Nothing was read past the end of the source
+        if char != "":
+            self.io.seek(self.io.tell() - 1)
+
+    def unexpected_eof(self) -> ValueError:
+        return ValueError(f"Unexpected EOF reached at line {self.line} col {self.pos}")
+
     def build_left_parenthesis(self):
         token = Token(
             token_type=TokenType.LEFT_PARENTHESIS,
@@ -62,6 +71,8 @@ class Lexer:
     def build_string_literal(self):
         string_literal = ""
         while (char := self.io.read(1)) != '"':
+            if char == "":
+                raise self.unexpected_eof()
             if char == "\n":
                 raise ValueError(f"Unexpected line break at line {self.line} col {self.pos}")
             self.pos += 1
@@ -78,8 +89,8 @@ class Lexer:
         num = first_char
         while re.match(r"[0-9]", (char := self.io.read(1))) is not None:
             num += char
-        self.io.seek(self.io.tell() - 1)
-        if re.match(r"[\s\(\)]", char) is None:
+        self._unread(char)
+        if char != "" and re.match(r"[\s\(\)]", char) is None:
             raise ValueError(
                 f"Unexpected character '{char}' at line {self.line} col {self.pos+len(num)}"
             )
@@ -93,9 +104,9 @@ class Lexer:
 
     def build_identifier(self, first_char: str):
         identifier = first_char
-        while re.match(r"[\s\(\)]", (char := self.io.read(1))) is None:
+        while (char := self.io.read(1)) != "" and re.match(r"[\s\(\)]", char) is None:
             identifier += char
-        self.io.seek(self.io.tell() - 1)
+        self._unread(char)
         self.pos += len(identifier)
         if identifier in ["true", "false"]:
             return Token(
@@ -112,31 +123,34 @@ class Lexer:
         )
 
     def lex(self) -> list[Token]:
-        tokens: list[Token] = []
+        return list(self.tokens())
+
+    def tokens(self) -> Iterator[Token]:
+        """Yields the tokens one by one as the source is read."""
         nest_level: int = 0
 
         while (char := self._consume_spaces()) != "":
             if char == "(":
                 nest_level += 1
-                tokens.append(self.build_left_parenthesis())
+                yield self.build_left_parenthesis()
             elif char == ")":
-                tokens.append(self.build_right_parenthesis())
+                token = self.build_right_parenthesis()
                 nest_level -= 1
                 if nest_level < 0:
                     raise ValueError(
                         f"Unexpected closing paranthesis at line {self.line} col {self.pos}"
                     )
                 self.pos += 1
+                yield token
             elif char == '"':
-                tokens.append(self.build_string_literal())
+                yield self.build_string_literal()
             elif re.match(r"[0-9]", char) is not None:
-                tokens.append(self.build_int_literal(char))
+                yield self.build_int_literal(char)
             else:
-                tokens.append(self.build_identifier(char))
+                yield self.build_identifier(char)
 
         if nest_level != 0:
-            raise ValueError("Unexpected EOF")
-        return tokens
+            raise self.unexpected_eof()
 
 
 if __name__ == "__main__":
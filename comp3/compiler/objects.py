@@ -0,0 +1,141 @@
+import os
+import re
+from enum import Enum
+from hashlib import sha256
+from pathlib import Path
+from typing import Optional, TextIO
+
+from pydantic import BaseModel, Field
+
+from comp3.common.instructions import Instruction
+from comp3.compiler.call_graph import find_recursive_functions
+from comp3.compiler.preprocessing import INCLUDE_LINE, IncludeResolver
+
+
+OBJECT_VERSION = 1
+
+
+class RelocationKind(str, Enum):
+    # Instruction of the same object, the target is its index in the object
+    LOCAL = "local"
+    FUNCTION = "function"
+    # String literal, string buffer or frame slot, resolved when data memory is laid out
+    DATA = "data"
+
+
+class Relocation(BaseModel):
+    index: int
+    kind: RelocationKind
+    target: int | str
+    offset: int = 0
+
+
+class FunctionSymbol(BaseModel):
+    address: int
+    size: int
+    parameters: int
+    # Static functions keep their frame in data memory, callers write into it directly
+    static: bool
+    calls: list[str]
+
+
+class ObjectFile(BaseModel):
+    """Relocatable code of one lisq module.
+
+    Instructions with relocations are stored with operand 0. Code of the
+    functions comes first, the top-level code starts at ``main_start``.
+    """
+
+    version: int = OBJECT_VERSION
+    source: str
+    source_hash: str
+    instructions: list[Instruction]
+    source_map: list[Optional[tuple[int, int]]]
+    main_start: int
+    functions: dict[str, FunctionSymbol]
+    # Functions of other modules called by this one and whether they were called as static
+    externals: dict[str, bool] = Field(default_factory=dict)
+    relocations: list[Relocation]
+    string_literals: list[str]
+    string_buffers: dict[str, int]
+    frame_sizes: dict[str, int]
+
+
+def source_hash(content: str) -> str:
+    return sha256(content.encode()).hexdigest()
+
+
+def load_object(file: TextIO) -> ObjectFile:
+    obj = ObjectFile.model_validate_json(file.read())
+    if obj.version != OBJECT_VERSION:
+        raise ValueError(f"Unsupported object version {obj.version}")
+    return obj
+
+
+def dump_object(obj: ObjectFile, file: TextIO):
+    file.write(obj.model_dump_json())
+
+
+def declared_functions(objects: list[ObjectFile]) -> dict[str, FunctionSymbol]:
+    declarations: dict[str, FunctionSymbol] = {}
+    for obj in objects:
+        for name, symbol in obj.functions.items():
+            if name in declarations:
+                raise ValueError(f"Function {name} is defined in more than one object")
+            declarations[name] = symbol
+    return declarations
+
+
+def take_object_includes(
+    content: str, objects: list[ObjectFile], resolver: Optional[IncludeResolver] = None
+) -> tuple[str, list[ObjectFile]]:
+    """Drops the ``#include`` lines of modules that have an object, returns those objects in order.
+
+    Includes without an object are left for the ``IncludeResolver``, which has to
+    skip the modules of the returned objects when they are included again.
+    """
+    resolver = resolver or IncludeResolver()
+    by_source = {os.path.abspath(obj.source): obj for obj in objects}
+    included: list[ObjectFile] = []
+
+    def take(match: re.Match) -> str:
+        filename = match.group(1).strip()
+        try:
+            path = resolver.find(filename)
+        except ValueError:
+            # An object can be linked without the source it was built from
+            path = Path(filename)
+        obj = by_source.get(os.path.abspath(path))
+        if obj is None:
+            return match.group(0)
+        if obj not in included:
+            if path.is_file() and source_hash(resolver.read(path)) != obj.source_hash:
+                raise ValueError(f"Object of {filename} is out of date, compile it again")
+            included.append(obj)
+        return ""
+
+    return INCLUDE_LINE.sub(take, content), included
+
+
+def check_symbols(objects: list[ObjectFile]):
+    """Checks that every called function is defined once and with the calling convention used."""
+    functions = declared_functions(objects)
+    for obj in objects:
+        for name, called_static in obj.externals.items():
+            if name not in functions:
+                raise ValueError(f"Function {name} called in {obj.source} is not defined")
+            if functions[name].static != called_static:
+                conventions = {True: "static", False: "on the stack"}
+                raise ValueError(
+                    f"{obj.source} calls {name} {conventions[called_static]} but {name} expects"
+                    f" to be called {conventions[functions[name].static]},"
+                    f" compile {obj.source} again with the object of the module defining {name}"
+                )
+
+    # A cycle through several modules re-enters functions that were compiled as static
+    call_graph = {name: set(symbol.calls) for name, symbol in functions.items()}
+    for name in sorted(find_recursive_functions(call_graph)):
+        if functions[name].static:
+            raise ValueError(
+                f"Function {name} is recursive through other modules but was compiled as static"
+            )
@@ -0,0 +1,79 @@
+from dataclasses import dataclass, field
+from typing import NamedTuple, Optional
+
+from comp3.common.profile import Profile
+from comp3.compiler.ast import AstNode, FuncNode
+
+
+# A call site is inlined when it was executed at least this many times
+# and the callee compiles to at most this many instructions
+INLINE_MIN_CALLS = 8
+INLINE_MAX_INSTRUCTIONS = 100
+# Inlined bodies may inline their own hot calls, but only this deep
+INLINE_MAX_DEPTH = 2
+
+# Profiled nodes are identified by their position in the (preprocessed) source,
+# which is the same for the profiled build and the optimized one
+SiteKey = tuple[int, int]
+
+
+def site_key(node: AstNode) -> SiteKey:
+    return node.start_token.line, node.start_token.pos
+
+
+class SiteCounts(NamedTuple):
+    executed: int
+    taken: int
+
+
+@dataclass
+class ProfileHints:
+    site_counts: dict[SiteKey, SiteCounts] = field(default_factory=dict)
+    inline_sites: set[SiteKey] = field(default_factory=set)
+    inline_functions: dict[str, FuncNode] = field(default_factory=dict)
+
+    def counts(self, node: AstNode) -> Optional[SiteCounts]:
+        return self.site_counts.get(site_key(node))
+
+    def mostly_falls_through(self, node: AstNode) -> bool:
+        # True when the conditional jump of the node was not taken more often than taken
+        counts = self.counts(node)
+        return counts is not None and counts.executed - counts.taken > counts.taken
+
+    def should_inline(self, node: AstNode) -> bool:
+        return site_key(node) in self.inline_sites
+
+
+# pylint: disable=too-many-arguments,too-many-positional-arguments
+def build_profile_hints(
+    nodes: list[AstNode],
+    profile: Profile,
+    profile_sites: dict[SiteKey, int],
+    call_sites: dict[SiteKey, str],
+    static_functions: dict[str, int],
+    function_ranges: dict[str, range],
+) -> ProfileHints:
+    """Turns the raw counters of the profiled build into per-node layout decisions.
+
+    ``profile_sites`` maps every profiled node to the index of its jump
+    instruction in the profiled build, ``call_sites`` maps call nodes to the callee.
+    """
+    hints = ProfileHints()
+    for key, index in profile_sites.items():
+        hints.site_counts[key] = SiteCounts(
+            profile.execution_counts[index], profile.taken_counts[index]
+        )
+
+    functions = {node.identifier: node for node in nodes if isinstance(node, FuncNode)}
+    for key, callee in call_sites.items():
+        # Only non-recursive functions can be inlined, the recursive ones keep their calls
+        if callee not in static_functions:
+            continue
+        if len(function_ranges[callee]) > INLINE_MAX_INSTRUCTIONS:
+            continue
+        if hints.site_counts[key].executed < INLINE_MIN_CALLS:
+            continue
+        hints.inline_sites.add(key)
+        hints.inline_functions[callee] = functions[callee]
+
+    return hints
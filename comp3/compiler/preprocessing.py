@@ -1,12 +1,166 @@
+import os
 import re
+from bisect import bisect_right
+from collections.abc import Iterable, Iterator, Sequence
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
 
 
-def process_includes(content: str):
-    matches = re.findall(r"#include (.+)\n", content)
+# A whole line, the last line of a file may have no line break
+INCLUDE_LINE = re.compile(r"^#include (.+)(?:\n|\Z)", re.MULTILINE)
+_ERROR_POSITION = re.compile(r"line (\d+) col (\d+)")
 
-    for filename in set(matches):
-        with open(filename, encoding="utf-8") as file:
-            included_content = file.read()
-            content = content.replace(f"#include {filename}\n", included_content)
 
-    return content
+def lexer_width(text: str) -> int:
+    # The lexer counts two columns for a closing parenthesis
+    return len(text) + text.count(")")
+
+
+@dataclass
+class LineMap:
+    """Maps positions in the preprocessed source back to the files they came from.
+
+    Every segment is the preprocessed line and column a piece of text starts at,
+    its file (``None`` for the source itself) and the line of the file the piece
+    starts at. A piece starts mid-line after a file without a final line break.
+    """
+
+    segments: list[tuple[int, int, Optional[str], int]] = field(default_factory=list)
+
+    def locate(self, line: int, column: int) -> tuple[Optional[str], int, int]:
+        index = bisect_right(self.segments, (line, column), key=lambda segment: segment[:2]) - 1
+        if index < 0:
+            return None, line, column
+        start_line, start_column, filename, file_line = self.segments[index]
+        if line == start_line:
+            column -= start_column - 1
+        return filename, file_line + line - start_line, column
+
+    def locate_message(self, message: str) -> str:
+        def replace(match: re.Match) -> str:
+            filename, line, column = self.locate(int(match.group(1)), int(match.group(2)))
+            suffix = "" if filename is None else f" of {filename}"
+            return f"line {line} col {column}{suffix}"
+
+        return _ERROR_POSITION.sub(replace, message)
+
+    @contextmanager
+    def locating_errors(self) -> Iterator[None]:
+        """Positions in errors raised inside are turned into lines of the original files."""
+        try:
+            yield
+        except ValueError as exc:
+            located = self.locate_message(str(exc))
+            if located == str(exc):
+                raise
+            raise ValueError(located) from exc
+
+
+@dataclass
+class Preprocessed:
+    content: str
+    line_map: LineMap
+    # Included files in the order they were first included
+    dependencies: list[Path]
+
+
+@dataclass
+class _Expansion:
+    seen: set[str]
+    pieces: list[str] = field(default_factory=list)
+    line_map: LineMap = field(default_factory=LineMap)
+    dependencies: list[Path] = field(default_factory=list)
+    # Preprocessed position the next piece starts at
+    line: int = 1
+    column: int = 1
+
+    def add(self, text: str, filename: Optional[str], file_line: int):
+        if not text:
+            return
+        self.line_map.segments.append((self.line, self.column, filename, file_line))
+        self.pieces.append(text)
+        if (newlines := text.count("\n")) != 0:
+            self.line += newlines
+            self.column = 1
+        self.column += lexer_width(text[text.rfind("\n") + 1 :])
+
+
+class IncludeResolver:
+    """Substitutes ``#include`` lines with the files they name.
+
+    A file is looked up next to the file that includes it, then in the working
+    directory and in ``search_paths``.
+    Includes are followed recursively, every file is included once, the
+    repeated includes are dropped, and cycles are errors. Contents of the
+    files are kept until their modification time changes.
+    """
+
+    def __init__(self, search_paths: Sequence[Path] = ()):
+        self.search_paths = [Path(), *search_paths]
+        self._files: dict[Path, tuple[int, str]] = {}
+
+    def find(self, name: str, including: Optional[Path] = None) -> Path:
+        """Path of an included file, ``including`` is the directory of the file including it."""
+        directories = self.search_paths if including is None else [including, *self.search_paths]
+        for directory in directories:
+            path = directory / name
+            if path.is_file():
+                return path
+        raise ValueError(f"Included file {name} was not found")
+
+    def read(self, path: Path) -> str:
+        modified = path.stat().st_mtime_ns
+        cached = self._files.get(path)
+        if cached is None or cached[0] != modified:
+            cached = modified, path.read_text(encoding="utf-8")
+            self._files[path] = cached
+        return cached[1]
+
+    def process(self, content: str, included: Iterable[Path] = ()) -> Preprocessed:
+        """Preprocesses the source, files in ``included`` count as already included."""
+        expansion = _Expansion(seen={os.path.abspath(path) for path in included})
+        self._expand(content, None, [], expansion)
+        return Preprocessed("".join(expansion.pieces), expansion.line_map, expansion.dependencies)
+
+    def _expand(
+        self, content: str, filename: Optional[str], active: list[Path], expansion: _Expansion
+    ):
+        position, line = 0, 1
+        for match in INCLUDE_LINE.finditer(content):
+            expansion.add(content[position : match.start()], filename, line)
+            line += content.count("\n", position, match.end())
+            position = match.end()
+
+            path = self.find(match.group(1).strip(), active[-1].parent if active else None)
+            key = os.path.abspath(path)
+            active_keys = [os.path.abspath(active_path) for active_path in active]
+            if key in active_keys:
+                cycle = [*active[active_keys.index(key) :], path]
+                raise ValueError(f"Include cycle: {' -> '.join(map(str, cycle))}")
+            if key in expansion.seen:
+                continue
+            expansion.seen.add(key)
+            expansion.dependencies.append(path)
+            self._expand(self.read(path), str(path), [*active, path], expansion)
+        expansion.add(content[position:], filename, line)
+
+
+def process_includes(content: str, search_paths: Sequence[Path] = ()) -> str:
+    return IncludeResolver(search_paths).process(content).content
+
+
+def dependency_rule(target: str, source: str, dependencies: Sequence[Path]) -> str:
+    """Make rule of the target on its source and included files.
+
+    Every included file also gets an empty rule, so make doesn't fail once it is removed.
+    """
+
+    def escape(path: str) -> str:
+        return path.replace(" ", "\\ ")
+
+    included = [escape(str(path)) for path in dependencies]
+    rules = [f"{escape(target)}: {' '.join([escape(source), *included])}\n"]
+    rules += [f"\n{path}:\n" for path in included]
+    return "".join(rules)
@@ -1,40 +1,142 @@
 import json
 import logging
+import os
+from functools import partial
 from time import time
+from typing import Callable, Optional
 
-from comp3.common.instructions import Program
-from comp3.machine.control_unit import ControlUnit
-from comp3.machine.datapath import DataPath
-from comp3.machine.microcode import runtime
+from comp3.common.image import ProgramImage, is_image
+from comp3.common.program_json import AnyProgram, decode_program
+from comp3.machine.checkpoint import Checkpoint, Checkpointer, CheckpointOptions
+from comp3.machine.control_unit import RunStatus
+from comp3.machine.machine import Machine, RunResult
+from comp3.machine.profiler import Profiler
+from comp3.machine.result_cache import ResultCache, default_cache_dir
 
 
 logger = logging.getLogger("machine.main")
 
 
-def main(path_to_file: str, input_stream: str, statistics: bool = False):
+def load_program(path_to_file: str, validate: bool = False) -> AnyProgram:
+    """Loads an image or compiled JSON, pydantic is only imported when ``validate`` is set."""
+    if is_image(path_to_file):
+        return ProgramImage.open(path_to_file)
     with open(path_to_file, encoding="utf-8") as file:
-        data = json.load(file)
-    program = Program(**data)
-    dp = DataPath(program, list(input_stream))
-    cpu = ControlUnit(dp, runtime)
+        content = json.load(file)
+    if validate:
+        # pylint: disable-next=import-outside-toplevel
+        from comp3.common.instructions import Program
 
+        return Program(**content)
+    return decode_program(content)
+
+
+def run_with_checkpoints(
+    machine: Machine, path_to_file: str, options: CheckpointOptions
+) -> Optional[RunResult]:
+    """Returns None when the run was suspended."""
+    checkpoint_path = options.path if options.path is not None else options.resume
+    if checkpoint_path is None:
+        return machine.resume()
+
+    checkpointer = Checkpointer(checkpoint_path, os.path.abspath(path_to_file), options.every_ticks)
+    checkpointer.install_signal_handlers()
+    if not checkpointer.run(machine.control_unit):
+        return None
+    return machine.result()
+
+
+def debug(path_to_file: str, input_stream: str):
+    # pylint: disable-next=import-outside-toplevel
+    from comp3.machine.debugger import Debugger, DebuggerShell
+
+    program = load_program(path_to_file)
+    DebuggerShell(Debugger(Machine(program), program, input_stream)).cmdloop()
+
+
+def print_result(result: RunResult, statistics: bool):
+    if statistics:
+        logger.info("IO output: %s", result.output)
+        logger.info("IO output raw: %s", result.output_raw)
+    print(result.output)
+
+
+def cached_result(
+    path_to_file: str, input_stream: str, statistics: bool
+) -> tuple[Optional[RunResult], Callable[[RunResult], None]]:
+    """Returns the cached result, if any, and the function storing the result of the run."""
+    result_cache = ResultCache(default_cache_dir())
+    with open(path_to_file, "rb") as file:
+        cache_key = result_cache.key(file.read(), input_stream)
+    cached = result_cache.get(cache_key)
+    if cached is not None and statistics:
+        logger.info(
+            "Program result taken from the cache. Instructions executed: %s, ticks taken: %s",
+            cached.instructions,
+            cached.ticks,
+        )
+    return cached, partial(result_cache.put, cache_key)
+
+
+def main(  # pylint: disable=too-many-arguments,too-many-locals
+    path_to_file: Optional[str],
+    input_stream: str,
+    statistics: bool = False,
+    profile_out: Optional[str] = None,
+    checkpoint: Optional[CheckpointOptions] = None,
+    *,
+    use_cache: bool = False,
+):
+    checkpoint = checkpoint if checkpoint is not None else CheckpointOptions()
+    resume_from = None
+    if checkpoint.resume is not None:
+        with open(checkpoint.resume, "rb") as file:
+            resume_from = Checkpoint.load(file)
+        if path_to_file is None:
+            path_to_file = resume_from.program_path
+    if path_to_file is None:
+        raise ValueError("Program file is required unless resuming from a checkpoint")
+
+    # Only plain runs are cached, profiles and checkpoints need the run itself
+    store_result = None
+    if use_cache and profile_out is None and checkpoint.path is None and resume_from is None:
+        cached, store_result = cached_result(path_to_file, input_stream, statistics)
+        if cached is not None:
+            print_result(cached, statistics)
+            return
+
+    program = load_program(path_to_file)
+    profiler = Profiler(program) if profile_out is not None else None
+    machine = Machine(program, profiler=profiler)
+    machine.reset(input_stream)
+    if resume_from is not None:
+        resume_from.restore(machine.control_unit)
+
+    start_ticks = machine.control_unit.total_ticks
     start = time()
-    cpu.run()
+    result = run_with_checkpoints(machine, path_to_file, checkpoint)
     time_taken = time() - start
+    if result is None:
+        logger.info("Run suspended at tick %s", machine.control_unit.total_ticks)
+        return
 
     if statistics:
         logger.info(
             "Program finished. Instructions executed: %s, ticks taken: %s, time taken: %.2f, tick"
             " rate: %.2f, ticks per instruction: %.2f",
-            cpu.total_instructions,
-            cpu.total_ticks,
+            result.instructions,
+            result.ticks,
             time_taken,
-            cpu.total_ticks / time_taken,
-            cpu.total_ticks / cpu.total_instructions,
+            (result.ticks - start_ticks) / time_taken,
+            result.ticks / result.instructions,
         )
-        logger.info("IO output: %s", "".join(map(chr, cpu.datapath.io_interface.output_buffer)))
-        logger.info("IO output raw: %s", cpu.datapath.io_interface.output_buffer)
-    print("".join(map(chr, cpu.datapath.io_interface.output_buffer)))
+    print_result(result, statistics)
+    if store_result is not None:
+        store_result(result)
+
+    if profiler is not None:
+        with open(profile_out, "wb") as file:
+            profiler.profile.dump(file)
 
 
-__all__ = ["main"]
+__all__ = ["Machine", "RunResult", "RunStatus", "debug", "load_program", "main"]
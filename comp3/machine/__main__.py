@@ -1,26 +1,66 @@
+import argparse
 import logging
-import sys
 
-from comp3.machine import main
+from comp3.machine import debug, main
+from comp3.machine.checkpoint import CheckpointOptions
 
 
 if __name__ == "__main__":
-    if len(sys.argv) >= 2:
-        flags = set(filter(lambda x: x.startswith("--"), sys.argv))
-        statistics = "--show-statistics" in flags
-        logs = "--logs" in sys.argv[3:]
+    parser = argparse.ArgumentParser(prog="machine", description="Run a compiled lisq program")
+    parser.add_argument("program_file", nargs="?")
+    parser.add_argument("input_stream", nargs="?", default="")
+    parser.add_argument("--show-statistics", action="store_true")
+    parser.add_argument("--logs", action="store_true", help="log every executed microcode")
+    parser.add_argument(
+        "--profile-out",
+        metavar="PROFILE",
+        help="write the instruction execution profile for --profile-use of the compiler",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        metavar="CHECKPOINT",
+        help=(
+            "write the machine state here every --checkpoint-every ticks, on SIGUSR1,"
+            " and on SIGTERM before suspending the run"
+        ),
+    )
+    parser.add_argument("--checkpoint-every", type=int, metavar="TICKS")
+    parser.add_argument(
+        "--no-cache",
+        dest="use_cache",
+        action="store_false",
+        help="always simulate, even when the result of this program and input is cached",
+    )
+    parser.add_argument(
+        "--debug",
+        action="store_true",
+        help="step the program interactively, forwards and backwards",
+    )
+    parser.add_argument(
+        "--resume",
+        metavar="CHECKPOINT",
+        help="continue the run saved in a checkpoint, the program is taken from the checkpoint",
+    )
+    args = parser.parse_args()
 
-        not_flags = list(filter(lambda x: x not in flags, sys.argv[2:]))
-        input_stream = "" if len(not_flags) == 0 else not_flags[0]
+    if args.program_file is None and args.resume is None:
+        parser.error("program_file is required unless --resume is given")
+    if args.checkpoint_every is not None and args.checkpoint is None and args.resume is None:
+        parser.error("--checkpoint-every requires --checkpoint")
 
-        if logs:
-            logging.basicConfig(level=logging.DEBUG)
-        else:
-            logging.basicConfig(level=logging.INFO)
+    logging.basicConfig(level=logging.DEBUG if args.logs else logging.INFO)
 
-        main(sys.argv[1], input_stream, statistics)
+    if args.debug:
+        if args.program_file is None:
+            parser.error("--debug requires program_file")
+        debug(args.program_file, args.input_stream)
     else:
-        print(
-            "Invalid arguments. Usage: machine <source program> [<input string>]"
-            " [--show-statistics, --logs]"
+        main(
+            args.program_file,
+            args.input_stream,
+            args.show_statistics,
+            args.profile_out,
+            CheckpointOptions(args.checkpoint, args.checkpoint_every, args.resume),
+            # Logs of every microcode can only come from a real run
+            use_cache=args.use_cache and not args.logs,
         )
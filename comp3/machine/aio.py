@@ -0,0 +1,60 @@
+import asyncio
+from collections.abc import Iterable
+from typing import Optional
+
+from comp3.machine.control_unit import RunStatus
+from comp3.machine.machine import Machine, RunResult
+
+
+# Ticks a machine runs before handing the event loop over to the others
+ASYNC_SLICE_TICKS = 5_000
+
+
+async def run_async(
+    machine: Machine,
+    input_stream: str = "",
+    *,
+    max_ticks: Optional[int] = None,
+    deadline: Optional[float] = None,
+    slice_ticks: int = ASYNC_SLICE_TICKS,
+) -> RunResult:
+    """Runs the machine in slices, yielding to the event loop after every slice.
+
+    ``deadline`` is a ``time.monotonic()`` value, same as for ``Machine.run``.
+    """
+    machine.reset(input_stream)
+    cpu = machine.control_unit
+    while True:
+        limit = cpu.total_ticks + slice_ticks
+        if max_ticks is not None:
+            limit = min(limit, max_ticks)
+        status = cpu.run(limit, deadline)
+        if status in (RunStatus.HALTED, RunStatus.DEADLINE_EXCEEDED):
+            return machine.result(status)
+        if max_ticks is not None and cpu.total_ticks >= max_ticks:
+            return machine.result(RunStatus.TICK_BUDGET_EXHAUSTED)
+        await asyncio.sleep(0)
+
+
+async def run_many(
+    jobs: Iterable[tuple[Machine, str]],
+    *,
+    max_ticks: Optional[int] = None,
+    deadline: Optional[float] = None,
+    slice_ticks: int = ASYNC_SLICE_TICKS,
+) -> list[RunResult]:
+    """Runs every (machine, input) job concurrently in the current event loop.
+
+    A job that doesn't halt in its budget only costs its own slices,
+    the others keep running and finish in their own time.
+    """
+    return await asyncio.gather(*(
+        run_async(
+            machine,
+            input_stream,
+            max_ticks=max_ticks,
+            deadline=deadline,
+            slice_ticks=slice_ticks,
+        )
+        for machine, input_stream in jobs
+    ))
@@ -0,0 +1,262 @@
+import logging
+import os
+import signal
+import struct
+import sys
+from array import array
+from dataclasses import dataclass
+from typing import BinaryIO, Optional
+
+from comp3.common.isa import AluOp
+from comp3.common.profile import program_fingerprint
+from comp3.machine.control_unit import ControlUnit
+
+
+logger = logging.getLogger("machine.checkpoint")
+
+CHECKPOINT_MAGIC = b"C3CK"
+CHECKPOINT_VERSION = 1
+
+# magic, version, program fingerprint,
+# AC, AR, SP, PC, DR, BR, IR instruction index, mux selections, ALU op, flags,
+# mPC, ticks, instructions, IO input pointer,
+# sizes of the program path, input, output and written memory cells
+_STATE = struct.Struct("<4sH8s7I5BBBIQQI4I")
+
+# Muxes and registers saved by checkpoints and the debugger, in this order
+MUXES = ("alu_left_operand_mux", "alu_right_operand_mux", "data_io_mux", "dr_mux", "br_mux")
+REGISTERS = ("ac", "ar", "sp", "pc", "dr", "br")
+
+
+def _words_to_bytes(words: array) -> bytes:
+    if sys.byteorder == "big":
+        words = array("I", words)
+        words.byteswap()
+    return words.tobytes()
+
+
+def _read_exact(file: BinaryIO, size: int) -> bytes:
+    content = file.read(size)
+    if len(content) != size:
+        raise ValueError("Checkpoint file is truncated")
+    return content
+
+
+def _pack_flags(*flags: bool) -> int:
+    return sum(1 << index for index, flag in enumerate(flags) if flag)
+
+
+def _unpack_flags(bits: int, count: int) -> list[bool]:
+    return [bits & (1 << index) != 0 for index in range(count)]
+
+
+@dataclass
+class Checkpoint:
+    """Complete state of a running machine, enough to continue the run exactly."""
+
+    # pylint: disable=too-many-instance-attributes
+    program_path: str
+    fingerprint: bytes
+    registers: list[int]
+    ir_index: int
+    mux_selections: list[int]
+    alu_op: AluOp
+    # ALU N, Z, C then program status N, Z, C, HLT
+    flags: list[bool]
+    mpc: int
+    total_ticks: int
+    total_instructions: int
+    input_stream: str
+    char_pointer: int
+    output_buffer: list[int]
+    memory: dict[int, int]
+
+    @classmethod
+    def capture(
+        cls, cpu: ControlUnit, program_path: str, fingerprint: Optional[bytes] = None
+    ) -> "Checkpoint":
+        # The fingerprint of the program can be passed in when it is already known
+        datapath = cpu.datapath
+        alu, status = datapath.alu, datapath.ps
+        if fingerprint is None:
+            fingerprint = program_fingerprint(datapath.instruction_memory.instructions)
+        return cls(
+            program_path=program_path,
+            fingerprint=fingerprint,
+            registers=[getattr(datapath, name).val for name in REGISTERS],
+            ir_index=datapath.ir.value.instr_index,
+            mux_selections=[getattr(datapath, name).selected for name in MUXES],
+            alu_op=alu.alu_op,
+            flags=[alu.n_flag, alu.z_flag, alu.c_flag, status.n, status.z, status.c, status.hlt],
+            mpc=cpu.mpc,
+            total_ticks=cpu.total_ticks,
+            total_instructions=cpu.total_instructions,
+            input_stream="".join(datapath.io_interface.char_stream),
+            char_pointer=datapath.io_interface.char_pointer,
+            output_buffer=list(datapath.io_interface.output_buffer),
+            memory=dict(datapath.data_memory.memory),
+        )
+
+    def restore(self, cpu: ControlUnit, fingerprint: Optional[bytes] = None):
+        datapath = cpu.datapath
+        instructions = datapath.instruction_memory.instructions
+        if fingerprint is None:
+            fingerprint = program_fingerprint(instructions)
+        if fingerprint != self.fingerprint:
+            raise ValueError("Checkpoint was written for a different program")
+
+        for name, value in zip(REGISTERS, self.registers):
+            getattr(datapath, name).val = value
+        datapath.ir.value = instructions[self.ir_index]
+        for name, selected in zip(MUXES, self.mux_selections):
+            getattr(datapath, name).selected = selected
+        datapath.alu.alu_op = self.alu_op
+        (
+            datapath.alu.n_flag,
+            datapath.alu.z_flag,
+            datapath.alu.c_flag,
+            datapath.ps.n,
+            datapath.ps.z,
+            datapath.ps.c,
+            datapath.ps.hlt,
+        ) = self.flags
+        cpu.mpc = self.mpc
+        cpu.total_ticks = self.total_ticks
+        cpu.total_instructions = self.total_instructions
+        datapath.io_interface.reset(list(self.input_stream))
+        datapath.io_interface.char_pointer = self.char_pointer
+        datapath.io_interface.output_buffer = list(self.output_buffer)
+        datapath.data_memory.memory = dict(self.memory)
+        datapath.invalidate()
+
+    def dump(self, file: BinaryIO):
+        program_path = self.program_path.encode()
+        input_stream = self.input_stream.encode()
+        memory = array("I")
+        for address, value in self.memory.items():
+            memory.extend((address, value))
+
+        file.write(
+            _STATE.pack(
+                CHECKPOINT_MAGIC,
+                CHECKPOINT_VERSION,
+                self.fingerprint,
+                *self.registers,
+                self.ir_index,
+                *self.mux_selections,
+                self.alu_op.value,
+                _pack_flags(*self.flags),
+                self.mpc,
+                self.total_ticks,
+                self.total_instructions,
+                self.char_pointer,
+                len(program_path),
+                len(input_stream),
+                len(self.output_buffer),
+                len(self.memory),
+            )
+        )
+        file.write(program_path)
+        file.write(input_stream)
+        file.write(bytes(self.output_buffer))
+        file.write(_words_to_bytes(memory))
+
+    @classmethod
+    def load(cls, file: BinaryIO) -> "Checkpoint":
+        fields = _STATE.unpack(_read_exact(file, _STATE.size))
+        if fields[0] != CHECKPOINT_MAGIC:
+            raise ValueError("Not a checkpoint file")
+        if fields[1] != CHECKPOINT_VERSION:
+            raise ValueError(f"Unsupported checkpoint version {fields[1]}")
+
+        path_size, input_size, output_size, memory_size = fields[21:]
+        program_path = _read_exact(file, path_size).decode()
+        input_stream = _read_exact(file, input_size).decode()
+        output_buffer = list(_read_exact(file, output_size))
+        memory = array("I", _read_exact(file, 8 * memory_size))
+        if sys.byteorder == "big":
+            memory.byteswap()
+
+        return cls(
+            program_path=program_path,
+            fingerprint=fields[2],
+            registers=list(fields[3:9]),
+            ir_index=fields[9],
+            mux_selections=list(fields[10:15]),
+            alu_op=AluOp(fields[15]),
+            flags=_unpack_flags(fields[16], 7),
+            mpc=fields[17],
+            total_ticks=fields[18],
+            total_instructions=fields[19],
+            input_stream=input_stream,
+            char_pointer=fields[20],
+            output_buffer=output_buffer,
+            memory=dict(zip(memory[::2], memory[1::2])),
+        )
+
+
+@dataclass
+class CheckpointOptions:
+    # Where checkpoints are written, the resumed checkpoint is overwritten by default
+    path: Optional[str] = None
+    every_ticks: Optional[int] = None
+    resume: Optional[str] = None
+
+
+# Signals are only noticed between slices of this many ticks
+CHECKPOINT_SLICE_TICKS = 100_000
+
+
+class Checkpointer:
+    """Runs the control unit writing checkpoints every N ticks and on signals.
+
+    SIGUSR1 writes a checkpoint and continues the run,
+    SIGTERM writes a checkpoint and suspends the run.
+    """
+
+    def __init__(self, path: str, program_path: str, every_ticks: Optional[int] = None):
+        self.path = path
+        self.program_path = program_path
+        self.every_ticks = every_ticks
+        self.checkpoint_requested = False
+        self.suspend_requested = False
+
+    def install_signal_handlers(self):
+        if hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, self._request_checkpoint)
+        signal.signal(signal.SIGTERM, self._request_suspend)
+
+    def _request_checkpoint(self, *_):
+        self.checkpoint_requested = True
+
+    def _request_suspend(self, *_):
+        self.suspend_requested = True
+
+    def write(self, cpu: ControlUnit):
+        # Written next to the old checkpoint and swapped in, so a crash mid-write keeps the old one
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, "wb") as file:
+            Checkpoint.capture(cpu, self.program_path).dump(file)
+        os.replace(temporary_path, self.path)
+        logger.info("Checkpoint at tick %s written to %s", cpu.total_ticks, self.path)
+
+    def run(self, cpu: ControlUnit) -> bool:
+        """Returns False when the run was suspended before reaching HLT."""
+        next_checkpoint = None if self.every_ticks is None else cpu.total_ticks + self.every_ticks
+        while not cpu.datapath.ps.hlt:
+            limit = cpu.total_ticks + CHECKPOINT_SLICE_TICKS
+            if next_checkpoint is not None:
+                limit = min(limit, next_checkpoint)
+            cpu.run(limit)
+
+            if self.suspend_requested:
+                self.write(cpu)
+                return False
+            if self.checkpoint_requested or (
+                next_checkpoint is not None and cpu.total_ticks >= next_checkpoint
+            ):
+                self.checkpoint_requested = False
+                self.write(cpu)
+                if self.every_ticks is not None:
+                    next_checkpoint = cpu.total_ticks + self.every_ticks
+        return True
@@ -1,6 +1,8 @@
 from abc import ABC, abstractmethod
+from collections.abc import Sequence
+from typing import Optional, Union
 
-from comp3.common.instructions import AluOp, DataWord, Instruction
+from comp3.common.isa import AluOp, InstructionFields
 
 
 # pylint: disable=too-few-public-methods
@@ -10,6 +12,33 @@ class ValueStore(ABC):
         pass
 
 
+class CombinationalValue(ValueStore):
+    """Output of combinational logic, evaluated once and kept until one of its inputs changes.
+
+    Registers tell the muxes and values that read them when they change, and a
+    mux passes it on only from its selected input, so every latch of a tick
+    reads the value evaluated by the first one unless it was really changed.
+    """
+
+    def __init__(self):
+        self.cached: Optional[int] = None
+
+    @abstractmethod
+    def evaluate(self) -> int:
+        pass
+
+    def invalidate(self):
+        self.cached = None
+
+    def input_changed(self, _: ValueStore):
+        self.cached = None
+
+    def get_value(self) -> int:
+        if self.cached is None:
+            self.cached = self.evaluate()
+        return self.cached
+
+
 # pylint: disable=too-few-public-methods
 class ZeroReg(ValueStore):
     def get_value(self) -> int:
@@ -20,21 +49,48 @@ class Register(ValueStore):
     def __init__(self, input_reg: ValueStore):
         self.input_reg = input_reg
         self.val = 0
+        # Muxes and combinational values that read the register
+        self.readers: tuple[Union["Mux", CombinationalValue], ...] = ()
 
     def latch(self):
-        self.val = self.input_reg.get_value()
+        value = self.input_reg.get_value()
+        if value != self.val:
+            self.val = value
+            for reader in self.readers:
+                reader.input_changed(self)
 
     def get_value(self) -> int:
         return self.val
 
+    def reset(self, value: int = 0):
+        self.val = value
+        for reader in self.readers:
+            reader.input_changed(self)
+
 
 class Mux(ValueStore):
     def __init__(self, *input_regs: ValueStore):
         self.input_regs = input_regs
         self.selected = 0
+        # Combinational values computed from the selected input
+        self.readers: tuple[CombinationalValue, ...] = ()
 
     def select(self, selected: int):
-        self.selected = selected
+        if selected != self.selected:
+            self.selected = selected
+            for reader in self.readers:
+                reader.invalidate()
+
+    def reset(self):
+        self.selected = 0
+        for reader in self.readers:
+            reader.invalidate()
+
+    def input_changed(self, source: ValueStore):
+        # Inputs that aren't selected don't change the output
+        if self.input_regs[self.selected] is source:
+            for reader in self.readers:
+                reader.invalidate()
 
     def get_value(self) -> int:
         return self.input_regs[self.selected].get_value()
@@ -42,11 +98,11 @@ class Mux(ValueStore):
 
 # pylint: disable=too-few-public-methods
 class InstructionMemory:
-    def __init__(self, pc: ValueStore, instructions: list[Instruction]):
+    def __init__(self, pc: ValueStore, instructions: Sequence[InstructionFields]):
         self.pc = pc
         self.instructions = instructions
 
-    def get_instruction(self) -> Instruction:
+    def get_instruction(self) -> InstructionFields:
         index = self.pc.get_value()
         return self.instructions[index]
 
@@ -55,14 +111,23 @@ class InstructionRegister(ValueStore):
     def __init__(self, memory: InstructionMemory):
         self.memory = memory
         self.value = memory.get_instruction()
+        # Muxes that read the operand
+        self.readers: tuple[Mux, ...] = ()
 
     def latch(self):
-        self.value = self.memory.get_instruction()
+        value = self.memory.get_instruction()
+        if value.operand != self.value.operand:
+            for reader in self.readers:
+                reader.input_changed(self)
+        self.value = value
+
+    def reset(self):
+        self.latch()
 
     def get_value(self) -> int:
         return self.value.operand
 
-    def get_instruction(self) -> Instruction:
+    def get_instruction(self) -> InstructionFields:
         return self.value
 
 
@@ -73,6 +138,11 @@ class IoInterface(ValueStore):
         self.char_pointer = 0
         self.output_buffer: list[int] = []
 
+    def reset(self, char_stream: list[str]):
+        self.char_stream = char_stream
+        self.char_pointer = 0
+        self.output_buffer = []
+
     def get_value(self) -> int:
         if self.char_pointer >= len(self.char_stream):
             return 0
@@ -83,27 +153,43 @@ class IoInterface(ValueStore):
         self.output_buffer.append(self.input_reg.get_value() % 2**8)
 
 
-class DataMemory(ValueStore):
-    def __init__(self, data_in: ValueStore, address_in: ValueStore, memory: list[DataWord]):
+class DataMemory(CombinationalValue):
+    """Memory read at the address register, kept until the address or a cell changes."""
+
+    def __init__(self, data_in: ValueStore, address_in: ValueStore, snapshot: Sequence[int]):
+        super().__init__()
         self.data_in = data_in
         self.address_in = address_in
+        # Initial memory image, shared between runs and never written to,
+        # cells written by the program are kept in memory on top of it
+        self.snapshot = snapshot
         self.memory: dict[int, int] = {}
 
-        for index, word in enumerate(memory):
-            self.memory[index] = word.value
+    def reset(self):
+        self.memory = {}
+        self.invalidate()
+
+    def read(self, address: int) -> int:
+        value = self.memory.get(address)
+        if value is None:
+            return self.snapshot[address] if address < len(self.snapshot) else 0
+        return value
 
     def latch(self):
         address = self.address_in.get_value()
         data = self.data_in.get_value()
         self.memory[address] = data
+        self.invalidate()
+
+    def evaluate(self) -> int:
+        return self.read(self.address_in.get_value())
 
-    def get_value(self) -> int:
-        address = self.address_in.get_value()
-        return self.memory.get(address, 0)
 
+class ALU(CombinationalValue):
+    """Result of the selected operation, the flags are set when it is evaluated."""
 
-class ALU(ValueStore):
     def __init__(self, left_operand: ValueStore, right_operand: ValueStore):
+        super().__init__()
         self.left_operand = left_operand
         self.right_operand = right_operand
         self.alu_op = AluOp.ADD
@@ -111,6 +197,13 @@ class ALU(ValueStore):
         self.z_flag = False
         self.c_flag = False
 
+    def reset(self):
+        self.alu_op = AluOp.ADD
+        self.n_flag = False
+        self.z_flag = False
+        self.c_flag = False
+        self.invalidate()
+
     @classmethod
     def get_compliment(cls, value: int) -> int:
         value ^= (1 << 32) - 1
@@ -131,7 +224,9 @@ class ALU(ValueStore):
         return res
 
     def select_op(self, alu_op: AluOp):
-        self.alu_op = alu_op
+        if alu_op != self.alu_op:
+            self.alu_op = alu_op
+            self.invalidate()
 
     def check_bit_operations(self, left: int, right: int) -> int:
         self.c_flag = False
@@ -166,7 +261,7 @@ class ALU(ValueStore):
 
         raise ValueError("DEBUG: Inavlid alu op? This should not happen")
 
-    def get_value(self) -> int:
+    def evaluate(self) -> int:
         left = self.left_operand.get_value()
         right = self.right_operand.get_value()
 
@@ -192,6 +287,7 @@ class ProgramStatus:
         self.hlt = False
 
     def latch(self):
+        # Flags of the result every other latch of the tick reads
         self.alu.get_value()
         self.n = self.alu.n_flag
         self.z = self.alu.z_flag
@@ -204,3 +300,7 @@ class ProgramStatus:
         self.n = False
         self.z = False
         self.c = False
+
+    def reset(self):
+        self.clear()
+        self.hlt = False
@@ -0,0 +1,216 @@
+from dataclasses import dataclass, field
+from functools import cache
+from typing import Optional
+
+from comp3.common.isa import AluOp, OpCode, OperandType
+from comp3.machine.common import AluLopSel, AluRopSel, BrMuxSel, DataIoMuxSel, DrMuxSel
+from comp3.machine.microcode import BranchingMicroCode, MicroCode, get_runtime
+
+
+# Horizontal microcode: every microinstruction is one integer control word.
+# Bit 0 tells branches from control words, the rest are bitfields of either kind.
+BRANCH = 1
+
+
+class _Fields:  # pylint: disable=too-few-public-methods
+    """Allocates bitfields of a control word one after another starting from bit 1."""
+
+    def __init__(self):
+        self.end = 1
+
+    def take(self, width: int) -> int:
+        shift = self.end
+        self.end += width
+        return shift
+
+
+_ALU_OPS = tuple(AluOp)
+_OP_CODES = tuple(OpCode)
+_OPERAND_TYPES = tuple(OperandType)
+# Signals of a control word in the order they are latched within the tick
+LATCHES = (
+    "latch_ac",
+    "latch_br",
+    "latch_ir",
+    "latch_dr",
+    "latch_ar",
+    "latch_sp",
+    "latch_pc",
+    "latch_io",
+    "latch_data",
+    "latch_ps",
+    "latch_hlt",
+)
+# Datapath signal of every latch bit
+_SIGNALS = {"latch_io": "write_io", "latch_data": "write_data"}
+
+_control = _Fields()
+# Left operand, right operand and operation, the select lines of the ALU
+ALU_SHIFT = _control.take(2 + 2 + 4)
+ALU_BITS = (1 << 8) - 1
+# Data/IO, BR and DR muxes
+ROUTING_SHIFT = _control.take(3)
+ROUTING_BITS = (1 << 3) - 1
+LATCH_SHIFT = _control.take(len(LATCHES))
+LATCH_BITS = (1 << len(LATCHES)) - 1
+
+_branch = _Fields()
+# An instruction passes a mask if the bit of its op code (operand type) is set, empty masks pass
+OP_CODE_SHIFT = _branch.take(len(_OP_CODES))
+OPERAND_TYPE_SHIFT = _branch.take(len(_OPERAND_TYPES))
+OP_CODE_MASK = ((1 << len(_OP_CODES)) - 1) << OP_CODE_SHIFT
+OPERAND_TYPE_MASK = ((1 << len(_OPERAND_TYPES)) - 1) << OPERAND_TYPE_SHIFT
+# Checked flags and their expected values, C, N and Z from the lowest bit
+FLAG_MASK_SHIFT = _branch.take(3)
+FLAG_VALUE_SHIFT = _branch.take(3)
+CHECK_OPERAND = 1 << _branch.take(1)
+OPERAND_SHIFT = _branch.take(32)
+OPERAND_BITS = (1 << 32) - 1
+# Jump to the microcode of the op code instead of the target
+DISPATCH = 1 << _branch.take(1)
+TARGET_SHIFT = _branch.take(8)
+TARGET_BITS = (1 << 8) - 1
+CONDITIONS = OP_CODE_MASK | OPERAND_TYPE_MASK | (0b111 << FLAG_MASK_SHIFT) | CHECK_OPERAND
+
+# Bit of every op code and operand type in the masks of branches
+OP_CODE_BITS = {op_code: 1 << (OP_CODE_SHIFT + i) for i, op_code in enumerate(_OP_CODES)}
+OPERAND_TYPE_BITS = {
+    operand_type: 1 << (OPERAND_TYPE_SHIFT + i) for i, operand_type in enumerate(_OPERAND_TYPES)
+}
+
+# Select lines of every value of the ALU and routing fields, as ``DataPath.select`` takes them,
+# None for the values with an unused ALU operation
+ALU_SELECTIONS = tuple(
+    (
+        (value & 0b11, (value >> 2) & 0b11, _ALU_OPS[value >> 4])
+        if value >> 4 < len(_ALU_OPS)
+        else None
+    )
+    for value in range(ALU_BITS + 1)
+)
+ROUTINGS = tuple(
+    (value & 1, (value >> 1) & 1, (value >> 2) & 1) for value in range(ROUTING_BITS + 1)
+)
+
+
+@dataclass
+class ControlStore:
+    """Microcode ROM: the control words and the op code decoder."""
+
+    words: list[int]
+    # Address of the microcode of every op code, where dispatching branches jump
+    dispatch: dict[OpCode, int]
+    # Aliases of the addresses, only kept for the disassembly
+    labels: dict[int, str | OpCode] = field(default_factory=dict)
+
+
+def _flag_bits(microcode: BranchingMicroCode) -> tuple[int, int]:
+    checks = (microcode.check_c_flag, microcode.check_n_flag, microcode.check_z_flag)
+    mask = sum(1 << i for i, check in enumerate(checks) if check is not None)
+    value = sum(1 << i for i, check in enumerate(checks) if check)
+    return mask, value
+
+
+def encode(microcode: MicroCode | BranchingMicroCode) -> int:
+    """Control word of a microinstruction, its alias is not a part of it."""
+    if isinstance(microcode, MicroCode):
+        alu = (
+            microcode.alu_lop_sel.value
+            | microcode.alu_rop_sel.value << 2
+            | microcode.alu_op.value << 4
+        )
+        routing = (
+            microcode.data_io_mux_sel.value
+            | microcode.br_mux_sel.value << 1
+            | microcode.dr_mux_sel.value << 2
+        )
+        latches = sum(1 << i for i, name in enumerate(LATCHES) if getattr(microcode, name))
+        return alu << ALU_SHIFT | routing << ROUTING_SHIFT | latches << LATCH_SHIFT
+
+    word = BRANCH
+    word |= sum(OP_CODE_BITS[op_code] for op_code in set(microcode.check_op_code))
+    word |= sum(OPERAND_TYPE_BITS[kind] for kind in set(microcode.check_operand_type))
+    flag_mask, flag_value = _flag_bits(microcode)
+    word |= flag_mask << FLAG_MASK_SHIFT | flag_value << FLAG_VALUE_SHIFT
+    if microcode.check_operand is not None:
+        if not 0 <= microcode.check_operand <= OPERAND_BITS:
+            raise ValueError(f"Checked operand {microcode.check_operand} does not fit in 32 bits")
+        word |= CHECK_OPERAND | microcode.check_operand << OPERAND_SHIFT
+    target = microcode.branch_target
+    if target is None:
+        return word | DISPATCH
+    if isinstance(target, str):
+        raise ValueError(f"Microcode branch target {target} not converted to an address")
+    if not 0 <= target <= TARGET_BITS:
+        raise ValueError(f"Microcode branch target {target} does not fit in 8 bits")
+    return word | target << TARGET_SHIFT
+
+
+def assemble(runtime: list[MicroCode | BranchingMicroCode]) -> ControlStore:
+    labels = {index: code.alias for index, code in enumerate(runtime) if code.alias is not None}
+    dispatch = {alias: index for index, alias in labels.items() if isinstance(alias, OpCode)}
+    return ControlStore([encode(code) for code in runtime], dispatch, labels)
+
+
+def decode(word: int, alias: Optional[str | OpCode] = None) -> MicroCode | BranchingMicroCode:
+    """Microinstruction of a control word, the inverse of ``encode``."""
+    if not word & BRANCH:
+        alu_selection = ALU_SELECTIONS[(word >> ALU_SHIFT) & ALU_BITS]
+        if alu_selection is None:
+            raise ValueError(f"Control word {word:x} has an unknown ALU operation")
+        lop, rop, alu_op = alu_selection
+        data_io, br, dr = ROUTINGS[(word >> ROUTING_SHIFT) & ROUTING_BITS]
+        latches = (word >> LATCH_SHIFT) & LATCH_BITS
+        return MicroCode(
+            alu_lop_sel=AluLopSel(lop),
+            alu_rop_sel=AluRopSel(rop),
+            data_io_mux_sel=DataIoMuxSel(data_io),
+            br_mux_sel=BrMuxSel(br),
+            dr_mux_sel=DrMuxSel(dr),
+            alu_op=alu_op,
+            alias=alias,
+            **{name: bool(latches >> i & 1) for i, name in enumerate(LATCHES)},
+        )
+
+    flag_mask = (word >> FLAG_MASK_SHIFT) & 0b111
+    flag_value = (word >> FLAG_VALUE_SHIFT) & 0b111
+    c_flag, n_flag, z_flag = (
+        bool(flag_value >> i & 1) if flag_mask >> i & 1 else None for i in range(3)
+    )
+    return BranchingMicroCode(
+        None if word & DISPATCH else (word >> TARGET_SHIFT) & TARGET_BITS,
+        check_op_code=[op_code for op_code, bit in OP_CODE_BITS.items() if word & bit],
+        check_operand_type=[kind for kind, bit in OPERAND_TYPE_BITS.items() if word & bit],
+        check_operand=(word >> OPERAND_SHIFT) & OPERAND_BITS if word & CHECK_OPERAND else None,
+        check_c_flag=c_flag,
+        check_n_flag=n_flag,
+        check_z_flag=z_flag,
+        alias=alias,
+    )
+
+
+def disassemble(store: ControlStore) -> list[MicroCode | BranchingMicroCode]:
+    return [decode(word, store.labels.get(index)) for index, word in enumerate(store.words)]
+
+
+def listing(store: ControlStore) -> str:
+    """Address, control word and microinstruction of every word of the ROM."""
+    width = (max(store.words, default=0).bit_length() + 3) // 4
+    return "\n".join(
+        f"{index:3} {word:0{width}x} {code}"
+        for index, (word, code) in enumerate(zip(store.words, disassemble(store)))
+    )
+
+
+def signal_names(latches: int) -> tuple[str, ...]:
+    """Datapath signals of the latch field, in the order they are latched."""
+    return tuple(_SIGNALS.get(name, name) for i, name in enumerate(LATCHES) if latches >> i & 1)
+
+
+@cache
+def get_control_store() -> ControlStore:
+    return assemble(get_runtime())
+
+
+if __name__ == "__main__":
+    print(listing(get_control_store()))
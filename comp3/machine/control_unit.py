@@ -1,52 +1,162 @@
 import logging
+from enum import Enum
+from time import monotonic
+from typing import Optional
 
-from comp3.common.instructions import OpCode
+from comp3.machine.control_store import (
+    ALU_BITS,
+    ALU_SELECTIONS,
+    ALU_SHIFT,
+    BRANCH,
+    CHECK_OPERAND,
+    CONDITIONS,
+    DISPATCH,
+    FLAG_MASK_SHIFT,
+    FLAG_VALUE_SHIFT,
+    LATCH_BITS,
+    LATCH_SHIFT,
+    OP_CODE_BITS,
+    OP_CODE_MASK,
+    OPERAND_BITS,
+    OPERAND_SHIFT,
+    OPERAND_TYPE_BITS,
+    OPERAND_TYPE_MASK,
+    ROUTING_BITS,
+    ROUTING_SHIFT,
+    ROUTINGS,
+    TARGET_BITS,
+    TARGET_SHIFT,
+    assemble,
+    get_control_store,
+    signal_names,
+)
 from comp3.machine.datapath import DataPath
-from comp3.machine.microcode import BranchingMicroCode, MicroCode
+from comp3.machine.microcode import BranchingMicroCode, MicroCode, get_runtime
+from comp3.machine.profiler import Profiler
 
 
 logger = logging.getLogger("machine.control_unit")
 
+# The clock is only read between slices of this many ticks when running against a deadline
+DEADLINE_CHECK_TICKS = 10_000
 
+
+class RunStatus(Enum):
+    HALTED = "halted"
+    # Stopped at the end of a slice or at a tick limit the caller will continue from
+    RUNNING = "running"
+    TICK_BUDGET_EXHAUSTED = "tick budget exhausted"
+    DEADLINE_EXCEEDED = "deadline exceeded"
+
+
+# pylint: disable=too-many-instance-attributes
 class ControlUnit:
-    def __init__(self, datapath: DataPath, runtime: list[MicroCode | BranchingMicroCode]):
+    def __init__(
+        self,
+        datapath: DataPath,
+        runtime: list[MicroCode | BranchingMicroCode],
+        profiler: Optional[Profiler] = None,
+    ):
         self.runtime = runtime
         self.datapath = datapath
+        self.profiler = profiler
         self.mpc = 0
         self.total_ticks = 0
         self.total_instructions = 0
 
-        self._op_code_to_address: dict[OpCode, int] = {}
+        # The default microcode is assembled once per process
+        self.control_store = get_control_store() if runtime is get_runtime() else assemble(runtime)
+        self.words = self.control_store.words
+        self._op_code_to_address = self.control_store.dispatch
+        # Datapath signals of every latch field in the ROM
+        self._latches = {
+            latches: tuple(getattr(datapath, name) for name in signal_names(latches))
+            for latches in {(word >> LATCH_SHIFT) & LATCH_BITS for word in self.words}
+        }
 
-        for index, instr in enumerate(runtime):
-            if instr.alias is not None and isinstance(instr.alias, OpCode):
-                self._op_code_to_address[instr.alias] = index
+    def branch_taken(self, word: int) -> bool:
+        """Whether the branch of the control word jumps, every condition in it has to hold."""
+        if not word & CONDITIONS:
+            return True
+        instruction = self.datapath.ir.value
+        op_codes = word & OP_CODE_MASK
+        if op_codes and not op_codes & OP_CODE_BITS[instruction.op_code]:
+            return False
+        operand_types = word & OPERAND_TYPE_MASK
+        if operand_types and not operand_types & OPERAND_TYPE_BITS[instruction.operand_type]:
+            return False
+        if word & CHECK_OPERAND and instruction.operand != (word >> OPERAND_SHIFT) & OPERAND_BITS:
+            return False
+        flags = (word >> FLAG_MASK_SHIFT) & 0b111
+        if flags:
+            status = self.datapath.ps
+            values = status.c | status.n << 1 | status.z << 2
+            return values & flags == (word >> FLAG_VALUE_SHIFT) & 0b111
+        return True
 
     def execute_microcode(self):
         logger.debug("Microcode %s: %s", self.mpc, self.runtime[self.mpc])
-        microcode = self.runtime[self.mpc]
+        word = self.words[self.mpc]
         # Instruction fetch
         if self.mpc == 0:
             self.total_instructions += 1
+            if self.profiler is not None:
+                self.profiler.record_fetch(self.datapath.pc.val)
         self.mpc += 1
 
-        if isinstance(microcode, MicroCode):
-            microcode.execute(self.datapath)
-        else:
-            if microcode.execute(self.datapath):
-                if isinstance(microcode.branch_target, str):
-                    raise ValueError(
-                        "Microcode branch target not converted to int"
-                    )  # This should not happen, I hope
-
-                if microcode.branch_target is None:
-                    self.mpc = self._op_code_to_address[self.datapath.ir.value.op_code]
-                else:
-                    self.mpc = microcode.branch_target
+        if not word & BRANCH:
+            self.datapath.select(
+                ALU_SELECTIONS[(word >> ALU_SHIFT) & ALU_BITS],
+                ROUTINGS[(word >> ROUTING_SHIFT) & ROUTING_BITS],
+            )
+            for signal in self._latches[(word >> LATCH_SHIFT) & LATCH_BITS]:
+                signal()
+        elif self.branch_taken(word):
+            if word & DISPATCH:
+                self.mpc = self._op_code_to_address[self.datapath.ir.value.op_code]
+            else:
+                self.mpc = (word >> TARGET_SHIFT) & TARGET_BITS
 
         logger.debug(self.datapath)
         self.total_ticks += 1
 
-    def run(self):
-        while not self.datapath.ps.hlt:
+    def reset(self):
+        self.mpc = 0
+        self.total_ticks = 0
+        self.total_instructions = 0
+        if self.profiler is not None:
+            self.profiler.new_run()
+
+    def _run_until(self, max_ticks: Optional[int]):
+        if max_ticks is None:
+            while not self.datapath.ps.hlt:
+                self.execute_microcode()
+            return
+
+        while not self.datapath.ps.hlt and self.total_ticks < max_ticks:
             self.execute_microcode()
+
+    def run(self, max_ticks: Optional[int] = None, deadline: Optional[float] = None) -> RunStatus:
+        """Runs until HLT, ``max_ticks`` total ticks or the ``time.monotonic()`` deadline."""
+        if deadline is not None:
+            while not self.datapath.ps.hlt:
+                if monotonic() >= deadline:
+                    return RunStatus.DEADLINE_EXCEEDED
+                limit = self.total_ticks + DEADLINE_CHECK_TICKS
+                if max_ticks is not None:
+                    if self.total_ticks >= max_ticks:
+                        break
+                    limit = min(limit, max_ticks)
+                self._run_until(limit)
+        else:
+            self._run_until(max_ticks)
+
+        if self.datapath.ps.hlt:
+            return RunStatus.HALTED
+        return RunStatus.TICK_BUDGET_EXHAUSTED
+
+    def run_slice(self, ticks: int) -> RunStatus:
+        # Slices split a run for the caller, so running out of one isn't an exhausted budget
+        if self.run(self.total_ticks + ticks) is RunStatus.HALTED:
+            return RunStatus.HALTED
+        return RunStatus.RUNNING
@@ -0,0 +1,141 @@
+from functools import cache
+from itertools import count, product
+from types import SimpleNamespace
+from typing import NamedTuple, Optional
+
+from comp3.common.instructions import Instruction, OpCode, OperandType
+from comp3.machine.microcode import BranchingMicroCode, MicroCode, get_runtime
+
+
+class CostKey(NamedTuple):
+    op_code: OpCode
+    operand_type: OperandType
+    operand: Optional[int]  # Operand value checked by the microcode (IO addresses) or None
+    taken: bool  # Whether the instruction changed PC besides the fetch increment
+
+
+class MicroTrace(NamedTuple):
+    addresses: list[int]
+    taken: bool
+
+
+class CostModel:
+    """
+    Exact tick costs of every instruction, derived by walking the microcode
+    statically. Branching microcode is evaluated against a stub datapath that
+    only holds the instruction register and the flags, since nothing else
+    can influence the microprogram counter.
+    """
+
+    def __init__(
+        self, microcode: list[MicroCode | BranchingMicroCode], max_instruction_ticks: int = 1000
+    ):
+        self.microcode = microcode
+        self.max_instruction_ticks = max_instruction_ticks
+        self._op_code_to_address: dict[OpCode, int] = {}
+        for index, instr in enumerate(microcode):
+            if instr.alias is not None and isinstance(instr.alias, OpCode):
+                self._op_code_to_address[instr.alias] = index
+
+        self.checked_operands = sorted({
+            instr.check_operand
+            for instr in microcode
+            if isinstance(instr, BranchingMicroCode) and instr.check_operand is not None
+        })
+        self.table = self._build_table()
+
+    def trace(
+        self,
+        op_code: OpCode,
+        operand_type: OperandType,
+        operand: int = 0,
+        flags: tuple[bool, bool, bool] = (False, False, False),
+    ) -> MicroTrace:
+        n_flag, z_flag, c_flag = flags
+        instruction = SimpleNamespace(op_code=op_code, operand_type=operand_type, operand=operand)
+        datapath = SimpleNamespace(
+            ir=SimpleNamespace(get_instruction=lambda: instruction),
+            ps=SimpleNamespace(n=n_flag, z=z_flag, c=c_flag),
+        )
+
+        addresses: list[int] = []
+        pc_latches = 0
+        mpc = 0
+        while len(addresses) == 0 or mpc != 0:
+            if len(addresses) >= self.max_instruction_ticks:
+                raise ValueError(
+                    f"Microcode for {op_code.value} {operand_type.value} does not return to start"
+                )
+            microcode = self.microcode[mpc]
+            addresses.append(mpc)
+            mpc += 1
+
+            if isinstance(microcode, MicroCode):
+                pc_latches += microcode.latch_pc
+                if microcode.latch_hlt:
+                    break
+            elif microcode.execute(datapath):  # type: ignore[arg-type]
+                if microcode.branch_target is None:
+                    mpc = self._op_code_to_address[op_code]
+                else:
+                    mpc = int(microcode.branch_target)
+
+        # The first PC latch is the increment done by the instruction fetch
+        return MicroTrace(addresses, pc_latches > 1)
+
+    def _build_table(self) -> dict[CostKey, int]:
+        table: dict[CostKey, int] = {}
+        other_operand = next(x for x in count() if x not in self.checked_operands)
+
+        for op_code, operand_type in product(OpCode, OperandType):
+            for operand in [None, *self.checked_operands]:
+                for flags in product((False, True), repeat=3):
+                    trace = self.trace(
+                        op_code,
+                        operand_type,
+                        other_operand if operand is None else operand,
+                        flags,
+                    )
+                    key = CostKey(op_code, operand_type, operand, trace.taken)
+                    table[key] = max(table.get(key, 0), len(trace.addresses))
+
+        return table
+
+    def ticks(
+        self,
+        op_code: OpCode,
+        operand_type: OperandType,
+        operand: int = 0,
+        taken: Optional[bool] = None,
+    ) -> int:
+        """
+        Ticks taken by one instruction. If taken is None or the instruction
+        has only one outcome, the most expensive outcome is returned.
+        """
+        operand_class = operand if operand in self.checked_operands else None
+        outcomes = [
+            ticks
+            for outcome in (False, True)
+            if (ticks := self.table.get(CostKey(op_code, operand_type, operand_class, outcome)))
+            is not None
+            and (taken is None or taken == outcome)
+        ]
+        if len(outcomes) == 0:
+            return self.ticks(op_code, operand_type, operand)
+        return max(outcomes)
+
+    def instruction_ticks(self, instr: Instruction, taken: Optional[bool] = None) -> int:
+        return self.ticks(instr.op_code, instr.operand_type, instr.operand, taken)
+
+    def is_conditional(self, op_code: OpCode, operand_type: OperandType) -> bool:
+        return all(
+            CostKey(op_code, operand_type, None, taken) in self.table for taken in (False, True)
+        )
+
+
+@cache
+def get_cost_model() -> CostModel:
+    return CostModel(get_runtime())
+
+
+__all__ = ["CostKey", "CostModel", "MicroTrace", "get_cost_model"]
@@ -1,4 +1,8 @@
-from comp3.common.instructions import AluOp, Program
+from typing import Optional
+
+from comp3.common.image import ProgramImage
+from comp3.common.isa import AluOp
+from comp3.common.program_json import AnyProgram
 from comp3.machine.common import AluLopSel, AluRopSel, BrMuxSel, DataIoMuxSel, DrMuxSel
 from comp3.machine.components import (
     ALU,
@@ -13,9 +17,17 @@ from comp3.machine.components import (
 )
 
 
-# pylint: disable=too-many-instance-attributes
+STACK_TOP = 4096  # SP initially points to 1 above 4kb
+
+# Inputs of the left and right ALU operand muxes and the ALU operation
+AluSelection = tuple[int, int, AluOp]
+# Inputs of the data/IO, BR and DR muxes
+Routing = tuple[int, int, int]
+
+
+# pylint: disable=too-many-instance-attributes,too-many-public-methods
 class DataPath:
-    def __init__(self, program: Program, input_stream: list[str]):
+    def __init__(self, program: AnyProgram, input_stream: list[str]):
         # Wiring
         self.zero_reg = ZeroReg()
 
@@ -26,13 +38,17 @@ class DataPath:
         self.ac = Register(self.alu)
         self.ar = Register(self.alu)
         self.sp = Register(self.alu)
-        self.sp.val = 4096  # Initialized to point to 1 above 4kb
+        self.sp.val = STACK_TOP
         self.pc = Register(self.alu)
 
         self.instruction_memory = InstructionMemory(self.pc, program.instructions)
         self.ir = InstructionRegister(self.instruction_memory)
 
-        self.data_memory = DataMemory(self.alu, self.ar, program.data_memory)
+        if isinstance(program, ProgramImage):
+            data_values = program.data_values
+        else:
+            data_values = [word.value for word in program.data_memory]
+        self.data_memory = DataMemory(self.alu, self.ar, data_values)
         self.io_interface = IoInterface(self.alu, input_stream)
 
         self.data_io_mux = Mux(self.data_memory, self.io_interface)
@@ -47,6 +63,44 @@ class DataPath:
 
         self.ps = ProgramStatus(self.alu)
 
+        # Inputs invalidate what is computed from them, so the ALU result and the memory
+        # read are evaluated once per tick however many latches read them
+        for register in (self.ac, self.br, self.ir):
+            register.readers = (self.alu_left_operand_mux,)
+        for register in (self.dr, self.sp):
+            register.readers = (self.alu_right_operand_mux,)
+        self.ar.readers = (self.alu_right_operand_mux, self.data_memory)
+        self.alu_left_operand_mux.readers = (self.alu,)
+        self.alu_right_operand_mux.readers = (self.alu,)
+        # ALU select lines set by the last microinstruction, None after any other change to them
+        self.alu_selection: Optional[AluSelection] = None
+
+    def invalidate(self):
+        # State was written around the signals, by restoring a checkpoint for example
+        self.alu_selection = None
+        self.alu.invalidate()
+        self.data_memory.invalidate()
+
+    def reset(self, input_stream: list[str]):
+        # Brings every component back to its state right after construction
+        for register in (self.ac, self.ar, self.pc, self.dr, self.br):
+            register.reset()
+        self.sp.reset(STACK_TOP)
+        for mux in (
+            self.alu_left_operand_mux,
+            self.alu_right_operand_mux,
+            self.data_io_mux,
+            self.dr_mux,
+            self.br_mux,
+        ):
+            mux.reset()
+        self.alu.reset()
+        self.alu_selection = None
+        self.ps.reset()
+        self.ir.reset()
+        self.data_memory.reset()
+        self.io_interface.reset(input_stream)
+
     def __str__(self) -> str:
         return (
             f"AC: {self.ac.val} | AR: {self.ar.val} | SP: {self.sp.val} | PC: {self.pc.val} | IR:"
@@ -92,13 +146,28 @@ class DataPath:
         self.ps.latch_hlt()
 
     # Mux selections
+    def select(self, alu_selection: AluSelection, routing: Routing):
+        """Sets every select line, the ALU is evaluated again only if its own lines changed."""
+        if alu_selection != self.alu_selection:
+            self.alu_selection = alu_selection
+            (
+                self.alu_left_operand_mux.selected,
+                self.alu_right_operand_mux.selected,
+                self.alu.alu_op,
+            ) = alu_selection
+            self.alu.invalidate()
+        # Nothing is computed from the outputs of these muxes, they are read when latched
+        self.data_io_mux.selected, self.br_mux.selected, self.dr_mux.selected = routing
+
     def sel_br_mux(self, sel: BrMuxSel):
         self.br_mux.select(sel.value)
 
     def sel_alu_lop(self, sel: AluLopSel):
+        self.alu_selection = None
         self.alu_left_operand_mux.select(sel.value)
 
     def sel_alu_rop(self, sel: AluRopSel):
+        self.alu_selection = None
         self.alu_right_operand_mux.select(sel.value)
 
     def sel_dr_mux(self, sel: DrMuxSel):
@@ -108,4 +177,5 @@ class DataPath:
         self.data_io_mux.select(sel.value)
 
     def sel_alu_op(self, sel: AluOp):
+        self.alu_selection = None
         self.alu.select_op(sel)
@@ -0,0 +1,406 @@
+import cmd
+from enum import Enum
+from typing import Optional
+
+from comp3.common.image import ProgramImage
+from comp3.common.profile import program_fingerprint
+from comp3.common.program_json import AnyProgram
+from comp3.machine.checkpoint import MUXES, REGISTERS, Checkpoint
+from comp3.machine.control_unit import ControlUnit
+from comp3.machine.machine import Machine
+
+
+# A snapshot of the whole machine is kept every this many ticks,
+# going back further than the undo log reaches replays from the nearest one
+SNAPSHOT_EVERY_TICKS = 20_000
+# Undo records kept for instant reverse steps, older ones are dropped half at a time
+MAX_UNDO_STEPS = 200_000
+
+# (address, value before the write or None when the cell wasn't written yet)
+MemoryWrite = tuple[int, Optional[int]]
+
+
+class StopReason(str, Enum):
+    STEP = "step"
+    BREAKPOINT = "breakpoint"
+    WATCHPOINT = "watchpoint"
+    HALTED = "halted"
+    START = "start of the run"
+
+
+class _RecordingMemory(dict):
+    """Written cells of the data memory which log the previous value of every write.
+
+    Only installed while the debugger steps, free runs use a plain dict.
+    """
+
+    def __init__(self, cells: dict[int, int]):
+        super().__init__(cells)
+        self.log: Optional[list[MemoryWrite]] = None
+
+    def __setitem__(self, address: int, value: int):
+        if self.log is not None:
+            self.log.append((address, self.get(address)))
+        super().__setitem__(address, value)
+
+
+def _core_state(cpu: ControlUnit) -> tuple:
+    # Everything but the data memory and the output text, which are undone separately
+    datapath = cpu.datapath
+    alu, status = datapath.alu, datapath.ps
+    return (
+        *(getattr(datapath, name).val for name in REGISTERS),
+        datapath.ir.value,
+        *(getattr(datapath, name).selected for name in MUXES),
+        alu.alu_op,
+        alu.n_flag,
+        alu.z_flag,
+        alu.c_flag,
+        status.n,
+        status.z,
+        status.c,
+        status.hlt,
+        cpu.mpc,
+        cpu.total_ticks,
+        cpu.total_instructions,
+        datapath.io_interface.char_pointer,
+        len(datapath.io_interface.output_buffer),
+    )
+
+
+def _restore_core_state(cpu: ControlUnit, state: tuple):
+    datapath = cpu.datapath
+    alu, status = datapath.alu, datapath.ps
+    registers = len(REGISTERS)
+    for name, value in zip(REGISTERS, state[:registers]):
+        getattr(datapath, name).val = value
+    datapath.ir.value = state[registers]
+    muxes = registers + 1 + len(MUXES)
+    for name, selected in zip(MUXES, state[registers + 1 : muxes]):
+        getattr(datapath, name).selected = selected
+    (
+        alu.alu_op,
+        alu.n_flag,
+        alu.z_flag,
+        alu.c_flag,
+        status.n,
+        status.z,
+        status.c,
+        status.hlt,
+        cpu.mpc,
+        cpu.total_ticks,
+        cpu.total_instructions,
+        datapath.io_interface.char_pointer,
+        output_size,
+    ) = state[muxes:]
+    del datapath.io_interface.output_buffer[output_size:]
+    datapath.invalidate()
+
+
+class Debugger:
+    """Steps a machine forwards and backwards between instructions.
+
+    Every instruction executed while stepping leaves an undo record with the
+    registers before it and the previous values of the memory cells it wrote.
+    Whole machine snapshots are taken every ``SNAPSHOT_EVERY_TICKS``, so a
+    reverse step past the start of the undo log restores the nearest snapshot
+    and replays forward from it, rebuilding the log on the way.
+    Continuing with no breakpoints or watchpoints runs at full speed.
+    """
+
+    # pylint: disable=too-many-instance-attributes
+    def __init__(
+        self,
+        machine: Machine,
+        program: AnyProgram,
+        input_stream: str = "",
+        snapshot_every_ticks: int = SNAPSHOT_EVERY_TICKS,
+    ):
+        self.machine = machine
+        self.program = program
+        self.cpu = machine.control_unit
+        self.snapshot_every_ticks = snapshot_every_ticks
+        self.breakpoints: set[int] = set()
+        self.watchpoints: set[int] = set()
+        # Which watchpoint stopped the last step, if any
+        self.triggered_watchpoint: Optional[int] = None
+
+        self._fingerprint = program_fingerprint(program.instructions)
+        self._snapshots: dict[int, Checkpoint] = {}
+        self._undo_log: list[tuple[tuple, list[MemoryWrite]]] = []
+        self._next_snapshot = 0
+        machine.reset(input_stream)
+        self._take_snapshot()
+
+    @property
+    def position(self) -> int:
+        """Number of instructions executed so far."""
+        return self.cpu.total_instructions
+
+    @property
+    def halted(self) -> bool:
+        return self.cpu.datapath.ps.hlt
+
+    @property
+    def armed(self) -> bool:
+        return bool(self.breakpoints or self.watchpoints)
+
+    def line_breakpoints(self, line: int) -> list[int]:
+        """Instructions starting a run of code compiled from the source line."""
+        if not isinstance(self.program, ProgramImage):
+            raise ValueError("Source lines are only known for programs compiled to an image")
+        indexes = []
+        previous_line = None
+        for index in range(len(self.program.instructions)):
+            position = self.program.source_position(index)
+            current_line = position[0] if position is not None else None
+            if current_line == line and previous_line != line:
+                indexes.append(index)
+            previous_line = current_line
+        if not indexes:
+            raise ValueError(f"No code was compiled from line {line}")
+        return indexes
+
+    def _memory(self) -> _RecordingMemory:
+        data_memory = self.cpu.datapath.data_memory
+        if not isinstance(data_memory.memory, _RecordingMemory):
+            data_memory.memory = _RecordingMemory(data_memory.memory)
+        return data_memory.memory
+
+    def _take_snapshot(self):
+        self._snapshots[self.position] = Checkpoint.capture(self.cpu, "", self._fingerprint)
+        self._next_snapshot = self.cpu.total_ticks + self.snapshot_every_ticks
+
+    def _restore_snapshot(self, position: int):
+        self._snapshots[position].restore(self.cpu, self._fingerprint)
+        self._undo_log.clear()
+        self._next_snapshot = self.cpu.total_ticks + self.snapshot_every_ticks
+
+    def _finish_instruction(self):
+        cpu = self.cpu
+        while cpu.mpc != 0 and not cpu.datapath.ps.hlt:
+            cpu.execute_microcode()
+
+    def _execute_instruction(self) -> list[MemoryWrite]:
+        memory = self._memory()
+        writes: list[MemoryWrite] = []
+        before = _core_state(self.cpu)
+        memory.log = writes
+        self.cpu.execute_microcode()
+        self._finish_instruction()
+        memory.log = None
+
+        self._undo_log.append((before, writes))
+        if len(self._undo_log) > MAX_UNDO_STEPS:
+            del self._undo_log[: MAX_UNDO_STEPS // 2]
+        if self.cpu.total_ticks >= self._next_snapshot:
+            self._take_snapshot()
+        return writes
+
+    def _undo_instruction(self) -> list[MemoryWrite]:
+        if not self._undo_log:
+            # Replay from the nearest earlier snapshot back to here to rebuild the log
+            current = self.position
+            self._restore_snapshot(max(key for key in self._snapshots if key < current))
+            while self.position < current:
+                self._execute_instruction()
+
+        state, writes = self._undo_log.pop()
+        memory = self._memory()
+        for address, value in reversed(writes):
+            if value is None:
+                dict.pop(memory, address)
+            else:
+                dict.__setitem__(memory, address, value)
+        _restore_core_state(self.cpu, state)
+        return writes
+
+    def _watched(self, writes: list[MemoryWrite]) -> bool:
+        for address, _ in writes:
+            if address in self.watchpoints:
+                self.triggered_watchpoint = address
+                return True
+        return False
+
+    def step(self, count: int = 1) -> StopReason:
+        self.triggered_watchpoint = None
+        for _ in range(count):
+            if self.halted:
+                return StopReason.HALTED
+            if self._watched(self._execute_instruction()):
+                return StopReason.WATCHPOINT
+        return StopReason.HALTED if self.halted else StopReason.STEP
+
+    def reverse_step(self, count: int = 1) -> StopReason:
+        self.triggered_watchpoint = None
+        for _ in range(count):
+            if self.position == 0:
+                return StopReason.START
+            if self._watched(self._undo_instruction()):
+                return StopReason.WATCHPOINT
+        return StopReason.START if self.position == 0 else StopReason.STEP
+
+    def continue_(self) -> StopReason:
+        """Runs until a breakpoint is reached, a watched cell is written or the program halts."""
+        self.triggered_watchpoint = None
+        if not self.armed:
+            self._run_free()
+            return StopReason.HALTED
+
+        # The instruction the debugger stopped at runs even when it has a breakpoint
+        first = True
+        while not self.halted:
+            if not first and self.cpu.datapath.pc.val in self.breakpoints:
+                return StopReason.BREAKPOINT
+            first = False
+            if self._watched(self._execute_instruction()):
+                return StopReason.WATCHPOINT
+        return StopReason.HALTED
+
+    def reverse_continue(self) -> StopReason:
+        """Goes back until a breakpoint, a write to a watched cell or the start of the run."""
+        self.triggered_watchpoint = None
+        while self.position > 0:
+            if self._watched(self._undo_instruction()):
+                return StopReason.WATCHPOINT
+            if self.cpu.datapath.pc.val in self.breakpoints:
+                return StopReason.BREAKPOINT
+        return StopReason.START
+
+    def _run_free(self):
+        # Undo records can't be kept without stepping, reverse steps replay from the snapshots
+        self._undo_log.clear()
+        memory = self.cpu.datapath.data_memory
+        memory.memory = dict(memory.memory)
+        while not self.halted:
+            self.cpu.run(self._next_snapshot)
+            self._finish_instruction()
+            self._take_snapshot()
+
+
+def _format_instruction(program: AnyProgram, index: int) -> str:
+    if index >= len(program.instructions):
+        return f"{index}: <outside of the program>"
+    instr = program.instructions[index]
+    text = f"{index}: {instr.op_code.value} {instr.operand_type.value} {instr.operand}"
+    if instr.comment:
+        text += f"  ; {instr.comment}"
+    if isinstance(program, ProgramImage):
+        position = program.source_position(index)
+        if position is not None:
+            text += f"  (line {position[0]} col {position[1]})"
+    return text
+
+
+class DebuggerShell(cmd.Cmd):
+    """Interactive front end of the debugger, started with ``--debug``."""
+
+    prompt = "(debug) "
+
+    def __init__(self, debugger: Debugger, **kwargs):
+        super().__init__(**kwargs)
+        self.debugger = debugger
+        self.intro = (
+            f"Program of {len(debugger.program.instructions)} instructions loaded,"
+            " type help for the list of commands"
+        )
+
+    def _where(self, reason: Optional[StopReason] = None):
+        debugger = self.debugger
+        if reason is StopReason.WATCHPOINT:
+            address = debugger.triggered_watchpoint
+            value = debugger.cpu.datapath.data_memory.read(address)
+            self.stdout.write(f"Watchpoint {address} = {value}\n")
+        elif reason not in (None, StopReason.STEP):
+            self.stdout.write(f"Stopped: {reason.value}\n")
+        next_instruction = _format_instruction(debugger.program, debugger.cpu.datapath.pc.val)
+        self.stdout.write(f"[{debugger.position}] {next_instruction}\n")
+
+    @staticmethod
+    def _count(arg: str) -> int:
+        return int(arg) if arg.strip() else 1
+
+    def default(self, line: str):
+        self.stdout.write(f"Unknown command: {line}\n")
+
+    def onecmd(self, line: str) -> bool:
+        try:
+            return super().onecmd(line)
+        except ValueError as exc:
+            self.stdout.write(f"{exc}\n")
+            return False
+
+    def do_break(self, arg: str):
+        """break INDEX | break line LINE: stop before the instruction or the code of the line"""
+        words = arg.split()
+        if len(words) == 2 and words[0] == "line":
+            indexes = self.debugger.line_breakpoints(int(words[1]))
+        elif len(words) == 1:
+            indexes = [int(words[0])]
+        else:
+            raise ValueError("Usage: break INDEX | break line LINE")
+        self.debugger.breakpoints.update(indexes)
+        self.stdout.write(f"Breakpoints at {', '.join(map(str, indexes))}\n")
+
+    def do_watch(self, arg: str):
+        """watch ADDRESS: stop after the data memory cell is written"""
+        self.debugger.watchpoints.add(int(arg))
+
+    def do_delete(self, arg: str):
+        """delete: remove all breakpoints and watchpoints"""
+        del arg
+        self.debugger.breakpoints.clear()
+        self.debugger.watchpoints.clear()
+
+    def do_step(self, arg: str):
+        """step [N]: execute N instructions"""
+        self._where(self.debugger.step(self._count(arg)))
+
+    def do_rstep(self, arg: str):
+        """rstep [N]: go back N instructions"""
+        self._where(self.debugger.reverse_step(self._count(arg)))
+
+    def do_continue(self, arg: str):
+        """continue: run to the next breakpoint or watchpoint"""
+        del arg
+        self._where(self.debugger.continue_())
+
+    def do_rcontinue(self, arg: str):
+        """rcontinue: run backwards to the previous breakpoint or watchpoint"""
+        del arg
+        self._where(self.debugger.reverse_continue())
+
+    def do_info(self, arg: str):
+        """info: show the registers, flags and the next instruction"""
+        del arg
+        datapath = self.debugger.cpu.datapath
+        registers = " ".join(f"{name.upper()}={getattr(datapath, name).val}" for name in REGISTERS)
+        status = datapath.ps
+        self.stdout.write(
+            f"{registers} N={int(status.n)} Z={int(status.z)} C={int(status.c)}"
+            f" ticks={self.debugger.cpu.total_ticks}\n"
+        )
+        self._where()
+
+    def do_mem(self, arg: str):
+        """mem ADDRESS [COUNT]: show data memory cells"""
+        words = [int(word) for word in arg.split()]
+        if not 1 <= len(words) <= 2:
+            raise ValueError("Usage: mem ADDRESS [COUNT]")
+        start, count = words[0], words[1] if len(words) == 2 else 1
+        data_memory = self.debugger.cpu.datapath.data_memory
+        for address in range(start, start + count):
+            self.stdout.write(f"{address}: {data_memory.read(address)}\n")
+
+    def do_output(self, arg: str):
+        """output: show the output printed so far"""
+        del arg
+        output = self.debugger.cpu.datapath.io_interface.output_buffer
+        self.stdout.write(f"{''.join(map(chr, output))!r}\n")
+
+    def do_quit(self, arg: str) -> bool:
+        """quit: leave the debugger"""
+        del arg
+        return True
+
+    do_EOF = do_quit
@@ -0,0 +1,72 @@
+from dataclasses import dataclass
+from typing import Optional
+
+from comp3.common.program_json import AnyProgram
+from comp3.machine.control_unit import ControlUnit, RunStatus
+from comp3.machine.datapath import DataPath
+from comp3.machine.microcode import BranchingMicroCode, MicroCode, get_runtime
+from comp3.machine.profiler import Profiler
+
+
+@dataclass
+class RunResult:
+    output_raw: list[int]
+    ticks: int
+    instructions: int
+    status: RunStatus
+
+    @property
+    def output(self) -> str:
+        return "".join(map(chr, self.output_raw))
+
+    @property
+    def halted(self) -> bool:
+        return self.status is RunStatus.HALTED
+
+
+class Machine:
+    """Processor with a program loaded, built once and reset before every run.
+
+    Data memory is reset by dropping the cells written during the previous run,
+    the initial memory image itself is shared and never copied.
+    """
+
+    def __init__(
+        self,
+        program: AnyProgram,
+        microcode: Optional[list[MicroCode | BranchingMicroCode]] = None,
+        profiler: Optional[Profiler] = None,
+    ):
+        self.datapath = DataPath(program, [])
+        self.control_unit = ControlUnit(
+            self.datapath, microcode if microcode is not None else get_runtime(), profiler
+        )
+
+    def reset(self, input_stream: str = ""):
+        self.datapath.reset(list(input_stream))
+        self.control_unit.reset()
+
+    def run(
+        self,
+        input_stream: str = "",
+        max_ticks: Optional[int] = None,
+        deadline: Optional[float] = None,
+    ) -> RunResult:
+        self.reset(input_stream)
+        return self.resume(max_ticks, deadline)
+
+    def resume(
+        self, max_ticks: Optional[int] = None, deadline: Optional[float] = None
+    ) -> RunResult:
+        # Continues from the current state, max_ticks counts from the start of the run
+        return self.result(self.control_unit.run(max_ticks, deadline))
+
+    def result(self, status: Optional[RunStatus] = None) -> RunResult:
+        if status is None:
+            status = RunStatus.HALTED if self.datapath.ps.hlt else RunStatus.RUNNING
+        return RunResult(
+            output_raw=list(self.datapath.io_interface.output_buffer),
+            ticks=self.control_unit.total_ticks,
+            instructions=self.control_unit.total_instructions,
+            status=status,
+        )
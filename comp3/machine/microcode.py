@@ -1,10 +1,11 @@
 from dataclasses import dataclass, field
+from functools import cache, cached_property
 from typing import Optional
 
 from comp3.common.config import IO_READ_ADDRESS, IO_WRITE_ADDRESS
-from comp3.common.instructions import AluOp, OpCode, OperandType
+from comp3.common.isa import AluOp, OpCode, OperandType
 from comp3.machine.common import AluLopSel, AluRopSel, BrMuxSel, DataIoMuxSel, DrMuxSel
-from comp3.machine.datapath import DataPath
+from comp3.machine.datapath import AluSelection, DataPath, Routing
 
 
 # pylint: disable=too-many-instance-attributes
@@ -40,13 +41,17 @@ class MicroCode:
 
     alias: Optional[str | OpCode] = None
 
+    # Microcode isn't changed once the runtime is built, so the select lines are computed once
+    @cached_property
+    def alu_selection(self) -> AluSelection:
+        return (self.alu_lop_sel.value, self.alu_rop_sel.value, self.alu_op)
+
+    @cached_property
+    def routing(self) -> Routing:
+        return (self.data_io_mux_sel.value, self.br_mux_sel.value, self.dr_mux_sel.value)
+
     def execute(self, data_path: DataPath):
-        data_path.sel_alu_lop(self.alu_lop_sel)
-        data_path.sel_alu_rop(self.alu_rop_sel)
-        data_path.sel_data_io_mux(self.data_io_mux_sel)
-        data_path.sel_br_mux(self.br_mux_sel)
-        data_path.sel_dr_mux(self.dr_mux_sel)
-        data_path.sel_alu_op(self.alu_op)
+        data_path.select(self.alu_selection, self.routing)
 
         if self.latch_ac:
             data_path.latch_ac()
@@ -212,173 +217,209 @@ class BranchingMicroCode:
         return s
 
 
-runtime: list[MicroCode | BranchingMicroCode] = [
-    MicroCode(latch_ir=True, alias="start"),
-    MicroCode(br_mux_sel=BrMuxSel.SEL_PC, latch_br=True),
-    MicroCode(alu_lop_sel=AluLopSel.SEL_BR, alu_op=AluOp.INC, latch_pc=True),
-    BranchingMicroCode(None, check_op_code=[OpCode.PUSH, OpCode.POP, OpCode.HLT]),
-    BranchingMicroCode("fetch_pointer_address", check_operand_type=[OperandType.POINTER_ADDRESS]),
-    BranchingMicroCode(
-        "fetch_stack_offset",
-        check_operand_type=[OperandType.STACK_OFFSET, OperandType.POINTER_STACK_OFFSET],
-    ),
-    MicroCode(
-        alu_lop_sel=AluLopSel.SEL_IR,
-        dr_mux_sel=DrMuxSel.SEL_ALU,
-        latch_dr=True,
-        alias="fetch_immediate_or_no_operand_or_address",
-    ),
-    BranchingMicroCode("fetch_operand", check_operand_type=[OperandType.ADDRESS]),
-    BranchingMicroCode("execute"),
-    MicroCode(alu_lop_sel=AluLopSel.SEL_IR, latch_ar=True, alias="fetch_pointer_address"),
-    MicroCode(latch_dr=True),
-    BranchingMicroCode("fetch_operand"),
-    MicroCode(
-        alu_lop_sel=AluLopSel.SEL_IR,
-        alu_rop_sel=AluRopSel.SEL_SP,
-        dr_mux_sel=DrMuxSel.SEL_ALU,
-        latch_dr=True,
-        alias="fetch_stack_offset",
-    ),
-    BranchingMicroCode("fetch_operand", check_operand_type=[OperandType.STACK_OFFSET]),
-    MicroCode(alu_rop_sel=AluRopSel.SEL_DR, latch_ar=True),
-    MicroCode(latch_dr=True),
-    MicroCode(alu_rop_sel=AluRopSel.SEL_DR, latch_ar=True, alias="fetch_operand"),
-    BranchingMicroCode(
-        None,
-        check_op_code=[
-            OpCode.JZ,
-            OpCode.JNZ,
-            OpCode.JB,
-            OpCode.JBE,
-            OpCode.JA,
-            OpCode.JAE,
-            OpCode.JMP,
-            OpCode.ST,
-        ],
-        alias="execute",
-    ),
-    BranchingMicroCode(
-        "execute2", check_operand_type=[OperandType.IMMEDIATE, OperandType.NO_OPERAND]
-    ),
-    BranchingMicroCode(
-        "fetch_from_io", check_operand=IO_READ_ADDRESS, check_operand_type=[OperandType.ADDRESS]
-    ),
-    MicroCode(latch_dr=True),
-    BranchingMicroCode("execute2"),
-    MicroCode(data_io_mux_sel=DataIoMuxSel.SEL_IO, latch_dr=True, alias="fetch_from_io"),
-    BranchingMicroCode(None, alias="execute2"),
-    MicroCode(alu_rop_sel=AluRopSel.SEL_DR, latch_ac=True, alias=OpCode.LD),
-    BranchingMicroCode("end"),
-    BranchingMicroCode(
-        "st_to_io",
-        check_operand=IO_WRITE_ADDRESS,
-        check_operand_type=[OperandType.ADDRESS],
-        alias=OpCode.ST,
-    ),
-    MicroCode(alu_lop_sel=AluLopSel.SEL_AC, latch_data=True),
-    BranchingMicroCode("end"),
-    MicroCode(alu_lop_sel=AluLopSel.SEL_AC, latch_io=True, alias="st_to_io"),
-    BranchingMicroCode("end"),
-    MicroCode(
-        alu_lop_sel=AluLopSel.SEL_AC,
-        alu_rop_sel=AluRopSel.SEL_DR,
-        alu_op=AluOp.ADD,
-        latch_br=True,
-        latch_ps=True,
-        alias=OpCode.ADD,
-    ),
-    BranchingMicroCode("math_end"),
-    MicroCode(
-        alu_lop_sel=AluLopSel.SEL_AC,
-        alu_rop_sel=AluRopSel.SEL_DR,
-        alu_op=AluOp.SUB,
-        latch_br=True,
-        latch_ps=True,
-        alias=OpCode.SUB,
-    ),
-    BranchingMicroCode("math_end"),
-    MicroCode(
-        alu_lop_sel=AluLopSel.SEL_AC,
-        alu_rop_sel=AluRopSel.SEL_DR,
-        alu_op=AluOp.AND,
-        latch_br=True,
-        latch_ps=True,
-        alias=OpCode.AND,
-    ),
-    BranchingMicroCode("math_end"),
-    MicroCode(
-        alu_lop_sel=AluLopSel.SEL_AC,
-        alu_rop_sel=AluRopSel.SEL_DR,
-        alu_op=AluOp.OR,
-        latch_br=True,
-        latch_ps=True,
-        alias=OpCode.OR,
-    ),
-    BranchingMicroCode("math_end"),
-    MicroCode(
-        alu_lop_sel=AluLopSel.SEL_AC,
-        alu_rop_sel=AluRopSel.SEL_DR,
-        alu_op=AluOp.SHL,
-        latch_br=True,
-        latch_ps=True,
-        alias=OpCode.SHL,
-    ),
-    BranchingMicroCode("math_end"),
-    MicroCode(
-        alu_lop_sel=AluLopSel.SEL_AC,
-        alu_rop_sel=AluRopSel.SEL_DR,
-        alu_op=AluOp.SHR,
-        latch_br=True,
-        latch_ps=True,
-        alias=OpCode.SHR,
-    ),
-    MicroCode(alu_lop_sel=AluLopSel.SEL_BR, latch_ac=True, alias="math_end"),
-    BranchingMicroCode("end"),
-    MicroCode(alu_rop_sel=AluRopSel.SEL_SP, alu_op=AluOp.DEC, latch_br=True, alias=OpCode.PUSH),
-    MicroCode(alu_lop_sel=AluLopSel.SEL_BR, latch_sp=True, latch_ar=True),
-    MicroCode(alu_lop_sel=AluLopSel.SEL_AC, latch_data=True),
-    BranchingMicroCode("end"),
-    MicroCode(alu_rop_sel=AluRopSel.SEL_SP, latch_br=True, alias=OpCode.POP),
-    MicroCode(alu_lop_sel=AluLopSel.SEL_BR, alu_op=AluOp.INC, latch_sp=True),
-    BranchingMicroCode("end"),
-    MicroCode(latch_hlt=True, alias=OpCode.HLT),
-    BranchingMicroCode("end"),
-    MicroCode(
-        alu_lop_sel=AluLopSel.SEL_AC,
-        alu_rop_sel=AluRopSel.SEL_DR,
-        alu_op=AluOp.SUB,
-        latch_ps=True,
-        alias=OpCode.CMP,
-    ),
-    BranchingMicroCode("end"),
-    BranchingMicroCode(OpCode.JMP, check_z_flag=True, alias=OpCode.JZ),
-    BranchingMicroCode("end"),
-    BranchingMicroCode(OpCode.JMP, check_z_flag=False, alias=OpCode.JNZ),
-    BranchingMicroCode("end"),
-    BranchingMicroCode(OpCode.JMP, check_n_flag=False, alias=OpCode.JAE),
-    BranchingMicroCode(OpCode.JMP, check_n_flag=False, check_z_flag=False, alias=OpCode.JA),
-    BranchingMicroCode("end"),
-    BranchingMicroCode("end"),
-    BranchingMicroCode(OpCode.JMP, check_n_flag=True, alias=OpCode.JBE),
-    BranchingMicroCode(OpCode.JMP, check_n_flag=True, check_z_flag=False, alias=OpCode.JB),
-    BranchingMicroCode("end"),
-    MicroCode(alu_rop_sel=AluRopSel.SEL_DR, latch_pc=True, alias=OpCode.JMP),
-    BranchingMicroCode("start", alias="end"),
-]
-
-commands_alias_to_address_index: dict[str, int] = {}
-
-for index, command in enumerate(runtime):
-    if command.alias is not None:
-        commands_alias_to_address_index[command.alias] = index
-
-for index, command in enumerate(runtime):
-    if isinstance(command, BranchingMicroCode) and isinstance(command.branch_target, str):
-        if command.branch_target not in commands_alias_to_address_index:
-            raise ValueError(f"Unkonwn alias {command.branch_target} in command {index}")
-        command.branch_target = commands_alias_to_address_index[command.branch_target]
+def _build_runtime() -> list[MicroCode | BranchingMicroCode]:
+    runtime: list[MicroCode | BranchingMicroCode] = [
+        MicroCode(latch_ir=True, alias="start"),
+        MicroCode(br_mux_sel=BrMuxSel.SEL_PC, latch_br=True),
+        MicroCode(alu_lop_sel=AluLopSel.SEL_BR, alu_op=AluOp.INC, latch_pc=True),
+        BranchingMicroCode(None, check_op_code=[OpCode.PUSH, OpCode.POP, OpCode.HLT]),
+        BranchingMicroCode(
+            "fetch_pointer_address", check_operand_type=[OperandType.POINTER_ADDRESS]
+        ),
+        BranchingMicroCode(
+            "fetch_stack_offset",
+            check_operand_type=[OperandType.STACK_OFFSET, OperandType.POINTER_STACK_OFFSET],
+        ),
+        MicroCode(
+            alu_lop_sel=AluLopSel.SEL_IR,
+            dr_mux_sel=DrMuxSel.SEL_ALU,
+            latch_dr=True,
+            alias="fetch_immediate_or_no_operand_or_address",
+        ),
+        BranchingMicroCode("fetch_operand", check_operand_type=[OperandType.ADDRESS]),
+        BranchingMicroCode("execute"),
+        MicroCode(alu_lop_sel=AluLopSel.SEL_IR, latch_ar=True, alias="fetch_pointer_address"),
+        MicroCode(latch_dr=True),
+        BranchingMicroCode("fetch_operand"),
+        MicroCode(
+            alu_lop_sel=AluLopSel.SEL_IR,
+            alu_rop_sel=AluRopSel.SEL_SP,
+            dr_mux_sel=DrMuxSel.SEL_ALU,
+            latch_dr=True,
+            alias="fetch_stack_offset",
+        ),
+        BranchingMicroCode("fetch_operand", check_operand_type=[OperandType.STACK_OFFSET]),
+        MicroCode(alu_rop_sel=AluRopSel.SEL_DR, latch_ar=True),
+        MicroCode(latch_dr=True),
+        MicroCode(alu_rop_sel=AluRopSel.SEL_DR, latch_ar=True, alias="fetch_operand"),
+        BranchingMicroCode(
+            None,
+            check_op_code=[
+                OpCode.JZ,
+                OpCode.JNZ,
+                OpCode.JB,
+                OpCode.JBE,
+                OpCode.JA,
+                OpCode.JAE,
+                OpCode.JMP,
+                OpCode.ST,
+            ],
+            alias="execute",
+        ),
+        BranchingMicroCode(
+            "execute2", check_operand_type=[OperandType.IMMEDIATE, OperandType.NO_OPERAND]
+        ),
+        BranchingMicroCode(
+            "fetch_from_io", check_operand=IO_READ_ADDRESS, check_operand_type=[OperandType.ADDRESS]
+        ),
+        MicroCode(latch_dr=True),
+        BranchingMicroCode("execute2"),
+        MicroCode(data_io_mux_sel=DataIoMuxSel.SEL_IO, latch_dr=True, alias="fetch_from_io"),
+        BranchingMicroCode(None, alias="execute2"),
+        MicroCode(alu_rop_sel=AluRopSel.SEL_DR, latch_ac=True, alias=OpCode.LD),
+        BranchingMicroCode("end"),
+        BranchingMicroCode(
+            "st_to_io",
+            check_operand=IO_WRITE_ADDRESS,
+            check_operand_type=[OperandType.ADDRESS],
+            alias=OpCode.ST,
+        ),
+        MicroCode(alu_lop_sel=AluLopSel.SEL_AC, latch_data=True),
+        BranchingMicroCode("end"),
+        MicroCode(alu_lop_sel=AluLopSel.SEL_AC, latch_io=True, alias="st_to_io"),
+        BranchingMicroCode("end"),
+        MicroCode(
+            alu_lop_sel=AluLopSel.SEL_AC,
+            alu_rop_sel=AluRopSel.SEL_DR,
+            alu_op=AluOp.ADD,
+            latch_br=True,
+            latch_ps=True,
+            alias=OpCode.ADD,
+        ),
+        BranchingMicroCode("math_end"),
+        MicroCode(
+            alu_lop_sel=AluLopSel.SEL_AC,
+            alu_rop_sel=AluRopSel.SEL_DR,
+            alu_op=AluOp.SUB,
+            latch_br=True,
+            latch_ps=True,
+            alias=OpCode.SUB,
+        ),
+        BranchingMicroCode("math_end"),
+        MicroCode(
+            alu_lop_sel=AluLopSel.SEL_AC,
+            alu_rop_sel=AluRopSel.SEL_DR,
+            alu_op=AluOp.AND,
+            latch_br=True,
+            latch_ps=True,
+            alias=OpCode.AND,
+        ),
+        BranchingMicroCode("math_end"),
+        MicroCode(
+            alu_lop_sel=AluLopSel.SEL_AC,
+            alu_rop_sel=AluRopSel.SEL_DR,
+            alu_op=AluOp.OR,
+            latch_br=True,
+            latch_ps=True,
+            alias=OpCode.OR,
+        ),
+        BranchingMicroCode("math_end"),
+        MicroCode(
+            alu_lop_sel=AluLopSel.SEL_AC,
+            alu_rop_sel=AluRopSel.SEL_DR,
+            alu_op=AluOp.SHL,
+            latch_br=True,
+            latch_ps=True,
+            alias=OpCode.SHL,
+        ),
+        BranchingMicroCode("math_end"),
+        MicroCode(
+            alu_lop_sel=AluLopSel.SEL_AC,
+            alu_rop_sel=AluRopSel.SEL_DR,
+            alu_op=AluOp.SHR,
+            latch_br=True,
+            latch_ps=True,
+            alias=OpCode.SHR,
+        ),
+        MicroCode(alu_lop_sel=AluLopSel.SEL_BR, latch_ac=True, alias="math_end"),
+        BranchingMicroCode("end"),
+        MicroCode(alu_rop_sel=AluRopSel.SEL_SP, alu_op=AluOp.DEC, latch_br=True, alias=OpCode.PUSH),
+        MicroCode(alu_lop_sel=AluLopSel.SEL_BR, latch_sp=True, latch_ar=True),
+        MicroCode(alu_lop_sel=AluLopSel.SEL_AC, latch_data=True),
+        BranchingMicroCode("end"),
+        MicroCode(alu_rop_sel=AluRopSel.SEL_SP, latch_br=True, alias=OpCode.POP),
+        MicroCode(alu_lop_sel=AluLopSel.SEL_BR, alu_op=AluOp.INC, latch_sp=True),
+        BranchingMicroCode("end"),
+        MicroCode(latch_hlt=True, alias=OpCode.HLT),
+        BranchingMicroCode("end"),
+        MicroCode(
+            alu_lop_sel=AluLopSel.SEL_AC,
+            alu_rop_sel=AluRopSel.SEL_DR,
+            alu_op=AluOp.SUB,
+            latch_ps=True,
+            alias=OpCode.CMP,
+        ),
+        BranchingMicroCode("end"),
+        BranchingMicroCode(OpCode.JMP, check_z_flag=True, alias=OpCode.JZ),
+        BranchingMicroCode("end"),
+        BranchingMicroCode(OpCode.JMP, check_z_flag=False, alias=OpCode.JNZ),
+        BranchingMicroCode("end"),
+        BranchingMicroCode(OpCode.JMP, check_n_flag=False, alias=OpCode.JAE),
+        BranchingMicroCode(OpCode.JMP, check_n_flag=False, check_z_flag=False, alias=OpCode.JA),
+        BranchingMicroCode("end"),
+        BranchingMicroCode("end"),
+        BranchingMicroCode(OpCode.JMP, check_n_flag=True, alias=OpCode.JBE),
+        BranchingMicroCode(OpCode.JMP, check_n_flag=True, check_z_flag=False, alias=OpCode.JB),
+        BranchingMicroCode("end"),
+        MicroCode(alu_rop_sel=AluRopSel.SEL_DR, latch_pc=True, alias=OpCode.JMP),
+        BranchingMicroCode("start", alias="end"),
+        MicroCode(alu_rop_sel=AluRopSel.SEL_DR, latch_br=True, alias=OpCode.INC),
+        MicroCode(
+            alu_lop_sel=AluLopSel.SEL_BR,
+            alu_op=AluOp.INC,
+            latch_ac=True,
+            latch_data=True,
+            latch_ps=True,
+        ),
+        BranchingMicroCode("end"),
+        MicroCode(
+            alu_rop_sel=AluRopSel.SEL_DR,
+            alu_op=AluOp.DEC,
+            latch_ac=True,
+            latch_data=True,
+            latch_ps=True,
+            alias=OpCode.DEC,
+        ),
+        BranchingMicroCode("end"),
+    ]
+
+    commands_alias_to_address_index: dict[str, int] = {}
+
+    for index, command in enumerate(runtime):
+        if command.alias is not None:
+            commands_alias_to_address_index[command.alias] = index
+
+    for index, command in enumerate(runtime):
+        if isinstance(command, BranchingMicroCode) and isinstance(command.branch_target, str):
+            if command.branch_target not in commands_alias_to_address_index:
+                raise ValueError(f"Unkonwn alias {command.branch_target} in command {index}")
+            command.branch_target = commands_alias_to_address_index[command.branch_target]
+
+    return runtime
+
+
+@cache
+def get_runtime() -> list[MicroCode | BranchingMicroCode]:
+    """Microcode memory, built on first use so importing the machine stays cheap."""
+    return _build_runtime()
+
+
+def __getattr__(name: str):
+    if name == "runtime":
+        return get_runtime()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 if __name__ == "__main__":
-    for i, code in enumerate(runtime):
+    for i, code in enumerate(get_runtime()):
         print(i, code)
@@ -0,0 +1,25 @@
+from typing import Optional
+
+from comp3.common.profile import Profile, program_fingerprint
+from comp3.common.program_json import AnyProgram
+
+
+class Profiler:
+    """Collects per-instruction execution and taken-branch counts, fed on every fetch."""
+
+    def __init__(self, program: AnyProgram):
+        self.profile = Profile.empty(
+            program_fingerprint(program.instructions), len(program.instructions)
+        )
+        self._last_index: Optional[int] = None
+
+    def new_run(self):
+        # Counters keep adding up over runs, a run doesn't jump from the end of the previous one
+        self._last_index = None
+
+    def record_fetch(self, index: int):
+        last_index = self._last_index
+        if last_index is not None and index != last_index + 1:
+            self.profile.taken_counts[last_index] += 1
+        self.profile.execution_counts[index] += 1
+        self._last_index = index
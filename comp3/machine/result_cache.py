@@ -0,0 +1,109 @@
+import json
+import logging
+import os
+from functools import cache
+from hashlib import sha256
+from pathlib import Path
+from typing import Optional
+
+from comp3.machine.control_unit import RunStatus
+from comp3.machine.machine import RunResult
+from comp3.machine.microcode import get_runtime
+
+
+logger = logging.getLogger("machine.result_cache")
+
+RESULT_CACHE_VERSION = 1
+DEFAULT_CACHE_BYTES = 64 * 2**20
+
+
+def default_cache_dir() -> Path:
+    if "COMP3_CACHE_DIR" in os.environ:
+        return Path(os.environ["COMP3_CACHE_DIR"])
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "comp3" / "results"
+
+
+@cache
+def _machine_fingerprint() -> bytes:
+    # A change to the microcode can change ticks and even output, so it is part of every key
+    return sha256(repr(get_runtime()).encode()).digest()
+
+
+class ResultCache:
+    """Results of finished runs on disk, one small JSON file per program and input.
+
+    Hits refresh the modification time of their file, when the files
+    grow over ``max_bytes`` the least recently used ones are removed.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int = DEFAULT_CACHE_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key(program: bytes, input_stream: str) -> str:
+        digest = sha256(f"{RESULT_CACHE_VERSION}\n".encode())
+        digest.update(_machine_fingerprint())
+        digest.update(sha256(program).digest())
+        digest.update(input_stream.encode())
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / f"{key}.json"
+
+    def get(self, key: str) -> Optional[RunResult]:
+        path = self._path(key)
+        try:
+            with open(path, encoding="utf-8") as file:
+                content = json.load(file)
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            logger.warning("Ignoring unreadable cached result %s", path)
+            return None
+        return RunResult(
+            output_raw=content["output_raw"],
+            ticks=content["ticks"],
+            instructions=content["instructions"],
+            status=RunStatus.HALTED,
+        )
+
+    def put(self, key: str, result: RunResult):
+        # Only finished runs are stored, a budget says nothing about the next run
+        if not result.halted:
+            return
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        temporary_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(temporary_path, "w", encoding="utf-8") as file:
+            json.dump(
+                {
+                    "output_raw": result.output_raw,
+                    "ticks": result.ticks,
+                    "instructions": result.instructions,
+                },
+                file,
+            )
+        os.replace(temporary_path, path)
+        self.evict()
+
+    def evict(self):
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+                total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+            total -= size
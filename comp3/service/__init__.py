@@ -0,0 +1,5 @@
+from comp3.service.client import submit
+from comp3.service.server import ExecutionService
+
+
+__all__ = ["ExecutionService", "submit"]
@@ -0,0 +1,30 @@
+import argparse
+import asyncio
+import logging
+
+from comp3.service import ExecutionService
+from comp3.service.server import DEFAULT_MAX_TICKS
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        prog="service", description="Run machine jobs sent over a local socket"
+    )
+    address = parser.add_mutually_exclusive_group(required=True)
+    address.add_argument("--socket", metavar="PATH", help="listen on a Unix socket")
+    address.add_argument("--port", type=int, help="listen on a localhost TCP port")
+    parser.add_argument("--workers", type=int, help="worker processes, one per CPU by default")
+    parser.add_argument(
+        "--max-ticks",
+        type=int,
+        default=DEFAULT_MAX_TICKS,
+        help="tick budget of every job, jobs may only ask for less",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    service = ExecutionService(args.workers, args.max_ticks)
+    try:
+        asyncio.run(service.serve(args.socket if args.socket else ("127.0.0.1", args.port)))
+    except KeyboardInterrupt:
+        pass
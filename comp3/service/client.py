@@ -0,0 +1,20 @@
+import json
+import socket
+from collections.abc import Iterator
+from typing import Any
+
+from comp3.service.server import Address
+
+
+def submit(address: Address, job: dict[str, Any]) -> Iterator[dict[str, Any]]:
+    """Sends a job to the service and yields its events as they arrive."""
+    family = socket.AF_UNIX if isinstance(address, str) else socket.AF_INET
+    with socket.socket(family, socket.SOCK_STREAM) as connection:
+        connection.connect(address)
+        connection.sendall(json.dumps(job).encode() + b"\n")
+        with connection.makefile("rb") as replies:
+            for line in replies:
+                event = json.loads(line)
+                yield event
+                if "output" not in event:
+                    return
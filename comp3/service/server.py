@@ -0,0 +1,141 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from hashlib import sha256
+from itertools import count
+from typing import Any, Optional
+
+from comp3.service.worker import init_worker, run_job, warm_up
+
+
+logger = logging.getLogger("service.server")
+
+# Tick budget of a job that doesn't ask for one, jobs can't ask for more
+DEFAULT_MAX_TICKS = 100_000_000
+PROGRAM_KINDS = ("source", "program", "image")
+
+# Unix socket path or (host, port)
+Address = str | tuple[str, int]
+
+
+def program_hash(job: dict[str, Any]) -> str:
+    # The kind is hashed too, the same text as lisq and as compiled JSON are different programs
+    kind = next(kind for kind in PROGRAM_KINDS if kind in job)
+    return sha256(f"{kind}\n{job[kind]}".encode()).hexdigest()
+
+
+class ExecutionService:
+    """Runs machine jobs sent over a socket on a pool of warm worker processes.
+
+    A job is one line of JSON with the program as ``source`` (lisq),
+    ``program`` (compiled JSON text) or ``image`` (base64 of a binary image),
+    plus ``input`` and ``max_ticks``. The reply is a line of JSON for every
+    chunk of output and then a ``result`` (or an ``error``) line.
+    Workers keep the programs they've loaded by content hash, so repeated
+    jobs skip compiling and parsing.
+    """
+
+    def __init__(self, workers: Optional[int] = None, max_ticks: int = DEFAULT_MAX_TICKS):
+        self.max_ticks = max_ticks
+        workers = workers or os.cpu_count() or 1
+        self._events: multiprocessing.Queue = multiprocessing.Queue()
+        self._pool = ProcessPoolExecutor(workers, initializer=init_worker, initargs=(self._events,))
+        self._jobs = count()
+        self._streams: dict[int, asyncio.Queue] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopped: Optional[asyncio.Event] = None
+        for _ in range(workers):
+            self._pool.submit(warm_up)
+
+    def _pump_events(self):
+        # Worker events arrive on a blocking queue, a thread hands them over to the event loop
+        while True:
+            job_id, event = self._events.get()
+            if job_id is None:
+                return
+            assert self._loop is not None
+            self._loop.call_soon_threadsafe(self._dispatch, job_id, event)
+
+    def _dispatch(self, job_id: int, event: dict[str, Any]):
+        stream = self._streams.get(job_id)
+        if stream is not None:
+            stream.put_nowait(event)
+
+    def _job_failed(self, job_id: int, future: Future):
+        exc = future.exception()
+        if exc is not None:
+            assert self._loop is not None
+            self._loop.call_soon_threadsafe(self._dispatch, job_id, {"error": repr(exc)})
+
+    def _validate(self, job: Any) -> dict[str, Any]:
+        if not isinstance(job, dict):
+            raise ValueError("Job must be a JSON object")
+        kinds = [kind for kind in PROGRAM_KINDS if kind in job]
+        if len(kinds) != 1:
+            raise ValueError(f"Job must have exactly one of {', '.join(PROGRAM_KINDS)}")
+        max_ticks = job.get("max_ticks", self.max_ticks)
+        if not isinstance(max_ticks, int) or max_ticks <= 0:
+            raise ValueError("max_ticks must be a positive integer")
+        return {
+            kinds[0]: job[kinds[0]],
+            "hash": program_hash(job),
+            "input": str(job.get("input", "")),
+            "max_ticks": min(max_ticks, self.max_ticks),
+        }
+
+    async def _run(self, job: dict[str, Any], writer: asyncio.StreamWriter):
+        job_id = next(self._jobs)
+        stream: asyncio.Queue = asyncio.Queue()
+        self._streams[job_id] = stream
+        try:
+            future = self._pool.submit(run_job, job_id, job)
+            future.add_done_callback(lambda future: self._job_failed(job_id, future))
+            while True:
+                event = await stream.get()
+                writer.write(json.dumps(event, ensure_ascii=False).encode() + b"\n")
+                await writer.drain()
+                if "output" not in event:
+                    return
+        finally:
+            del self._streams[job_id]
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while line := await reader.readline():
+                try:
+                    job = self._validate(json.loads(line))
+                except ValueError as exc:
+                    writer.write(json.dumps({"error": str(exc)}).encode() + b"\n")
+                    await writer.drain()
+                    continue
+                await self._run(job, writer)
+        except ConnectionError:
+            logger.info("Client disconnected")
+        finally:
+            writer.close()
+
+    async def serve(self, address: Address):
+        """Serves jobs until ``stop`` is called."""
+        self._loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        pump = threading.Thread(target=self._pump_events, daemon=True)
+        pump.start()
+        if isinstance(address, str):
+            server = await asyncio.start_unix_server(self._handle, address)
+        else:
+            server = await asyncio.start_server(self._handle, *address)
+        logger.info("Serving on %s", address)
+        async with server:
+            await self._stopped.wait()
+        self._events.put((None, None))
+        pump.join()
+        self._pool.shutdown()
+
+    def stop(self):
+        # Safe to call from any thread
+        if self._loop is not None and self._stopped is not None:
+            self._loop.call_soon_threadsafe(self._stopped.set)
@@ -0,0 +1,90 @@
+import base64
+import json
+from collections import OrderedDict
+from io import StringIO
+from multiprocessing.queues import Queue
+from typing import Any, Optional
+
+from comp3.common.image import ProgramImage
+from comp3.common.instructions import Program
+from comp3.compiler import compile_program
+from comp3.machine import Machine, RunStatus
+
+
+# Ticks between two streamed output chunks
+SLICE_TICKS = 50_000
+# Loaded programs kept by every worker, least recently used ones are dropped first
+PROGRAM_CACHE_SIZE = 64
+
+# Events of all jobs are sent back to the server through this queue as (job id, event)
+_events: Optional[Queue] = None
+_machines: OrderedDict[str, Machine] = OrderedDict()
+
+
+def init_worker(events: Queue):
+    global _events  # pylint: disable=global-statement
+    _events = events
+
+
+def warm_up():
+    # Submitted once per worker when the service starts, so the first job finds it ready
+    return None
+
+
+def _load_program(job: dict[str, Any]) -> Program | ProgramImage:
+    if "source" in job:
+        program, _ = compile_program(StringIO(job["source"]))
+        return program
+    if "image" in job:
+        return ProgramImage(base64.b64decode(job["image"]))
+    return Program(**json.loads(job["program"]))
+
+
+def _machine(job: dict[str, Any]) -> Machine:
+    machine = _machines.get(job["hash"])
+    if machine is not None:
+        _machines.move_to_end(job["hash"])
+        return machine
+
+    machine = _machines[job["hash"]] = Machine(_load_program(job))
+    if len(_machines) > PROGRAM_CACHE_SIZE:
+        _machines.popitem(last=False)
+    return machine
+
+
+def run_job(job_id: int, job: dict[str, Any]):
+    """Runs one job, its output and then its result or error are sent as events."""
+    assert _events is not None
+    try:
+        machine = _machine(job)
+    except ValueError as exc:
+        _events.put((job_id, {"error": str(exc)}))
+        return
+
+    cpu = machine.control_unit
+    output = machine.datapath.io_interface
+    max_ticks = job["max_ticks"]
+    machine.reset(job.get("input", ""))
+    sent = 0
+    status = RunStatus.RUNNING
+    while status is RunStatus.RUNNING:
+        status = cpu.run_slice(min(SLICE_TICKS, max_ticks - cpu.total_ticks))
+        if status is RunStatus.RUNNING and cpu.total_ticks >= max_ticks:
+            status = RunStatus.TICK_BUDGET_EXHAUSTED
+        if len(output.output_buffer) > sent:
+            chunk = "".join(map(chr, output.output_buffer[sent:]))
+            sent = len(output.output_buffer)
+            _events.put((job_id, {"output": chunk}))
+
+    result = machine.result(status)
+    _events.put((
+        job_id,
+        {
+            "result": {
+                "output": result.output,
+                "ticks": result.ticks,
+                "instructions": result.instructions,
+                "status": result.status.value,
+            }
+        },
+    ))
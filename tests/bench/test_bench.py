@@ -0,0 +1,45 @@
+import copy
+
+import pytest
+
+import comp3.bench
+from comp3.bench import COMPILE_STAGES, Benchmark, compare, run_suite
+
+
+CAT = Benchmark("cat", "examples/cat.lisq", "foo")
+
+
+@pytest.fixture(autouse=True)
+def fixture_quick_measurements(monkeypatch):
+    monkeypatch.setattr(comp3.bench, "MIN_MEASURE_SECONDS", 0)
+
+
+def test_run_suite_measures_every_stage():
+    results = run_suite([CAT, Benchmark("hello", "examples/hello.lisq", max_ticks=1000)], 1)
+    cat = results["benchmarks"]["cat"]
+    assert list(cat["compile"]) == list(COMPILE_STAGES)
+    assert all(
+        stage["seconds"] > 0 and stage["peak_bytes"] > 0 for stage in cat["compile"].values()
+    )
+    assert cat["run"]["halted"]
+    assert cat["run"]["ticks_per_second"] > cat["run"]["instructions_per_second"] > 0
+
+    hello = results["benchmarks"]["hello"]["run"]
+    assert (hello["ticks"], hello["halted"]) == (1000, False)
+
+
+def test_compare_flags_regressions():
+    baseline = run_suite([CAT], 1)
+    assert not compare(baseline, baseline, 0.1)
+
+    results = copy.deepcopy(baseline)
+    results["benchmarks"]["cat"]["run"]["ticks_per_second"] /= 2
+    results["benchmarks"]["cat"]["compile"]["lex"]["seconds"] *= 2
+    # Getting faster is never a regression
+    results["benchmarks"]["cat"]["run"]["instructions_per_second"] *= 2
+
+    regressions = compare(results, baseline, 0.1)
+    assert [regression.split(":")[0] for regression in regressions] == [
+        "cat.compile.lex.seconds",
+        "cat.run.ticks_per_second",
+    ]
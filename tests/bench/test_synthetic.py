@@ -0,0 +1,39 @@
+from io import StringIO
+
+import pytest
+
+import comp3.bench
+from comp3.bench import COMPILE_STAGES
+from comp3.bench.synthetic import ProgramShape, generate_program, measure_shapes
+from comp3.compiler import compile_program
+from comp3.machine import Machine
+
+
+@pytest.mark.parametrize(
+    "shape",
+    [
+        ProgramShape(),
+        ProgramShape(functions=0, strings=3),
+        ProgramShape(functions=40, depth=30, chain=60, strings=200, seed=7),
+    ],
+)
+def test_generated_programs_compile_and_halt(shape):
+    source = generate_program(shape)
+    assert source == generate_program(shape)
+    assert source.count("(defun ") == shape.functions
+
+    program, _ = compile_program(StringIO(source))
+    literals = {word.identifier for word in program.data_memory if word.identifier}
+    assert sum(literal.startswith("str ") for literal in literals) == shape.strings
+
+    result = Machine(program).run(max_ticks=1_000_000)
+    assert result.halted
+    assert len(result.output) == 1
+
+
+def test_measure_shapes_times_every_stage(monkeypatch):
+    monkeypatch.setattr(comp3.bench, "MIN_MEASURE_SECONDS", 0)
+    results = measure_shapes([ProgramShape(functions=5), ProgramShape(functions=10)])
+    assert [result["shape"]["functions"] for result in results] == [5, 10]
+    assert results[0]["source_bytes"] < results[1]["source_bytes"]
+    assert all(list(result["compile"]) == list(COMPILE_STAGES) for result in results)
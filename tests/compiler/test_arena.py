@@ -0,0 +1,90 @@
+import pickle
+import tracemalloc
+from io import StringIO
+
+import pytest
+
+from comp3.bench.synthetic import ProgramShape, generate_program
+from comp3.compiler.arena import NODE_KINDS, AstArena, find_nodes
+from comp3.compiler.ast import (
+    FuncCallNode,
+    FuncNode,
+    IfNode,
+    LoopForNode,
+    MathNode,
+    build_nodes_from_tokens,
+    walk,
+)
+from comp3.compiler.facade import CompilerFacade
+from comp3.compiler.lexer import Lexer
+from comp3.compiler.preprocessing import process_includes
+
+
+EXAMPLES = ["cat", "hello", "hello_user_name", "euler_problem_1", "euler_problem_5"]
+
+
+def parse(source: str) -> list:
+    return build_nodes_from_tokens(Lexer(StringIO(source)).tokens())
+
+
+def compile_nodes(nodes: list) -> tuple:
+    facade = CompilerFacade()
+    return facade.build_program(nodes).model_dump(), facade.source_map
+
+
+@pytest.mark.parametrize("example", EXAMPLES)
+def test_views_compile_like_parsed_nodes(example):
+    with open(f"examples/{example}.lisq", encoding="utf-8") as source:
+        nodes = parse(process_includes(source.read()))
+    views = AstArena.from_nodes(nodes).top_level()
+    assert compile_nodes(views) == compile_nodes(nodes)
+
+
+def test_views_have_the_fields_of_nodes():
+    source = """(defun f (a b) (if (< a b) (loop for i from 0 below b by 2 do (g i)) ))
+(put_char (f 1 "text"))"""
+    function, call = AstArena.from_nodes(parse(source)).top_level()
+    assert isinstance(function, FuncNode)
+    assert (function.identifier, function.param_identifiers) == ("f", ["a", "b"])
+    assert (function.start_token.line, function.start_token.pos) == (1, 1)
+    (condition,) = function.body
+    assert isinstance(condition, IfNode) and condition.false_expr is None
+    # Children are decoded once and kept by their parent
+    assert function.body[0] is condition
+    assert condition.if_condition.op == MathNode.MathOp.LT
+    loop = condition.true_expr
+    assert isinstance(loop, LoopForNode)
+    assert loop.direction == LoopForNode.Direction.BELOW
+    assert (loop.from_value.value, loop.step_value.value) == (0, 2)
+    assert call.load_value.params[1].value == "text"
+    assert call.load_value.params[1].token.pos == 16
+
+    # Subtrees are contiguous, nodes of a kind are found by scanning it
+    assert [node.func_identifier for node in find_nodes(function, FuncCallNode)] == ["g"]
+
+
+def test_pickled_views_carry_only_their_subtree():
+    source = generate_program(ProgramShape(functions=3, strings=2))
+    arena = AstArena.from_nodes(parse(source))
+    views = arena.top_level()
+    copies = pickle.loads(pickle.dumps(views))
+    assert all(
+        isinstance(copy, NODE_KINDS[arena.kinds[root]]) for copy, root in zip(copies, arena.roots)
+    )
+    assert [len(copy.arena) for copy in copies] == [
+        len(arena.subtree(root)) for root in arena.roots
+    ]
+    assert compile_nodes(copies) == compile_nodes(views)
+
+
+def test_arena_is_smaller_than_nodes():
+    source = generate_program(ProgramShape(functions=20))
+    tracemalloc.start()
+    nodes = parse(source)
+    nodes_bytes = tracemalloc.get_traced_memory()[0]
+    arena = AstArena.from_nodes(nodes)
+    del nodes
+    arena_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    assert arena_bytes * 4 < nodes_bytes
+    assert sum(1 for root in arena.top_level() for _ in walk(root)) == len(arena)
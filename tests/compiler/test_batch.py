@@ -0,0 +1,73 @@
+import shutil
+from io import StringIO
+
+import pytest
+
+from comp3.compiler import compile_pipeline
+from comp3.compiler.batch import compile_batch
+
+
+EXAMPLES = ["cat", "hello", "hello_user_name", "euler_problem_1", "euler_problem_5"]
+
+
+@pytest.fixture(name="sources")
+def fixture_sources(tmp_path):
+    sources = tmp_path / "src"
+    (sources / "nested").mkdir(parents=True)
+    for example in EXAMPLES:
+        shutil.copy(f"examples/{example}.lisq", sources)
+    (sources / "nested" / "broken.lisq").write_text("(put_char missing)", encoding="utf-8")
+    return sources
+
+
+def statuses(results) -> dict[str, str]:
+    return {result.source.stem: result.status for result in results}
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_batch_matches_single_builds(sources, tmp_path, workers):
+    results = compile_batch(sources, tmp_path / "out", workers=workers)
+    assert statuses(results) == {**dict.fromkeys(EXAMPLES, "compiled"), "broken": "failed"}
+
+    for example in EXAMPLES:
+        output = StringIO()
+        with open(f"examples/{example}.lisq", encoding="utf-8") as source:
+            compile_pipeline(source, output)
+        compiled = (tmp_path / "out" / f"{example}.json").read_text(encoding="utf-8")
+        assert compiled == output.getvalue()
+
+
+def test_unchanged_sources_are_skipped(sources, tmp_path):
+    output_dir = tmp_path / "out"
+    compile_batch(sources, output_dir)
+    assert set(statuses(compile_batch(sources, output_dir)).values()) == {"up to date", "failed"}
+
+    (sources / "nested" / "broken.lisq").write_text("(put_char 48)", encoding="utf-8")
+    (sources / "cat.lisq").write_text("(put_char 49)", encoding="utf-8")
+    (output_dir / "hello.json").unlink()
+    assert statuses(compile_batch(sources, output_dir)) == {
+        **dict.fromkeys(EXAMPLES, "up to date"),
+        "cat": "compiled",
+        "hello": "compiled",
+        "broken": "compiled",
+    }
+    assert (output_dir / "nested" / "broken.json").exists()
+
+    # Other options make other programs
+    results = compile_batch(sources, output_dir, rotate_loops=False)
+    assert set(statuses(results).values()) == {"compiled"}
+
+
+def test_changed_include_compiles_again(tmp_path):
+    sources = tmp_path / "src"
+    sources.mkdir()
+    library = tmp_path / "library.lisq"
+    library.write_text("(defun digit () 1)\n", encoding="utf-8")
+    (sources / "main.lisq").write_text(
+        f"#include {library}\n(put_char (+ 48 (digit)))", encoding="utf-8"
+    )
+
+    compile_batch(sources, tmp_path / "out")
+    assert statuses(compile_batch(sources, tmp_path / "out")) == {"main": "up to date"}
+    library.write_text("(defun digit () 2)\n", encoding="utf-8")
+    assert statuses(compile_batch(sources, tmp_path / "out")) == {"main": "compiled"}
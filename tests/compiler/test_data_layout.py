@@ -0,0 +1,83 @@
+from collections import Counter
+from io import StringIO
+
+from tests.utils import run_program
+
+from comp3.common.config import IO_READ_ADDRESS, IO_WRITE_ADDRESS
+from comp3.compiler import compile_object, compile_program, data_report, load_object
+from comp3.compiler.data_layout import layout_data, pack_string
+from comp3.compiler.objects import ObjectFile
+from comp3.machine.datapath import STACK_TOP
+
+
+PRINT_STRINGS = """#include lisq_lib/math.lisq
+#include lisq_lib/strings.lisq
+(print_string "hello, world")
+(print_string "world")
+(print_string "o, world")
+(print_string "")
+"""
+
+
+def output_of(program) -> str:
+    return "".join(map(chr, run_program(program).datapath.io_interface.output_buffer))
+
+
+def test_string_tails_are_shared():
+    program, facade = compile_program(StringIO(PRINT_STRINGS))
+    assert output_of(program) == "hello, worldworldo, world"
+
+    symbols = {symbol.identifier: symbol for symbol in facade.data_layout.symbols}
+    owner = symbols["hello, world"]
+    # "world" doesn't start at a word boundary of the longer literal
+    assert symbols["world"].shared_with is None
+    assert symbols["o, world"].shared_with == "hello, world"
+    assert symbols["o, world"].address == owner.address + 1
+    assert symbols[""].address == owner.address + 3
+    assert facade.data_layout.saved_words == 4
+    words = [word.value for word in program.data_memory]
+    assert words[owner.address : owner.address + 4] == pack_string("hello, world")
+
+
+def build_object(path, objects: list[ObjectFile]) -> ObjectFile:
+    output = StringIO()
+    with open(path, encoding="utf-8") as source:
+        compile_object(source, output, str(path), objects)
+    output.seek(0)
+    return load_object(output)
+
+
+def test_literals_of_linked_modules_are_stored_once(tmp_path):
+    math = build_object("lisq_lib/math.lisq", [])
+    strings = build_object("lisq_lib/strings.lisq", [math])
+    module = tmp_path / "greeting.lisq"
+    includes = "#include lisq_lib/math.lisq\n#include lisq_lib/strings.lisq\n"
+    module.write_text(includes + '(defun greet () (print_string "shared text"))', encoding="utf-8")
+    objects = [math, strings, build_object(module, [math, strings])]
+
+    source = f'{includes}#include {module}\n(greet)\n(print_string "shared text")'
+    program, facade = compile_program(StringIO(source), objects=objects)
+    assert output_of(program) == "shared text" * 2
+    assert [symbol.identifier for symbol in facade.data_layout.symbols].count("shared text") == 1
+
+
+def test_most_used_data_comes_first():
+    references = Counter({"cold": 1, "hot": 5, " frame f 0": 3})
+    references.update(f" frame f {index}" for index in range(1, 80))
+    layout = layout_data(["text"], {"cold": 4, "hot": 4}, {"f": 80}, references)
+    assert [word.identifier for word in layout.data_memory[:3]] == ["hot", " frame f 0", "cold"]
+    # Frame slots are direct operands, the unused string fills the gap at the first IO address
+    frames = [symbol.address for symbol in layout.symbols if symbol.kind == "frame"]
+    assert IO_READ_ADDRESS not in frames and IO_WRITE_ADDRESS not in frames
+    assert layout.data_memory[IO_READ_ADDRESS].identifier == "text"
+    assert layout.padding == 1
+    assert layout.stack_words == STACK_TOP - len(layout.data_memory)
+
+
+def test_data_report():
+    report = data_report(StringIO(PRINT_STRINGS)).splitlines()
+    assert any(
+        line.startswith("'o, world'") and line.endswith(" in 'hello, world'") for line in report
+    )
+    assert report[-1].endswith("left for the stack")
+    assert "4 saved by shared string tails" in report[-1]
@@ -0,0 +1,95 @@
+from io import StringIO
+
+import pytest
+
+from comp3.compiler import compile_program, incremental
+from comp3.compiler.incremental import Form, IncrementalCompiler, split_forms, watch
+
+
+def compile_whole(source: str):
+    program, facade = compile_program(StringIO(source))
+    return program.model_dump(), facade.source_map, facade.function_ranges
+
+
+def compile_incrementally(compiler: IncrementalCompiler, source: str):
+    program, facade = compiler.build(source)
+    return program.model_dump(), facade.source_map, facade.function_ranges
+
+
+@pytest.mark.parametrize(
+    "example", ["cat", "hello", "hello_user_name", "euler_problem_1", "euler_problem_5"]
+)
+def test_incremental_build_matches_whole_program_build(example):
+    with open(f"examples/{example}.lisq", encoding="utf-8") as source:
+        content = source.read()
+    assert compile_incrementally(IncrementalCompiler(), content) == compile_whole(content)
+
+
+def test_only_changed_forms_are_compiled():
+    source = "(defun twice (x) (+ x x))\n(defun four () (twice 2))\n(put_char (+ 48 (four)))\n"
+    compiler = IncrementalCompiler()
+    compiler.build(source)
+    assert (compiler.compiled_forms, compiler.total_forms) == (3, 3)
+
+    edited = source.replace("(twice 2)", "(twice 3)")
+    assert compile_incrementally(compiler, edited) == compile_whole(edited)
+    assert compiler.compiled_forms == 1
+
+    # Shifted forms are reused, only their positions change
+    shifted = "\n\n" + edited
+    assert compile_incrementally(compiler, shifted) == compile_whole(shifted)
+    assert compiler.compiled_forms == 0
+
+
+def test_changed_calling_convention_compiles_callers_again():
+    source = "(defun down (x) (if (> x 0) (down (- x 1)) x))\n(put_char (+ 48 (down 3)))\n"
+    compiler = IncrementalCompiler()
+    compiler.build(source)
+
+    # No longer recursive, so down becomes static and its caller has to follow
+    edited = source.replace("(down (- x 1))", "(- x 1)")
+    assert compile_incrementally(compiler, edited) == compile_whole(edited)
+    assert compiler.compiled_forms == 2
+
+
+def test_errors_point_into_the_source():
+    compiler = IncrementalCompiler()
+    compiler.build("(put_char 48)\n")
+    with pytest.raises(ValueError) as incremental_error:
+        compiler.build("(put_char 48)\n\n  (put_char undefined_variable)\n")
+    with pytest.raises(ValueError) as whole_error:
+        compile_program(StringIO("(put_char 48)\n\n  (put_char undefined_variable)\n"))
+    assert str(incremental_error.value) == str(whole_error.value)
+
+
+def test_watch_reports_a_removed_source(tmp_path, monkeypatch, capsys):
+    source = tmp_path / "main.lisq"
+    source.write_text("(put_char 48)\n", encoding="utf-8")
+    written = []
+    sleeps = [0]
+
+    def sleep(_interval: float):
+        # The source is removed after the first build, the watcher is stopped after the next one
+        sleeps[0] += 1
+        if sleeps[0] == 1:
+            source.unlink()
+        elif sleeps[0] == 2:
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr(incremental.time, "sleep", sleep)
+    with pytest.raises(KeyboardInterrupt):
+        watch(source, IncrementalCompiler(), lambda program, _: written.append(program))
+    assert len(written) == 1
+    assert "Error: [Errno 2]" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize(
+    ("content", "forms"),
+    [
+        ("(a)\n  (b (c))", [Form("(a)", 1, 1), Form("(b (c))", 2, 3)]),
+        ('(a ")(")(b)', [Form('(a ")(")', 1, 1), Form("(b)", 1, 10)]),
+        ("x (a", [Form("x", 1, 1), Form("(a", 1, 3)]),
+    ],
+)
+def test_split_forms(content, forms):
+    assert split_forms(content) == forms
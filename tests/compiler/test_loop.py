@@ -0,0 +1,77 @@
+from io import StringIO
+
+import pytest
+
+from tests.utils import compile_source, run_program, run_source
+
+from comp3.common.instructions import OpCode
+from comp3.compiler import compile_program
+
+
+@pytest.mark.parametrize(
+    ("header", "expected"),
+    (
+        ("from 0 below 5", "01234"),
+        ("from 9 above 4", "98765"),
+        ("from 0 below 10 by 3", "0369"),
+        ("from 9 above 0 by (- 5 3)", "97531"),
+        ("from 5 below 5", ""),
+        ("from 3 above 3", ""),
+    ),
+)
+def test_loop_for(header: str, expected: str):
+    assert run_source(f"(loop for i {header} do (put_char (+ i 48)))") == expected
+
+
+def test_loop_for_bound_sees_outer_variable():
+    source = """
+    (let ((i 3))
+        (loop for i from 0 below i do (put_char (+ i 48)))
+        (put_char (+ i 48))
+    )
+    """
+    assert run_source(source) == "0123"
+
+
+def test_loop_for_steps_counter_in_place():
+    program = compile_source("(loop for i from 0 below 5 do (put_char i))")
+    op_codes = [instr.op_code for instr in program.instructions]
+
+    assert OpCode.INC in op_codes
+    assert OpCode.JMP in op_codes
+    # Only the entry jump, the loop itself has a single conditional back edge
+    assert op_codes.count(OpCode.JMP) == 1
+    assert op_codes.count(OpCode.JB) == 1
+
+
+def test_loop_for_rejects_unknown_direction():
+    with pytest.raises(ValueError, match="expected below or above"):
+        compile_source("(loop for i from 0 upto 5 do 0)")
+
+
+WHILE_LOOP = """
+(let ((i {start}))
+    (loop while (< i 5) do (put_char (+ i 48)) (set i (+ i 1)))
+)
+"""
+
+
+@pytest.mark.parametrize("rotate_loops", (True, False))
+@pytest.mark.parametrize(("start", "expected"), ((0, "01234"), (5, "")))
+def test_loop_while(start: int, expected: str, rotate_loops: bool):
+    program, _ = compile_program(
+        StringIO(WHILE_LOOP.format(start=start)), rotate_loops=rotate_loops
+    )
+    cpu = run_program(program)
+
+    assert "".join(map(chr, cpu.datapath.io_interface.output_buffer)) == expected
+
+
+def test_loop_while_rotation():
+    rotated, _ = compile_program(StringIO(WHILE_LOOP.format(start=0)))
+    plain, _ = compile_program(StringIO(WHILE_LOOP.format(start=0)), rotate_loops=False)
+
+    # The jump back to the condition is replaced by a conditional back edge
+    assert OpCode.JMP not in [instr.op_code for instr in rotated.instructions]
+    assert OpCode.JMP in [instr.op_code for instr in plain.instructions]
+    assert run_program(rotated).total_ticks < run_program(plain).total_ticks
@@ -0,0 +1,81 @@
+from io import StringIO
+
+import pytest
+
+from tests.utils import run_program
+
+from comp3.compiler import compile_object, compile_pipeline, compile_program, load_object
+from comp3.compiler.objects import ObjectFile
+
+
+def build_object(path: str, objects: list[ObjectFile]) -> ObjectFile:
+    output = StringIO()
+    with open(path, encoding="utf-8") as source:
+        compile_object(source, output, path, objects)
+    output.seek(0)
+    return load_object(output)
+
+
+@pytest.fixture(name="library", scope="module")
+def fixture_library() -> list[ObjectFile]:
+    math = build_object("lisq_lib/math.lisq", [])
+    return [math, build_object("lisq_lib/strings.lisq", [math])]
+
+
+@pytest.mark.parametrize(
+    "example", ["cat", "hello", "hello_user_name", "euler_problem_1", "euler_problem_5"]
+)
+def test_linked_program_matches_whole_program_build(example, library):
+    compiled = {}
+    for objects in (None, library):
+        output = StringIO()
+        with open(f"examples/{example}.lisq", encoding="utf-8") as source:
+            compile_pipeline(source, output, objects=objects)
+        compiled[objects is None] = output.getvalue()
+    assert compiled[True] == compiled[False]
+
+
+def test_library_is_not_compiled_again(library):
+    math, strings = library
+    assert set(math.functions) == {"bits", "divide", "remainder"}
+    assert strings.externals == {"divide": True, "remainder": True}
+    assert all(symbol.static for symbol in strings.functions.values())
+
+    # Not included, so only known as declarations
+    with pytest.raises(ValueError, match="print_int called in <source> is not defined"):
+        compile_program(StringIO("(print_int 1234)"), objects=library)
+
+    program, _ = compile_program(
+        StringIO("#include lisq_lib/math.lisq\n#include lisq_lib/strings.lisq\n(print_int 1234)"),
+        objects=library,
+    )
+    output = run_program(program).datapath.io_interface.output_buffer
+    assert "".join(map(chr, output)) == "1234"
+
+
+def test_calling_convention_mismatch_is_rejected(library):
+    math, _ = library
+    # Compiled without the math object, so divide is assumed to be called on the stack
+    strings = build_object("lisq_lib/strings.lisq", [])
+    assert strings.externals["divide"] is False
+
+    source = "#include lisq_lib/math.lisq\n#include lisq_lib/strings.lisq\n(print_int 7)"
+    with pytest.raises(
+        ValueError,
+        match="strings.lisq calls divide on the stack but divide expects to be called static",
+    ):
+        compile_program(StringIO(source), objects=[math, strings])
+
+
+def test_outdated_object_is_rejected(tmp_path):
+    module = tmp_path / "module.lisq"
+    module.write_text("(defun one () 1)\n", encoding="utf-8")
+    obj = build_object(str(module), [])
+
+    source = f"#include {module}\n(put_char (+ 48 (one)))"
+    program, _ = compile_program(StringIO(source), objects=[obj])
+    assert run_program(program).datapath.io_interface.output_buffer == [ord("1")]
+
+    module.write_text("(defun one () 2)\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="out of date"):
+        compile_program(StringIO(source), objects=[obj])
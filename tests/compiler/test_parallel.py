@@ -0,0 +1,33 @@
+from io import StringIO
+
+import pytest
+
+from comp3.bench.synthetic import ProgramShape, generate_program
+from comp3.compiler import compile_pipeline, compile_program
+
+
+@pytest.mark.parametrize(
+    "example", ["cat", "hello", "hello_user_name", "euler_problem_1", "euler_problem_5"]
+)
+def test_parallel_build_matches_serial_build(example):
+    compiled = []
+    for workers in (1, 2):
+        output = StringIO()
+        with open(f"examples/{example}.lisq", encoding="utf-8") as source:
+            compile_pipeline(source, output, workers=workers)
+        compiled.append(output.getvalue())
+    assert compiled[0] == compiled[1]
+
+
+def test_parallel_build_of_generated_program():
+    source = generate_program(ProgramShape(functions=30, strings=20))
+    serial, serial_facade = compile_program(StringIO(source))
+    parallel, parallel_facade = compile_program(StringIO(source), workers=3)
+    assert serial.model_dump() == parallel.model_dump()
+    assert serial_facade.source_map == parallel_facade.source_map
+    assert serial_facade.function_ranges == parallel_facade.function_ranges
+
+
+def test_errors_of_workers_are_reported():
+    with pytest.raises(ValueError, match="undefined_variable"):
+        compile_program(StringIO("(put_char 48)\n(put_char undefined_variable)"), workers=2)
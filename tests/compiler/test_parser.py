@@ -0,0 +1,51 @@
+from io import StringIO
+
+import pytest
+
+from tests.utils import run_program
+
+from comp3.bench.synthetic import ProgramShape, generate_program
+from comp3.compiler import compile_program
+from comp3.compiler.ast import IfNode, PutCharNode, iter_nodes_from_tokens, walk
+from comp3.compiler.lexer import Lexer
+
+
+def test_deep_nesting_fits_in_the_python_stack():
+    source = generate_program(ProgramShape(functions=1, depth=3000, chain=3000, strings=0))
+    nodes = list(iter_nodes_from_tokens(Lexer(StringIO(source)).tokens()))
+    assert sum(isinstance(node, IfNode) for node in walk(nodes[0])) == 3000
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_deep_expressions_compile_and_run(workers):
+    depth = 2000
+    math = "(+ 1 " * depth + "0" + ")" * depth
+    conditions = "(if 1 " * depth + math + " 0)" * depth
+    variables = "".join(f"(let ((v{index} {index})) " for index in range(depth))
+    body = variables + f"(- {conditions} v{depth - 1})" + ")" * depth
+    source = f"(defun zero () 48)\n(put_char (+ (zero) (- {body} 1)))"
+    program, _ = compile_program(StringIO(source), workers=workers)
+    assert run_program(program).datapath.io_interface.output_buffer == [ord("0")]
+
+
+@pytest.mark.parametrize(
+    ("source", "position"),
+    [
+        ("(put_char", "line 1 col 10"),
+        ('(put_char "ab', "line 1 col 13"),
+        ("(+ 1\n  2", "line 2 col 4"),
+    ],
+)
+def test_unterminated_source_is_rejected(source, position):
+    with pytest.raises(ValueError, match=f"Unexpected EOF reached at {position}"):
+        compile_program(StringIO(source))
+
+
+def test_forms_are_parsed_as_they_are_read():
+    lexer = Lexer(StringIO("(put_char 48)\n(put_char"))
+    nodes = iter_nodes_from_tokens(lexer.tokens())
+    assert isinstance(next(nodes), PutCharNode)
+    # Nothing after the closing parenthesis was read yet
+    assert lexer.line == 1
+    with pytest.raises(ValueError, match="Unexpected EOF reached at line 2 col 10"):
+        next(nodes)
@@ -0,0 +1,104 @@
+from io import BytesIO, StringIO
+
+import pytest
+
+from tests.utils import compile_source, run_program
+
+from comp3.common.instructions import OpCode
+from comp3.common.profile import Profile
+from comp3.compiler import compile_program
+from comp3.machine.profiler import Profiler
+
+
+HOT_TRUE_BRANCH = """
+(defun is_big (x) (if (> x 2) 1 0))
+(let ((i 0) (big 0))
+    (loop while (< i 20) do
+        (set big (+ big (is_big i)))
+        (set i (+ i 1)))
+    (put_char (+ big 48)))
+"""
+
+
+def output_of(cpu) -> str:
+    return "".join(map(chr, cpu.datapath.io_interface.output_buffer))
+
+
+def profile_source(source: str, input_stream: str = "") -> Profile:
+    program = compile_source(source)
+    profiler = Profiler(program)
+    run_program(program, input_stream, profiler)
+    return profiler.profile
+
+
+def test_profile_round_trip():
+    profile = profile_source(HOT_TRUE_BRANCH)
+    buffer = BytesIO()
+    profile.dump(buffer)
+    buffer.seek(0)
+
+    assert Profile.load(buffer) == profile
+
+
+def test_profile_counts_taken_jumps():
+    program = compile_source(HOT_TRUE_BRANCH)
+    profiler = Profiler(program)
+    run_program(program, "", profiler)
+    counts = profiler.profile
+
+    hlt_index = len(program.instructions) - 1
+    assert counts.execution_counts[hlt_index] == 1
+    for index, instr in enumerate(program.instructions):
+        if instr.op_code == OpCode.JMP:
+            assert counts.taken_counts[index] == counts.execution_counts[index]
+        elif not instr.op_code.value.startswith("J"):
+            assert counts.taken_counts[index] == 0
+
+
+def test_profile_guided_build():
+    profile = profile_source(HOT_TRUE_BRANCH)
+    program, _ = compile_program(StringIO(HOT_TRUE_BRANCH), profile)
+
+    # Hot call is inlined, hot true branch is placed last
+    comments = [instr.comment for instr in program.instructions]
+    assert "function call" not in comments
+    assert "jump to true branch if true" in comments
+
+    baseline = run_program(compile_source(HOT_TRUE_BRANCH))
+    optimized = run_program(program)
+    assert output_of(optimized) == output_of(baseline) == "A"
+    assert optimized.total_ticks < baseline.total_ticks
+
+
+def test_inlined_function_does_not_see_caller_variables():
+    # x in get_x is the address of the global buffer, not the local variable
+    source = """
+    (alloc_str x 4)
+    (defun get_x () x)
+    (let ((x 1) (i 0))
+        (loop while (< i 9) do (set i (+ i 1)) (get_x))
+        (put_char (+ (get_x) 48)))
+    """
+    program, _ = compile_program(StringIO(source), profile_source(source))
+
+    # Only the call in the loop is hot enough
+    assert [instr.comment for instr in program.instructions].count("function call") == 1
+    address = [word.identifier for word in program.data_memory].index("x")
+    assert output_of(run_program(program)) == chr(address + 48)
+
+
+def test_profile_of_other_program():
+    profile = profile_source(HOT_TRUE_BRANCH)
+
+    with pytest.raises(ValueError, match="different program"):
+        compile_program(StringIO("(put_char 48)"), profile)
+
+
+def test_profile_rotates_hot_loops():
+    plain, _ = compile_program(StringIO(HOT_TRUE_BRANCH), rotate_loops=False)
+    profiler = Profiler(plain)
+    run_program(plain, "", profiler)
+    program, _ = compile_program(StringIO(HOT_TRUE_BRANCH), profiler.profile, rotate_loops=False)
+
+    assert "repeat while loop" in [instr.comment for instr in program.instructions]
+    assert output_of(run_program(program)) == "A"
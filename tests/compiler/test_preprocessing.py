@@ -0,0 +1,112 @@
+import os
+import re
+from io import StringIO
+
+import pytest
+
+from tests.utils import run_program
+
+from comp3.compiler import compile_program
+from comp3.compiler.incremental import IncrementalCompiler
+from comp3.compiler.preprocessing import IncludeResolver, dependency_rule
+
+
+@pytest.fixture(name="library")
+def fixture_library(tmp_path):
+    library = tmp_path / "library"
+    (library / "sub").mkdir(parents=True)
+    (library / "sub" / "two.lisq").write_text("(defun two () 2)\n", encoding="utf-8")
+    # Both include two.lisq, which is included once
+    (library / "three.lisq").write_text(
+        "#include sub/two.lisq\n(defun three () (+ 1 (two)))\n", encoding="utf-8"
+    )
+    (library / "four.lisq").write_text(
+        "#include sub/two.lisq\n(defun four () (+ 2 (two)))", encoding="utf-8"
+    )
+    return library
+
+
+def test_includes_are_followed_once(library):
+    source = "#include three.lisq\n#include four.lisq\n(put_char (+ 48 (+ (three) (four))))"
+    preprocessed = IncludeResolver([library]).process(source)
+    assert preprocessed.content.count("(defun two ()") == 1
+    assert preprocessed.dependencies == [
+        library / "three.lisq",
+        library / "sub" / "two.lisq",
+        library / "four.lisq",
+    ]
+
+    program, _ = compile_program(StringIO(source), include_paths=[library])
+    assert run_program(program).datapath.io_interface.output_buffer == [ord("7")]
+
+    # Lines of the source itself are counted without the included files
+    assert error_position(source + "\n(defun 5)", library).startswith("line 4 col")
+
+
+def test_includes_are_found_next_to_the_including_file(library):
+    (library / "sub" / "c.lisq").write_text(
+        # lisq_lib is only found in the working directory
+        "#include two.lisq\n#include lisq_lib/math.lisq\n(defun c () (+ 48 (two)))\n",
+        encoding="utf-8",
+    )
+    source = "#include sub/c.lisq\n#include three.lisq\n(put_char (c))"
+    preprocessed = IncludeResolver([library]).process(source)
+    assert preprocessed.dependencies[:2] == [
+        library / "sub" / "c.lisq",
+        library / "sub" / "two.lisq",
+    ]
+
+    program, _ = compile_program(StringIO(source), include_paths=[library])
+    assert run_program(program).datapath.io_interface.output_buffer == [ord("2")]
+
+
+def test_missing_and_cyclic_includes_are_rejected(library):
+    with pytest.raises(ValueError, match="Included file three.lisq was not found"):
+        compile_program(StringIO("#include three.lisq\n(put_char 48)"))
+
+    (library / "sub" / "two.lisq").write_text("#include four.lisq\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="Include cycle: .*two.lisq -> .*four.lisq -> .*two.lisq"):
+        compile_program(
+            StringIO("#include three.lisq\n#include four.lisq\n"), include_paths=[library]
+        )
+
+
+def error_position(source: str, library) -> str:
+    with pytest.raises(ValueError) as error:
+        compile_program(StringIO(source), include_paths=[library])
+    return re.search(r"line \d+ col \d+.*,", str(error.value)).group()
+
+
+@pytest.mark.parametrize(
+    ("broken", "appended"),
+    [
+        ("sub/two.lisq", "\n\n  (defun 5)"),
+        # Follows a file without a final line break on the same line
+        ("four.lisq", " (defun 5)"),
+    ],
+)
+def test_errors_point_at_the_original_file(library, broken, appended):
+    with open(library / broken, "a", encoding="utf-8") as file:
+        file.write(appended)
+    # The same position as when the broken file is compiled by itself
+    position = error_position((library / broken).read_text(encoding="utf-8"), library)
+    source = "#include three.lisq\n#include four.lisq\n(put_char 48)"
+    assert error_position(source, library) == position.replace(",", f" of {library / broken},")
+    with pytest.raises(
+        ValueError, match=re.escape(position.replace(",", f" of {library / broken}"))
+    ):
+        IncrementalCompiler(include_paths=[library]).build(source)
+
+
+def test_changed_files_are_read_again(library):
+    resolver = IncludeResolver([library])
+    path = library / "sub" / "two.lisq"
+    assert resolver.read(path) == "(defun two () 2)\n"
+    path.write_text("(defun two () 3)\n", encoding="utf-8")
+    os.utime(path, ns=(0, path.stat().st_mtime_ns + 1))
+    assert resolver.read(path) == "(defun two () 3)\n"
+
+
+def test_dependency_rule():
+    rule = dependency_rule("out/main.json", "main.lisq", ["lib/a b.lisq"])
+    assert rule == "out/main.json: main.lisq lib/a\\ b.lisq\n\nlib/a\\ b.lisq:\n"
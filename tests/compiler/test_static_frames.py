@@ -0,0 +1,58 @@
+import pytest
+
+from tests.utils import compile_source, run_source
+
+from comp3.common.instructions import OperandType
+from comp3.compiler.call_graph import find_recursive_functions
+
+
+def digit(expr: str) -> str:
+    return f"(put_char (+ {expr} 48))"
+
+
+def test_find_recursive_functions():
+    call_graph = {
+        "main": {"even", "helper"},
+        "even": {"odd"},
+        "odd": {"even"},
+        "helper": {"leaf", "unknown"},
+        "leaf": set(),
+        "self": {"self"},
+    }
+
+    assert find_recursive_functions(call_graph) == {"even", "odd", "self"}
+
+
+def test_non_recursive_function_uses_direct_addressing():
+    program = compile_source(f"(defun add (a b) (+ a b)) {digit('(add 2 3)')}")
+    operand_types = {instr.operand_type for instr in program.instructions}
+
+    assert OperandType.POINTER_ADDRESS in operand_types  # Return through the static frame
+    assert OperandType.POINTER_STACK_OFFSET not in operand_types
+
+
+def test_recursive_function_keeps_stack_frame():
+    source = f"""
+    (defun sum (n) (if (= n 0) 0 (+ n (sum (- n 1)))))
+    {digit('(sum 3)')}
+    """
+    program = compile_source(source)
+    operand_types = {instr.operand_type for instr in program.instructions}
+
+    assert OperandType.POINTER_STACK_OFFSET in operand_types
+    assert run_source(source) == "6"
+
+
+def test_static_frame_survives_nested_call_in_parameters():
+    source = f"""
+    (defun sub (a b) (- a b))
+    {digit('(sub 9 (sub 5 (sub 4 1)))')}
+    {digit('(sub (sub 9 1) 3)')}
+    """
+
+    assert run_source(source) == "75"
+
+
+def test_static_call_checks_parameter_count():
+    with pytest.raises(ValueError, match="expects 2 parameters but 1 were given"):
+        compile_source("(defun add (a b) (+ a b)) (add 1)")
@@ -0,0 +1,55 @@
+import asyncio
+from io import StringIO
+
+from comp3.compiler import compile_program
+from comp3.machine import Machine
+from comp3.machine.aio import run_async, run_many
+from comp3.machine.control_unit import RunStatus
+
+
+CAT = """
+(let ((c (get_char)))
+    (loop while c do (put_char c) (set c (get_char))))
+"""
+
+FOREVER = """
+(let ((x 0))
+    (loop while 1 do (set x (+ x 1))))
+"""
+
+
+def test_run_async_matches_run():
+    program, _ = compile_program(StringIO(CAT))
+    expected = Machine(program).run("hello")
+    assert asyncio.run(run_async(Machine(program), "hello", slice_ticks=7)) == expected
+
+
+def test_run_many_isolates_endless_jobs():
+    cat, _ = compile_program(StringIO(CAT))
+    forever, _ = compile_program(StringIO(FOREVER))
+    jobs = [(Machine(forever), ""), (Machine(cat), "abc"), (Machine(cat), "xy")]
+
+    results = asyncio.run(run_many(jobs, max_ticks=20_000, slice_ticks=100))
+    assert results[0].status is RunStatus.TICK_BUDGET_EXHAUSTED
+    assert results[0].ticks == 20_000
+    assert [result.output for result in results[1:]] == ["abc", "xy"]
+    assert all(result.halted for result in results[1:])
+
+
+def test_run_many_yields_between_slices():
+    forever, _ = compile_program(StringIO(FOREVER))
+    finished = []
+
+    async def machine():
+        await run_many([(Machine(forever), "")], max_ticks=5000, slice_ticks=10)
+        finished.append("machine")
+
+    async def other():
+        await asyncio.sleep(0)
+        finished.append("other")
+
+    async def main():
+        await asyncio.gather(machine(), other())
+
+    asyncio.run(main())
+    assert finished == ["other", "machine"]
@@ -0,0 +1,70 @@
+from io import BytesIO, StringIO
+
+import pytest
+
+from comp3.compiler import compile_pipeline, compile_program
+from comp3.machine import Machine, main
+from comp3.machine.checkpoint import Checkpoint, Checkpointer, CheckpointOptions
+
+
+SOURCE = """
+(alloc_str buffer 16)
+(let ((c (get_char)) (p buffer))
+    (loop while c do (set_ptr p c) (set p (+ p 1)) (set c (get_char)))
+    (loop while (- p buffer) do (set p (- p 1)) (put_char (@ p))))
+"""
+
+
+@pytest.mark.parametrize("ticks", (1, 7, 150, 400, 1000))
+def test_checkpoint_resumes_exactly(ticks: int):
+    program, _ = compile_program(StringIO(SOURCE))
+    expected = Machine(program).run("abc")
+
+    machine = Machine(program)
+    machine.run("abc", max_ticks=ticks)
+    buffer = BytesIO()
+    Checkpoint.capture(machine.control_unit, "reverse.json").dump(buffer)
+    buffer.seek(0)
+
+    resumed = Machine(program)
+    Checkpoint.load(buffer).restore(resumed.control_unit)
+    assert resumed.resume() == expected
+    assert expected.output == "cba"
+
+
+def test_checkpoint_of_other_program():
+    program, _ = compile_program(StringIO(SOURCE))
+    machine = Machine(program)
+    machine.run("abc", max_ticks=100)
+    checkpoint = Checkpoint.capture(machine.control_unit, "reverse.json")
+
+    other, _ = compile_program(StringIO("(put_char 48)"))
+    with pytest.raises(ValueError, match="different program"):
+        checkpoint.restore(Machine(other).control_unit)
+
+
+def test_checkpointer_writes_periodically(tmp_path):
+    program, _ = compile_program(StringIO(SOURCE))
+    machine = Machine(program)
+    machine.reset("abc")
+    checkpointer = Checkpointer(str(tmp_path / "run.ck"), "reverse.json", every_ticks=200)
+
+    assert checkpointer.run(machine.control_unit)
+    with open(tmp_path / "run.ck", "rb") as file:
+        checkpoint = Checkpoint.load(file)
+    assert checkpoint.total_ticks % 200 == 0
+    assert 0 < checkpoint.total_ticks < machine.control_unit.total_ticks
+
+
+def test_resume_from_cli_checkpoint(tmp_path, capsys):
+    program_path = tmp_path / "reverse.json"
+    with open(program_path, "w", encoding="utf-8") as output:
+        compile_pipeline(StringIO(SOURCE), output)
+    program, _ = compile_program(StringIO(SOURCE))
+    machine = Machine(program)
+    machine.run("abc", max_ticks=300)
+    with open(tmp_path / "run.ck", "wb") as file:
+        Checkpoint.capture(machine.control_unit, str(program_path)).dump(file)
+
+    main(None, "", checkpoint=CheckpointOptions(resume=str(tmp_path / "run.ck")))
+    assert capsys.readouterr().out == "cba\n"
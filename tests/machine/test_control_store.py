@@ -0,0 +1,82 @@
+from dataclasses import fields
+from io import StringIO
+from itertools import product
+from types import SimpleNamespace
+
+import pytest
+
+from comp3.common.isa import OpCode, OperandType
+from comp3.compiler import compile_program
+from comp3.machine.control_store import (
+    ALU_SHIFT,
+    LATCHES,
+    decode,
+    disassemble,
+    encode,
+    get_control_store,
+    listing,
+)
+from comp3.machine.control_unit import ControlUnit
+from comp3.machine.datapath import DataPath
+from comp3.machine.microcode import BranchingMicroCode, MicroCode, get_runtime
+
+
+def normalized(code: MicroCode | BranchingMicroCode) -> tuple:
+    # Conditions are sets, the disassembly lists them in the order of the enums
+    return tuple(
+        set(value) if isinstance(value, list) else value
+        for value in (getattr(code, code_field.name) for code_field in fields(code))
+    )
+
+
+def test_disassembly_matches_the_microcode():
+    store = get_control_store()
+    runtime = get_runtime()
+    assert [normalized(code) for code in disassemble(store)] == list(map(normalized, runtime))
+    assert [encode(code) for code in disassemble(store)] == store.words
+    assert store.dispatch[OpCode.JMP] == runtime.index(
+        next(code for code in runtime if code.alias == OpCode.JMP)
+    )
+    assert {f.name for f in fields(MicroCode) if f.type is bool} == set(LATCHES)
+
+    lines = listing(store).splitlines()
+    assert len(lines) == len(store.words)
+    assert lines[0].endswith("IR <- INSTR_MEMORY (start)")
+
+
+def test_branch_masks_match_the_microcode():
+    program, _ = compile_program(StringIO("(put_char 48)"))
+    datapath = DataPath(program, [])
+    cpu = ControlUnit(datapath, get_runtime())
+    branches = [
+        (code, word)
+        for code, word in zip(get_runtime(), cpu.words)
+        if isinstance(code, BranchingMicroCode)
+    ]
+    for op_code, operand_type, operand, flags in product(
+        OpCode, OperandType, (0, 52, 69), product((False, True), repeat=3)
+    ):
+        datapath.ir.value = SimpleNamespace(
+            op_code=op_code, operand_type=operand_type, operand=operand
+        )
+        datapath.ps.n, datapath.ps.z, datapath.ps.c = flags
+        for code, word in branches:
+            assert cpu.branch_taken(word) == code.execute(datapath)
+
+
+@pytest.mark.parametrize(
+    ("code", "message"),
+    [
+        (BranchingMicroCode("end"), "not converted to an address"),
+        (BranchingMicroCode(256), "does not fit in 8 bits"),
+        (BranchingMicroCode(0, check_operand=1 << 32), "does not fit in 32 bits"),
+    ],
+)
+def test_words_that_do_not_fit_are_rejected(code, message):
+    with pytest.raises(ValueError, match=message):
+        encode(code)
+
+
+def test_unknown_alu_operation_is_rejected():
+    with pytest.raises(ValueError, match="unknown ALU operation"):
+        decode(0xF0 << ALU_SHIFT)
@@ -0,0 +1,36 @@
+import pytest
+
+from tests.utils import compile_source, run_program
+
+from comp3.common.instructions import OpCode, OperandType
+from comp3.compiler.cost_report import estimate_ticks
+from comp3.machine.cost_model import get_cost_model
+
+
+def test_straight_line_program_matches_simulation():
+    program = compile_source("(put_char (+ 1 (- 5 2)))")
+    assert all(not instr.op_code.value.startswith("J") for instr in program.instructions)
+
+    cpu = run_program(program)
+
+    assert cpu.total_ticks == estimate_ticks(program.instructions, get_cost_model())
+
+
+def test_io_operand_takes_io_path():
+    model = get_cost_model()
+
+    assert model.ticks(OpCode.LD, OperandType.ADDRESS, 52) < model.ticks(
+        OpCode.LD, OperandType.ADDRESS, 0
+    )
+
+
+@pytest.mark.parametrize("op_code", (OpCode.JZ, OpCode.JNZ, OpCode.JA, OpCode.JB))
+def test_conditional_jump_has_both_outcomes(op_code: OpCode):
+    model = get_cost_model()
+
+    assert model.is_conditional(op_code, OperandType.ADDRESS)
+    assert not model.is_conditional(OpCode.JMP, OperandType.ADDRESS)
+    assert model.ticks(op_code, OperandType.ADDRESS) == max(
+        model.ticks(op_code, OperandType.ADDRESS, taken=True),
+        model.ticks(op_code, OperandType.ADDRESS, taken=False),
+    )
@@ -0,0 +1,94 @@
+from io import StringIO
+
+import pytest
+
+from comp3.common.isa import AluOp
+from comp3.compiler import compile_program
+from comp3.machine import Machine
+from comp3.machine.checkpoint import Checkpoint
+from comp3.machine.common import AluLopSel, AluRopSel, BrMuxSel, DataIoMuxSel, DrMuxSel
+from comp3.machine.datapath import DataPath
+from comp3.machine.microcode import MicroCode
+
+
+@pytest.fixture(name="datapath")
+def fixture_datapath() -> DataPath:
+    program, _ = compile_program(StringIO("(put_char 48)"))
+    return DataPath(program, [])
+
+
+def count_evaluations(monkeypatch, component) -> list[int]:
+    calls = [0]
+    evaluate = component.evaluate
+
+    def counting() -> int:
+        calls[0] += 1
+        return evaluate()
+
+    monkeypatch.setattr(component, "evaluate", counting)
+    return calls
+
+
+def test_latches_of_a_tick_share_the_alu_result(datapath, monkeypatch):
+    evaluations = count_evaluations(monkeypatch, datapath.alu)
+    datapath.ac.val = 5
+    MicroCode(
+        alu_lop_sel=AluLopSel.SEL_AC, alu_op=AluOp.INC, latch_br=True, latch_ar=True, latch_ps=True
+    ).execute(datapath)
+    assert (datapath.br.val, datapath.ar.val, evaluations[0]) == (6, 6, 1)
+
+    # The same ALU select lines and unchanged operands, the result is still valid
+    MicroCode(
+        alu_lop_sel=AluLopSel.SEL_AC, alu_op=AluOp.INC, dr_mux_sel=DrMuxSel.SEL_ALU, latch_dr=True
+    ).execute(datapath)
+    assert (datapath.dr.val, evaluations[0]) == (6, 1)
+
+
+def test_latched_inputs_are_read_by_the_following_latches(datapath):
+    datapath.ac.val = (1 << 32) - 1
+    # AC changes to 0 before PS is latched, so its flags are those of 0 + 1
+    MicroCode(alu_lop_sel=AluLopSel.SEL_AC, alu_op=AluOp.INC, latch_ac=True, latch_ps=True).execute(
+        datapath
+    )
+    assert datapath.ac.val == 0
+    assert (datapath.ps.z, datapath.ps.c) == (False, False)
+
+
+def test_memory_read_is_kept_until_the_address_or_the_cell_changes(datapath, monkeypatch):
+    reads = count_evaluations(monkeypatch, datapath.data_memory)
+    load = MicroCode(
+        data_io_mux_sel=DataIoMuxSel.SEL_DATA, dr_mux_sel=DrMuxSel.SEL_DATA, latch_dr=True
+    )
+    load.execute(datapath)
+    load.execute(datapath)
+    assert reads[0] == 1
+
+    datapath.dr.val = 7
+    MicroCode(alu_rop_sel=AluRopSel.SEL_DR, latch_data=True).execute(datapath)
+    load.execute(datapath)
+    assert (datapath.dr.val, reads[0]) == (7, 2)
+
+
+def test_single_select_signals_invalidate_the_selection(datapath):
+    datapath.ac.val = 3
+    tick = MicroCode(alu_lop_sel=AluLopSel.SEL_AC, br_mux_sel=BrMuxSel.SEL_ALU, latch_br=True)
+    tick.execute(datapath)
+    datapath.sel_alu_lop(AluLopSel.SEL_ZERO)
+    datapath.latch_br()
+    assert datapath.br.val == 0
+    tick.execute(datapath)
+    assert datapath.br.val == 3
+
+
+def test_restored_state_is_evaluated_again():
+    program, _ = compile_program(StringIO("(loop for i from 0 below 5 do (put_char (+ 48 i)))"))
+    machine = Machine(program)
+    machine.reset()
+    machine.control_unit.run(max_ticks=200)
+    checkpoint = Checkpoint.capture(machine.control_unit, "", None)
+    expected = machine.resume()
+
+    machine.reset()
+    machine.control_unit.run(max_ticks=300)
+    checkpoint.restore(machine.control_unit)
+    assert machine.resume() == expected
@@ -0,0 +1,110 @@
+from io import BytesIO, StringIO
+
+import pytest
+
+from comp3.common.image import ProgramImage
+from comp3.compiler import compile_image, compile_program
+from comp3.machine import Machine
+from comp3.machine.checkpoint import Checkpoint
+from comp3.machine.debugger import Debugger, StopReason
+
+
+SOURCE = """
+(alloc_str buffer 16)
+(let ((c (get_char)) (p buffer))
+    (loop while c do (set_ptr p c) (set p (+ p 1)) (set c (get_char)))
+    (loop while (- p buffer) do (set p (- p 1)) (put_char (@ p))))
+"""
+
+
+def make_debugger(snapshot_every_ticks: int = 100) -> Debugger:
+    program, _ = compile_program(StringIO(SOURCE))
+    return Debugger(Machine(program), program, "abc", snapshot_every_ticks)
+
+
+def state(debugger: Debugger) -> Checkpoint:
+    return Checkpoint.capture(debugger.cpu, "")
+
+
+def test_reverse_step_restores_state():
+    debugger = make_debugger()
+    debugger.step(40)
+    before = state(debugger)
+    debugger.step(25)
+    assert debugger.reverse_step(25) is StopReason.STEP
+    assert state(debugger) == before
+    assert debugger.reverse_step(100) is StopReason.START
+    assert debugger.position == 0
+
+
+def test_reverse_step_after_free_run():
+    debugger = make_debugger()
+    assert debugger.continue_() is StopReason.HALTED
+    assert debugger.cpu.datapath.io_interface.output_buffer == list(b"cba")
+    end = debugger.position
+
+    debugger.reverse_step(37)
+    expected = make_debugger()
+    expected.step(end - 37)
+    assert state(debugger) == state(expected)
+
+    debugger.step(37)
+    assert debugger.halted
+    assert debugger.cpu.datapath.io_interface.output_buffer == list(b"cba")
+
+
+def test_breakpoints_both_ways():
+    debugger = make_debugger()
+    put_char = next(
+        index
+        for index, instr in enumerate(debugger.program.instructions)
+        if instr.comment == "io write"
+    )
+    debugger.breakpoints.add(put_char)
+
+    positions = []
+    while debugger.continue_() is StopReason.BREAKPOINT:
+        assert debugger.cpu.datapath.pc.val == put_char
+        positions.append(debugger.position)
+    assert len(positions) == 3
+
+    assert debugger.reverse_continue() is StopReason.BREAKPOINT
+    assert debugger.position == positions[-1]
+    assert debugger.reverse_continue() is StopReason.BREAKPOINT
+    assert debugger.position == positions[-2]
+    assert debugger.cpu.datapath.io_interface.output_buffer == list(b"c")
+
+
+def test_watchpoint():
+    debugger = make_debugger()
+    buffer = next(
+        address
+        for address, word in enumerate(debugger.program.data_memory)
+        if word.identifier == "buffer"
+    )
+    debugger.watchpoints.add(buffer)
+
+    assert debugger.continue_() is StopReason.WATCHPOINT
+    assert debugger.triggered_watchpoint == buffer
+    first_write = debugger.position
+    assert debugger.continue_() is StopReason.HALTED
+
+    assert debugger.reverse_continue() is StopReason.WATCHPOINT
+    assert debugger.reverse_continue() is StopReason.START
+    debugger.step(first_write)
+    assert debugger.cpu.datapath.data_memory.read(buffer) != 0
+
+
+def test_line_breakpoints():
+    buffer = BytesIO()
+    compile_image(StringIO(SOURCE), buffer)
+    image = ProgramImage(buffer.getvalue())
+    debugger = Debugger(Machine(image), image, "abc")
+
+    debugger.breakpoints.update(debugger.line_breakpoints(5))
+    assert debugger.continue_() is StopReason.BREAKPOINT
+    assert image.source_position(debugger.cpu.datapath.pc.val)[0] == 5
+    assert debugger.cpu.datapath.io_interface.output_buffer == []
+
+    with pytest.raises(ValueError, match="No code"):
+        debugger.line_breakpoints(100)
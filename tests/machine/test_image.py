@@ -0,0 +1,70 @@
+from io import BytesIO, StringIO
+
+import pytest
+
+from tests.utils import run_program
+
+from comp3.common.image import ProgramImage, write_image
+from comp3.common.instructions import OpCode
+from comp3.compiler import compile_image, compile_program
+
+
+SOURCE = """
+(defun double (x) (+ x x))
+(let ((n 20))
+    (put_char (+ 8 (double n)))
+    (put_char (+ n 31)))
+"""
+
+
+def output_of(cpu) -> str:
+    return "".join(map(chr, cpu.datapath.io_interface.output_buffer))
+
+
+def build_image(source: str) -> ProgramImage:
+    buffer = BytesIO()
+    compile_image(StringIO(source), buffer)
+    return ProgramImage(buffer.getvalue())
+
+
+def test_image_round_trip():
+    program, _ = compile_program(StringIO(SOURCE))
+    buffer = BytesIO()
+    write_image(program, buffer)
+    image = ProgramImage(buffer.getvalue())
+
+    assert image.to_program().model_dump() == program.model_dump()
+    for decoded, instr in zip(image.instructions, program.instructions):
+        assert decoded.model_dump_json() == instr.model_dump_json()
+
+
+def test_image_wide_operand():
+    image = build_image("(put_char (- 4294967295 4294967247))")
+
+    assert 4294967295 in [instr.operand for instr in image.instructions]
+    assert output_of(run_program(image)) == "0"
+
+
+def test_image_runs_like_program():
+    program, _ = compile_program(StringIO(SOURCE))
+    image = build_image(SOURCE)
+
+    from_program = run_program(program)
+    from_image = run_program(image)
+    assert output_of(from_image) == output_of(from_program) == "03"
+    assert from_image.total_ticks == from_program.total_ticks
+
+
+def test_image_sections_read_on_demand():
+    image = build_image(SOURCE)
+
+    double_start = image.symbols["functions"]["double"][0]
+    assert image.source_position(double_start)[0] == 2
+    assert image.source_position(0) is None
+    assert image.instructions[0].op_code == OpCode.JMP
+    assert image.instructions[0].comment == "Jump to program start"
+
+
+def test_image_rejects_other_files():
+    with pytest.raises(ValueError, match="Not a program image"):
+        ProgramImage(b'{"instructions": [], "data_memory": []}')
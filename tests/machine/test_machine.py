@@ -0,0 +1,89 @@
+from io import BytesIO, StringIO
+from time import monotonic
+
+import pytest
+
+from comp3.common.image import ProgramImage
+from comp3.compiler import compile_image, compile_program
+from comp3.machine import Machine
+from comp3.machine.control_unit import RunStatus
+
+
+COUNTER = """
+(alloc_str counter 4)
+(set counter (+ (@ counter) 1))
+(put_char (+ (@ counter) 48))
+"""
+
+CAT = """
+(let ((c (get_char)))
+    (loop while c do (put_char c) (set c (get_char))))
+"""
+
+FOREVER = """
+(let ((x 0))
+    (loop while 1 do (set x (+ x 1))))
+"""
+
+
+def test_machine_runs_repeatedly():
+    program, _ = compile_program(StringIO(CAT))
+    machine = Machine(program)
+
+    first = machine.run("foo")
+    assert (first.output, first.halted) == ("foo", True)
+    assert machine.run("hello").output == "hello"
+    assert machine.run("foo") == first
+
+
+def test_machine_restores_data_memory():
+    program, _ = compile_program(StringIO(COUNTER))
+    machine = Machine(program)
+
+    # The counter is incremented from its initial value every run
+    assert machine.run().output == "1"
+    assert machine.run().output == "1"
+
+
+def test_machine_shares_image_data():
+    buffer = BytesIO()
+    compile_image(StringIO(COUNTER), buffer)
+    machine = Machine(ProgramImage(buffer.getvalue()))
+
+    assert [machine.run().output for _ in range(3)] == ["1", "1", "1"]
+
+
+@pytest.mark.parametrize("max_ticks", (1, 10, 100))
+def test_machine_max_ticks(max_ticks: int):
+    program, _ = compile_program(StringIO(CAT))
+    machine = Machine(program)
+
+    result = machine.run("foo", max_ticks=max_ticks)
+    assert result.status is RunStatus.TICK_BUDGET_EXHAUSTED
+    assert result.ticks == max_ticks
+    assert machine.run("foo").halted
+
+
+def test_machine_deadline():
+    program, _ = compile_program(StringIO(FOREVER))
+    machine = Machine(program)
+
+    start = monotonic()
+    result = machine.run(deadline=start + 0.05)
+    assert result.status is RunStatus.DEADLINE_EXCEEDED
+    assert monotonic() - start < 1
+    assert machine.run(max_ticks=1000, deadline=monotonic() + 10).status is (
+        RunStatus.TICK_BUDGET_EXHAUSTED
+    )
+
+
+def test_run_slice():
+    program, _ = compile_program(StringIO(CAT))
+    machine = Machine(program)
+    machine.reset("foo")
+
+    slices = 0
+    while machine.control_unit.run_slice(50) is RunStatus.RUNNING:
+        slices += 1
+        assert machine.control_unit.total_ticks == 50 * slices
+    assert machine.result() == machine.run("foo")
@@ -0,0 +1,63 @@
+import os
+from io import StringIO
+
+import pytest
+
+import comp3.machine
+from comp3.compiler import compile_pipeline
+from comp3.machine import RunResult, RunStatus, main
+from comp3.machine.result_cache import ResultCache
+
+
+def result(output: str, ticks: int = 10) -> RunResult:
+    return RunResult(list(output.encode()), ticks, ticks // 2, RunStatus.HALTED)
+
+
+def test_result_cache_round_trip(tmp_path):
+    cache = ResultCache(tmp_path)
+    key = cache.key(b"program", "input")
+    assert cache.get(key) is None
+
+    cache.put(key, result("foo"))
+    assert cache.get(key) == result("foo")
+    assert cache.get(cache.key(b"program", "other input")) is None
+    assert cache.get(cache.key(b"other program", "input")) is None
+
+
+def test_result_cache_skips_unfinished_runs(tmp_path):
+    cache = ResultCache(tmp_path)
+    cache.put("key", RunResult([], 10, 5, RunStatus.TICK_BUDGET_EXHAUSTED))
+    assert cache.get("key") is None
+
+
+def test_result_cache_evicts_least_recently_used(tmp_path):
+    cache = ResultCache(tmp_path)
+    for index, key in enumerate("abc"):
+        cache.put(key, result(key))
+        os.utime(tmp_path / f"{key}.json", ns=(index, index))
+    # A hit makes the entry the most recently used
+    assert cache.get("a") is not None
+
+    entry_size = (tmp_path / "a.json").stat().st_size
+    cache.max_bytes = 2 * entry_size
+    cache.evict()
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["a.json", "c.json"]
+
+
+def test_main_uses_cache(tmp_path, monkeypatch, capsys):
+    monkeypatch.setenv("COMP3_CACHE_DIR", str(tmp_path / "cache"))
+    program_path = tmp_path / "cat.json"
+    with open(program_path, "w", encoding="utf-8") as file:
+        compile_pipeline(StringIO("(put_char (get_char))"), file)
+
+    main(str(program_path), "x", use_cache=True)
+    assert capsys.readouterr().out == "x\n"
+
+    def fail(_):
+        raise AssertionError("The program was loaded")
+
+    monkeypatch.setattr(comp3.machine, "load_program", fail)
+    main(str(program_path), "x", use_cache=True)
+    assert capsys.readouterr().out == "x\n"
+    with pytest.raises(AssertionError):
+        main(str(program_path), "x", use_cache=False)
@@ -0,0 +1,76 @@
+import json
+import subprocess
+import sys
+from io import StringIO
+
+import pytest
+
+from comp3.common.program_json import decode_program
+from comp3.compiler import compile_pipeline
+
+
+# Cumulative import time of comp3.machine measured with python -X importtime,
+# about 50 ms with cached bytecode and 100 ms without, it was 210-280 ms with pydantic
+IMPORT_BUDGET_US = 250_000
+
+
+def import_times(statement: str) -> dict[str, int]:
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        check=True,
+        text=True,
+    ).stderr
+    times = {}
+    for line in stderr.splitlines():
+        if line.startswith("import time:") and "cumulative" not in line:
+            _, cumulative, name = line.removeprefix("import time:").split("|")
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_machine_import_budget():
+    times = import_times("import comp3.machine")
+    assert not [name for name in times if name.split(".")[0] == "pydantic"]
+    assert times["comp3.machine"] < IMPORT_BUDGET_US
+
+
+def test_json_program_runs_without_pydantic(tmp_path):
+    program_path = tmp_path / "cat.json"
+    with open(program_path, "w", encoding="utf-8") as file:
+        compile_pipeline(StringIO("(put_char (get_char))"), file)
+
+    times = import_times(
+        "from comp3.machine import Machine, load_program;"
+        f"assert Machine(load_program({str(program_path)!r})).run('x').output == 'x'"
+    )
+    assert "pydantic" not in times
+    assert "comp3.compiler" not in times
+
+
+def test_decode_program_matches_model():
+    compiled = StringIO()
+    compile_pipeline(StringIO("(alloc_str s 4) (put_char (get_char))"), compiled)
+    content = json.loads(compiled.getvalue())
+    program = decode_program(content)
+
+    for plain, instr in zip(program.instructions, content["instructions"], strict=True):
+        assert json.loads(plain.model_dump_json()) == instr
+    assert [(word.value, word.identifier) for word in program.data_memory] == [
+        (word["value"], word.get("identifier")) for word in content["data_memory"]
+    ]
+
+
+@pytest.mark.parametrize(
+    "content",
+    (
+        {"instructions": []},
+        {"instructions": [{"op_code": "NOP", "operand_type": "immediate", "operand": 0}]},
+        {"instructions": [{"op_code": "LD", "operand_type": "immediate", "operand": -1}]},
+        {"instructions": [], "data_memory": [{"value": 2**32}]},
+        {"instructions": [{"op_code": "LD"}], "data_memory": []},
+    ),
+)
+def test_decode_program_rejects_malformed(content):
+    with pytest.raises(ValueError):
+        decode_program(content)
@@ -0,0 +1,98 @@
+import asyncio
+import base64
+import json
+import threading
+from collections import OrderedDict
+from io import BytesIO, StringIO
+
+import pytest
+
+from comp3.compiler import compile_image, compile_pipeline
+from comp3.service import ExecutionService, submit, worker
+
+
+CAT = """
+(let ((c (get_char)))
+    (loop while c do (put_char c) (set c (get_char))))
+"""
+
+FOREVER = """
+(let ((x 0))
+    (loop while 1 do (set x (+ x 1))))
+"""
+
+
+@pytest.fixture(name="address", scope="module")
+def fixture_address(tmp_path_factory):
+    address = str(tmp_path_factory.mktemp("service") / "service.sock")
+    service = ExecutionService(workers=1, max_ticks=200_000)
+    thread = threading.Thread(target=asyncio.run, args=(service.serve(address),))
+    thread.start()
+    # The socket exists once the server is listening
+    for _ in range(1000):
+        try:
+            list(submit(address, {"source": "(put_char 48)"}))
+            break
+        except (FileNotFoundError, ConnectionRefusedError):
+            threading.Event().wait(0.01)
+    yield address
+    service.stop()
+    thread.join()
+
+
+def test_source_job(address):
+    events = list(submit(address, {"source": CAT, "input": "foo"}))
+    assert "".join(event["output"] for event in events[:-1]) == "foo"
+    result = events[-1]["result"]
+    assert result["output"] == "foo"
+    assert result["status"] == "halted"
+    assert result["ticks"] > 0
+
+
+def test_compiled_jobs(address):
+    program = StringIO()
+    compile_pipeline(StringIO(CAT), program)
+    image = BytesIO()
+    compile_image(StringIO(CAT), image)
+    job_program = {"program": program.getvalue(), "input": "ab"}
+
+    first = list(submit(address, job_program))[-1]["result"]
+    assert first["output"] == "ab"
+    # The second run reuses the program cached by the worker
+    assert list(submit(address, job_program))[-1]["result"] == first
+
+    job_image = {"image": base64.b64encode(image.getvalue()).decode(), "input": "ab"}
+    assert list(submit(address, job_image))[-1]["result"] == first
+
+
+def test_tick_budget(address):
+    result = list(submit(address, {"source": FOREVER, "max_ticks": 10_000}))[-1]["result"]
+    assert result["status"] == "tick budget exhausted"
+    assert result["ticks"] == 10_000
+
+    # Jobs can't ask for more than the service allows
+    result = list(submit(address, {"source": FOREVER, "max_ticks": 10**9}))[-1]["result"]
+    assert result["ticks"] == 200_000
+
+
+def test_output_is_streamed(address):
+    source = "(let ((i 0)) (loop while (- i 3) do (put_char 65) (set i (+ i 1))))"
+    events = list(submit(address, {"source": source}))
+    assert events[-1]["result"]["output"] == "AAA"
+    assert all("output" in event for event in events[:-1])
+
+
+def test_bad_jobs(address):
+    assert "error" in list(submit(address, {"input": "x"}))[-1]
+    assert "error" in list(submit(address, {"source": "(undefined_fn 1)"}))[-1]
+    assert "error" in list(submit(address, {"program": json.dumps({"foo": 1})}))[-1]
+
+
+def test_worker_program_cache(monkeypatch):
+    # pylint: disable=protected-access
+    monkeypatch.setattr(worker, "PROGRAM_CACHE_SIZE", 1)
+    monkeypatch.setattr(worker, "_machines", OrderedDict())
+    first = worker._machine({"hash": "a", "source": CAT})
+    assert worker._machine({"hash": "a", "source": CAT}) is first
+    worker._machine({"hash": "b", "source": CAT})
+    assert list(worker._machines) == ["b"]
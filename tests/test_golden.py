@@ -15,7 +15,7 @@ def test_golden(golden, caplog, capsys, tmpdir):
 
     compiled_prog_buffer = StringIO()
     with open(golden["in_source"], encoding="utf-8") as code_source:
-        compile_pipeline(code_source, compiled_prog_buffer)
+        compile_pipeline(code_source, compiled_prog_buffer, rotate_loops=False)
     compiled_prog = compiled_prog_buffer.getvalue()
 
     assert golden.out["out_prog"] == compiled_prog
@@ -0,0 +1,29 @@
+import json
+from io import StringIO
+from typing import Optional
+
+from comp3.common.instructions import Program
+from comp3.compiler import compile_pipeline
+from comp3.machine.control_unit import ControlUnit
+from comp3.machine.datapath import DataPath
+from comp3.machine.microcode import get_runtime
+from comp3.machine.profiler import Profiler
+
+
+def compile_source(source: str) -> Program:
+    compiled_prog_buffer = StringIO()
+    compile_pipeline(StringIO(source), compiled_prog_buffer)
+    return Program(**json.loads(compiled_prog_buffer.getvalue()))
+
+
+def run_program(
+    program: Program, input_stream: str = "", profiler: Optional[Profiler] = None
+) -> ControlUnit:
+    cpu = ControlUnit(DataPath(program, list(input_stream)), get_runtime(), profiler)
+    cpu.run()
+    return cpu
+
+
+def run_source(source: str, input_stream: str = "") -> str:
+    cpu = run_program(compile_source(source), input_stream)
+    return "".join(map(chr, cpu.datapath.io_interface.output_buffer))